@@ -0,0 +1,66 @@
+"""
+Shared pytest setup. Being at the root of the repository, this file also
+makes pytest put the root on sys.path, so the tests import the uc_* modules
+directly.
+
+The compiler in ucc/ imports its modules by their bare names (lexer, ast)
+and its ast module shadows the standard one, so the ucc fixture loads them
+from their files and keeps the standard ast module everywhere else.
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+UCC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ucc')
+
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(UCC_DIR, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def ucc():
+    """ The ucc parser module, with its lexer and ast modules as attributes. """
+    pytest.importorskip('ply')
+    std_ast = sys.modules.get('ast')
+    try:
+        _load('lexer')
+        _load('ast')
+        return _load('parser')
+    finally:
+        sys.modules['ast'] = std_ast
+
+
+# main prints the sum of the global array @v and the global float @f
+SUM = [
+    ('global_string', '@.str.0', 'sum: '),
+    ('global_int_4', '@v', [1, 2, 3, 4]),
+    ('global_float', '@f', 2.5),
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('alloc_int', '%2'),
+    ('literal_int', 0, '%3'), ('store_int', '%3', '%1'), ('store_int', '%3', '%2'),
+    ('4',),
+    ('load_int', '%2', '%5'), ('literal_int', 4, '%6'), ('lt_int', '%5', '%6', '%7'),
+    ('cbranch', '%7', '%8', '%9'),
+    ('8',),
+    ('elem_int', '@v', '%5', '%10'), ('load_int_*', '%10', '%11'),
+    ('load_int', '%1', '%12'), ('add_int', '%12', '%11', '%13'), ('store_int', '%13', '%1'),
+    ('literal_int', 1, '%14'), ('add_int', '%5', '%14', '%15'), ('store_int', '%15', '%2'),
+    ('jump', '%4'),
+    ('9',),
+    ('print_string', '@.str.0'), ('load_int', '%1', '%16'), ('print_int', '%16'),
+    ('load_float', '@f', '%17'), ('print_float', '%17'),
+    ('return_void',),
+]
+
+
+@pytest.fixture
+def sum_program():
+    """ A uCIR program with global initializers, a loop & prints, and its output. """
+    return list(SUM), 'sum: 102.5\n'
@@ -0,0 +1,91 @@
+import glob
+import importlib.util
+import io
+import os
+import tracemalloc
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The sources with the expected AST (t6.ast is of an older grammar)
+EXPECTED = sorted(os.path.basename(path)[:-4] for path in glob.glob(os.path.join(TESTS_DIR, '*.ast'))
+                  if os.path.exists(path[:-4] + '.uc') and not path.endswith('t6.ast'))
+
+
+def _bench(ucc):
+    # bench_parser imports UCParser from the parser module loaded by ucc
+    path = os.path.join(os.path.dirname(ucc.__file__), 'bench_parser.py')
+    spec = importlib.util.spec_from_file_location('bench_parser', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _parse(ucc, name):
+    with open(os.path.join(TESTS_DIR, name)) as source:
+        return ucc.get_parser().parse(source.read())
+
+
+def test_show_program_with_coordinates(ucc):
+    buf = io.StringIO()
+    _parse(ucc, 't2.uc').show(buf=buf, showcoord=True)
+    with open(os.path.join(TESTS_DIR, 't2.ast')) as expected:
+        assert buf.getvalue() == expected.read()
+
+
+def test_show_subtree_with_coordinates(ucc):
+    buf = io.StringIO()
+    _parse(ucc, 't2.uc').gdecls[1].show(buf=buf, showcoord=True)
+    assert buf.getvalue().startswith("FuncDef: \n    Type: ['int']   @ 3:1\n")
+    assert '\n        Return:    @ 4:5\n' in buf.getvalue()
+
+
+def test_coordinates_have_line_and_column(ucc):
+    decl = _parse(ucc, 't2.uc').gdecls[1].body.block_items[0]
+    assert isinstance(decl.coord, int)
+    coord = decl.coord_at()
+    assert (coord.line, coord.column) == (4, 5)
+
+
+def test_coordinates_of_an_earlier_source(ucc):
+    program = _parse(ucc, 't2.uc')
+    lines = program.lines
+    _parse(ucc, 't9.uc')
+    coord = program.gdecls[1].body.block_items[0].coord_at(lines)
+    assert (coord.line, coord.column) == (4, 5)
+
+
+def test_coordinates_memory(ucc):
+    # the parser keeps a packed int per coordinate, not an object: the
+    # AST of 10k statements takes about 7.1MB with ints, 8.9MB with an
+    # object per coordinate
+    text = _bench(ucc).make_program(10000)
+    parser = ucc.get_parser()
+    tracemalloc.start()
+    try:
+        program = parser.parse(text)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert program.gdecls
+    assert size < 8 * 10 ** 6
+
+
+@pytest.mark.parametrize('name', EXPECTED)
+def test_show_expected_ast(ucc, name):
+    buf = io.StringIO()
+    _parse(ucc, name + '.uc').show(buf=buf, showcoord=True)
+    with open(os.path.join(TESTS_DIR, name + '.ast')) as expected:
+        assert buf.getvalue() == expected.read()
+
+
+def test_long_lists(ucc):
+    # every list production of make_program grows with the statements
+    program = ucc.get_parser().parse(_bench(ucc).make_program(3000))
+    assert len(program.gdecls) == 1 + 299 + 1
+    assert len(program.gdecls[0].decls) == 2
+    items = program.gdecls[-1].body.block_items
+    assert len(items) == 300 + 3000 + 1
+    assert [item.__class__.__name__ for item in items[299:303]] == ['Decl', 'Assignment', 'Print', 'Decl']
+    assert len(items[301].expr.exprs) == 3
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from uc_interpreter import FrameInterpreter, Interpreter, LimitExceeded
+from uc_io import AsyncInputReader, OutputBuffer
+
+# main counts to 200 in a loop
+LOOP = [
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('literal_int', 0, '%2'), ('store_int', '%2', '%1'),
+    ('3',),
+    ('load_int', '%1', '%4'), ('literal_int', 200, '%5'), ('lt_int', '%4', '%5', '%6'),
+    ('cbranch', '%6', '%7', '%8'),
+    ('7',),
+    ('literal_int', 1, '%9'), ('add_int', '%4', '%9', '%10'), ('store_int', '%10', '%1'),
+    ('jump', '%3'),
+    ('8',),
+    ('load_int', '%1', '%11'), ('print_int', '%11'),
+    ('return_void',),
+]
+
+# main reads two ints and prints their sum
+ADD = [
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('alloc_int', '%2'),
+    ('read_int', '%1'), ('read_int', '%2'),
+    ('load_int', '%1', '%3'), ('load_int', '%2', '%4'), ('add_int', '%3', '%4', '%5'), ('print_int', '%5'),
+    ('return_void',),
+]
+
+
+async def _ticks(task):
+    # Times the event loop ran this coroutine while task was running
+    ticks = 0
+    while not task.done():
+        ticks += 1
+        await asyncio.sleep(0)
+    return ticks
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+def test_quanta(engine):
+    async def main(quantum):
+        machine = engine(output=OutputBuffer(capture=True))
+        task = asyncio.ensure_future(machine.run_async(LOOP, quantum=quantum))
+        ticks = await _ticks(task)
+        assert machine.quantum is None
+        return task.result().output, ticks
+
+    output, ticks = asyncio.run(main(100))
+    assert output == '200\n'
+    # about 1700 instructions run in quanta of 100
+    assert 15 <= ticks <= 20
+    assert asyncio.run(main(10 ** 6)) == ('200\n', 1)
+
+
+def test_tasks_share_the_thread(sum_program):
+    code, output = sum_program
+
+    async def main():
+        return await asyncio.gather(*(FrameInterpreter(output=OutputBuffer(capture=True)).run_async(program, 50)
+                                      for program in (LOOP, code, LOOP)))
+
+    assert [result.output for result in asyncio.run(main())] == ['200\n', output, '200\n']
+
+
+def test_budget():
+    machine = Interpreter(output=OutputBuffer(capture=True), max_instructions=500)
+    with pytest.raises(LimitExceeded):
+        asyncio.run(machine.run_async(LOOP, quantum=64))
+
+
+def test_awaits_the_input():
+    async def main():
+        reader = AsyncInputReader()
+        task = asyncio.ensure_future(
+            FrameInterpreter(input=reader, output=OutputBuffer(capture=True)).run_async(ADD, quantum=2))
+        for text in ('1', '2', ' 3', '9\n'):
+            await asyncio.sleep(0)
+            assert not task.done()
+            reader.feed(text)
+        reader.close()
+        return (await task).output
+
+    assert asyncio.run(main()) == '51\n'
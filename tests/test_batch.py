@@ -0,0 +1,68 @@
+import os
+import time
+from functools import partial
+
+import pytest
+
+import uc_batch
+from uc_batch import run_batch, run_outcome
+from uc_interpreter import Interpreter
+from uc_io import OutputBuffer
+
+
+class FaultyInterpreter(Interpreter):
+    """ Kills its worker on the code 'crash' and hangs on the code 'hang'. """
+
+    def run(self, ircode):
+        if ircode == 'crash':
+            os._exit(1)
+        if ircode == 'hang':
+            time.sleep(60)
+        return super().run(ircode)
+
+
+# main reads an int and prints its double
+DOUBLE = [
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('read_int', '%1'), ('load_int', '%1', '%2'),
+    ('add_int', '%2', '%2', '%3'), ('print_int', '%3'),
+    ('return_void',),
+]
+
+
+def test_results_in_order(sum_program):
+    code, output = sum_program
+    results = run_batch([(DOUBLE, '%d\n' % n) for n in range(6)] + [(code, '')], workers=2, chunksize=2)
+    assert [r.index for r in results] == list(range(7))
+    assert [r.output for r in results] == ['%d\n' % (2 * n) for n in range(6)] + [output]
+    assert {r.status for r in results} == {'ok'}
+
+
+def test_limit_and_error():
+    loop = [('define', '@main'), ('1',), ('jump', '%1')]
+    divide = [('define', '@main'), ('literal_int', 0, '%1'), ('div_int', '%1', '%1', '%2'), ('return_void',)]
+    results = run_batch([(loop, ''), (divide, '')], workers=2, max_instructions=1000)
+    assert [r.status for r in results] == ['limit', 'error']
+    assert results[1].error.startswith('ZeroDivisionError')
+
+
+def test_crash_and_hang_are_isolated(monkeypatch):
+    monkeypatch.setattr(uc_batch, '_GRACE', 0.5)
+    jobs = [(DOUBLE, '1\n'), ('crash', ''), (DOUBLE, '2\n'), ('hang', ''), (DOUBLE, '3\n')]
+    results = run_batch(jobs, workers=2, timeout=1.0, interpreter=FaultyInterpreter, chunksize=1)
+    assert [r.status for r in results] == ['ok', 'error', 'ok', 'limit', 'ok']
+    assert [r.output for r in results] == ['2\n', '', '4\n', '', '6\n']
+
+
+@pytest.mark.parametrize('timeout', [None, 0, -1])
+def test_timeout_is_required(timeout):
+    with pytest.raises(ValueError):
+        run_batch([(DOUBLE, '1\n')], timeout=timeout)
+
+
+def test_run_outcome():
+    output = OutputBuffer(capture=True)
+    machine = Interpreter(output=output, max_instructions=10)
+    result = run_outcome(3, output, partial(machine.run, [('define', '@main'), ('1',), ('jump', '%1')]))
+    assert (result.index, result.status, result.exit_code) == (3, 'limit', None)
+    assert 'budget' in result.error
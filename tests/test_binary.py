@@ -0,0 +1,75 @@
+import marshal
+import os
+import struct
+
+import pytest
+
+import uc_binary
+from uc_binary import BinaryFormatError
+from uc_interpreter import FrameInterpreter
+from uc_io import OutputBuffer
+
+
+def test_round_trip(sum_program):
+    code, _ = sum_program
+    program = uc_binary.loads(uc_binary.dumps(code))
+    assert len(program) == len(code)
+    assert program.tolist() == code
+    assert program[-1] == code[-1]
+
+
+def test_load_and_run(sum_program, tmp_path):
+    code, output = sum_program
+    path = str(tmp_path / 'program.ucb')
+    uc_binary.dump(code, path)
+    with uc_binary.load(path) as program:
+        assert FrameInterpreter(output=OutputBuffer(capture=True)).run(program).output == output
+
+
+def test_distinct_literals():
+    code = [('define', '@main'), ('literal_int', 0, '%1'), ('literal_bool', False, '%2'),
+            ('literal_float', 0.0, '%3'), ('literal_float', -0.0, '%4'), ('return_void',)]
+    decoded = uc_binary.loads(uc_binary.dumps(code)).tolist()
+    assert [type(op[1]) for op in decoded[1:5]] == [int, bool, float, float]
+    assert str(decoded[4][1]) == '-0.0'
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'uCIR',
+    b'XXXX' + bytes(40),
+])
+def test_malformed_header(data):
+    with pytest.raises(BinaryFormatError):
+        uc_binary.loads(data)
+
+
+def test_truncated(sum_program):
+    data = uc_binary.dumps(sum_program[0])
+    for size in (24, 40, len(data) - 1):
+        with pytest.raises(BinaryFormatError):
+            uc_binary.loads(data[:size])
+
+
+def test_invalid_pool(sum_program):
+    data = bytearray(uc_binary.dumps(sum_program[0]))
+    data[-4:] = b'\xff\xff\xff\xff'
+    with pytest.raises(BinaryFormatError):
+        uc_binary.loads(bytes(data))
+
+
+def test_other_marshal_version(sum_program):
+    data = bytearray(uc_binary.dumps(sum_program[0]))
+    struct.pack_into('<I', data, 8, marshal.version + 1)
+    with pytest.raises(BinaryFormatError):
+        uc_binary.loads(bytes(data))
+
+
+def test_dump_file_mode(sum_program, tmp_path):
+    path = tmp_path / 'program.ucb'
+    old = os.umask(0o022)
+    try:
+        uc_binary.dump(sum_program[0], str(path))
+    finally:
+        os.umask(old)
+    assert path.stat().st_mode & 0o777 == 0o644
@@ -0,0 +1,235 @@
+import threading
+
+import pytest
+
+from uc_interpreter import FrameInterpreter, Interpreter, LimitExceeded
+from uc_io import InputReader, OutputBuffer
+
+# main counts to 100 in a loop
+LOOP = [
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('literal_int', 0, '%2'), ('store_int', '%2', '%1'),
+    ('3',),
+    ('load_int', '%1', '%4'), ('literal_int', 100, '%5'), ('lt_int', '%4', '%5', '%6'),
+    ('cbranch', '%6', '%7', '%8'),
+    ('7',),
+    ('literal_int', 1, '%9'), ('add_int', '%4', '%9', '%10'), ('store_int', '%10', '%1'),
+    ('jump', '%3'),
+    ('8',),
+    ('load_int', '%1', '%11'), ('print_int', '%11'),
+    ('return_void',),
+]
+
+# main copies @g[1] to a local array, reads an int & a char and prints
+# them through float & int conversions
+MIXED = [
+    ('global_string', '@.str.0', 'a[1] = '),
+    ('global_int_3', '@g', [1, 2, 3]),
+    ('define', '@main'),
+    ('alloc_int_3', '%1'), ('alloc_float', '%2'), ('alloc_int', '%3'),
+    ('literal_int', 0, '%4'), ('literal_int', 5, '%5'),
+    ('elem_int', '%1', '%4', '%6'), ('store_int_*', '%5', '%6'),
+    ('literal_int', 1, '%7'), ('elem_int', '@g', '%7', '%8'), ('load_int_*', '%8', '%9'),
+    ('elem_int', '%1', '%7', '%10'), ('store_int_*', '%9', '%10'),
+    ('load_int_3', '%1', '%11'), ('elem_int', '%11', '%7', '%12'), ('load_int_*', '%12', '%13'),
+    ('print_string', '@.str.0'), ('print_int', '%13'),
+    ('read_int', '%14'), ('store_int', '%14', '%3'), ('load_int', '%3', '%15'),
+    ('sitofp', '%15', '%16'), ('literal_float', 2.0, '%17'), ('div_float', '%16', '%17', '%18'),
+    ('store_float', '%18', '%2'), ('load_float', '%2', '%19'), ('print_float', '%19'),
+    ('fptosi', '%19', '%20'), ('mod_int', '%15', '%20', '%21'), ('print_int', '%21'),
+    ('read_char', '%22'), ('print_char', '%22'),
+    ('return_void',),
+]
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+def test_same_output(engine):
+    machine = engine(output=OutputBuffer(capture=True), input=InputReader(text='7 x'))
+    assert machine.run(MIXED).output == 'a[1] = 23.51x\n'
+
+
+def test_frame_slots():
+    # the register %n is in the slot n, the arrays after the last register
+    machine = FrameInterpreter(output=OutputBuffer(capture=True), input=InputReader(text='7 x'))
+    machine.load(MIXED)
+    slots, size, _labels = machine._frame_layout(MIXED, 2)
+    assert slots == {'%1': 23, '%11': 26} and size == 29
+    assert machine._slot('%13') == 13 and machine._slot('%1') == 23
+    assert machine._operand('@g') == (machine.globals['@g'], True)
+
+# @f & main use the same labels: main prints 1 (in @f) & 2
+LABELS = [
+    ('define', '@f'),
+    ('literal_bool', True, '%2'), ('cbranch', '%2', '%3', '%4'),
+    ('3',), ('literal_int', 1, '%5'), ('print_int', '%5'), ('jump', '%4'),
+    ('4',), ('return_void',),
+    ('define', '@main'),
+    ('literal_bool', False, '%1'), ('cbranch', '%1', '%4', '%3'),
+    ('3',), ('call', '@f', '%2'), ('literal_int', 2, '%5'), ('print_int', '%5'), ('jump', '%6'),
+    ('4',), ('literal_int', 3, '%7'), ('print_int', '%7'),
+    ('6',), ('return_void',),
+]
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+def test_label_tables(engine):
+    # built once by load, the table of each function has its own labels
+    machine = engine(output=OutputBuffer(capture=True))
+    machine.load(LABELS)
+    assert machine.functions['@f'] == {'%3': 4, '%4': 8}
+    assert machine.functions['@main'] == {'%3': 13, '%4': 18, '%6': 21}
+    with pytest.raises(TypeError):
+        machine.functions['@f']['%5'] = 0
+    assert machine.execute().output == '12\n'
+
+# main sums 3, 6 .. 30 and prints the sum * 2, then 5 * 5.  It has
+# sequences of every superinstruction of the FrameInterpreter
+FUSED = [
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('alloc_int', '%2'), ('alloc_int', '%3'), ('alloc_int', '%4'),
+    ('literal_int', 0, '%5'), ('store_int', '%5', '%1'), ('store_int', '%5', '%2'),
+    ('literal_int', 3, '%6'), ('store_int', '%6', '%3'),
+    ('literal_int', 30, '%7'), ('store_int', '%7', '%4'),
+    ('8',),
+    ('load_int', '%1', '%9'), ('load_int', '%3', '%10'), ('add_int', '%9', '%10', '%11'), ('store_int', '%11', '%1'),
+    ('load_int', '%2', '%12'), ('load_int', '%1', '%13'), ('add_int', '%12', '%13', '%14'), ('store_int', '%14', '%2'),
+    ('load_int', '%1', '%15'), ('load_int', '%4', '%16'), ('lt_int', '%15', '%16', '%17'),
+    ('cbranch', '%17', '%8', '%18'),
+    ('18',),
+    ('load_int', '%2', '%19'), ('literal_int', 2, '%20'), ('mul_int', '%19', '%20', '%21'), ('print_int', '%21'),
+    ('literal_int', 5, '%22'), ('mul_int', '%22', '%22', '%23'), ('print_int', '%23'),
+    ('return_void',),
+]
+
+
+@pytest.mark.parametrize('code', [FUSED, LOOP, MIXED])
+def test_fusion_runs_the_same(code):
+    # the output & the memory left are those of the instructions fused
+    machines = [FrameInterpreter(output=OutputBuffer(capture=True), input=InputReader(text='7 x'), fuse=fuse)
+                for fuse in (False, True)]
+    outputs = [machine.run(code).output for machine in machines]
+    assert outputs[0] == outputs[1] and machines[0].M == machines[1].M
+    assert machines[1].fused and not machines[0].fused
+
+
+def test_fusion_stats():
+    machine = FrameInterpreter(output=OutputBuffer(capture=True), fuse=True, count_fusions=True)
+    assert machine.run(FUSED).output == '33025\n'
+    assert machine.fused == {13: 4, 17: 4, 23: 2, 27: 2, 30: 2}
+    assert machine.fusion_stats == {'load_load_binary_store': [2, 20], 'compare_cbranch': [1, 10],
+                                    'literal_binary': [2, 2]}
+    assert machine.fusion_report().splitlines() == [
+        'superinstruction                  sites   executions',
+        'load_load_binary_store                2           20',
+        'literal_binary                        2            2',
+        'compare_cbranch                       1           10',
+    ]
+    machine = FrameInterpreter(output=OutputBuffer(capture=True), fuse=True)
+    machine.run(FUSED)
+    assert machine.fusion_stats['compare_cbranch'] == [1, 0]
+    assert machine.fusion_report().splitlines()[-1].split() == ['compare_cbranch', '1', '-']
+
+# main prints sub(10, 3) & fact(5), where fact calls sub & itself
+RECURSION = [
+    ('define', '@sub'),
+    ('alloc_int', '%3'), ('alloc_int', '%4'),
+    ('store_int', '%0', '%3'), ('store_int', '%1', '%4'),
+    ('load_int', '%3', '%5'), ('load_int', '%4', '%6'), ('sub_int', '%5', '%6', '%7'),
+    ('return_int', '%7'),
+    ('define', '@fact'),
+    ('alloc_int', '%2'), ('store_int', '%0', '%2'),
+    ('load_int', '%2', '%3'), ('literal_int', 1, '%4'), ('le_int', '%3', '%4', '%5'),
+    ('cbranch', '%5', '%6', '%7'),
+    ('6',), ('return_int', '%4'),
+    ('7',),
+    ('param_int', '%3'), ('param_int', '%4'), ('call', '@sub', '%8'),
+    ('param_int', '%8'), ('call', '@fact', '%9'),
+    ('mul_int', '%3', '%9', '%10'), ('return_int', '%10'),
+    ('define', '@main'),
+    ('literal_int', 10, '%1'), ('literal_int', 3, '%2'),
+    ('param_int', '%1'), ('param_int', '%2'), ('call', '@sub', '%3'), ('print_int', '%3'),
+    ('literal_int', 5, '%4'), ('param_int', '%4'), ('call', '@fact', '%5'), ('print_int', '%5'),
+    ('return_void',),
+]
+
+
+class EntryInterpreter(Interpreter):
+    """ Keeps the first cells of the frame of each call to @sub. """
+
+    def _push(self, source):
+        super()._push(source)
+        if source == '@sub':
+            self.entries.append(self.M[self.fp:self.fp + 3])
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+def test_calls_release_their_frames(engine):
+    machine = engine(output=OutputBuffer(capture=True))
+    assert machine.run(RECURSION).output == '7120\n'
+    # only the functions & the frame of main are left
+    assert machine.offset == 3 + 6 and machine.stack == [] and machine.params == []
+
+
+def test_arguments_copied_to_the_callee_frame():
+    # the parameters, then the return value starting with 0
+    machine = EntryInterpreter(output=OutputBuffer(capture=True))
+    machine.entries = []
+    machine.run(RECURSION)
+    assert machine.entries == [[10, 3, 0], [5, 1, 0], [4, 1, 0], [3, 1, 0], [2, 1, 0]]
+
+
+def test_frame_layouts():
+    # computed on the first call of each function, with the arrays after the registers
+    machine = Interpreter(output=OutputBuffer(capture=True))
+    machine.run(RECURSION)
+    assert machine.layouts['@fact'] == ({'%' + str(k): k for k in range(11)}, 11)
+    assert machine.layouts['@sub'][1] == 8
+    machine = Interpreter(output=OutputBuffer(capture=True), input=InputReader(text='7 x'))
+    machine.run(MIXED)
+    offsets, size = machine.layouts['@main']
+    assert size == 29 and offsets['%1'] == 23 and offsets['%11'] == 26
+    assert offsets['%22'] == 22 and len(offsets) == 23
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+@pytest.mark.parametrize('budget', [0, -1])
+def test_budget_must_be_positive(engine, budget):
+    with pytest.raises(ValueError):
+        engine(max_instructions=budget)
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+def test_budget(engine):
+    with pytest.raises(LimitExceeded):
+        engine(output=OutputBuffer(capture=True), max_instructions=100).run(LOOP)
+    result = engine(output=OutputBuffer(capture=True), max_instructions=10**6).run(LOOP)
+    assert result.output == '100\n'
+
+
+def test_interpreters_in_threads(sum_program):
+    code, output = sum_program
+    outputs = []
+
+    def run(engine):
+        outputs.append(engine(output=OutputBuffer(capture=True)).run(code).output)
+        outputs.append(engine(output=OutputBuffer(capture=True)).run(LOOP).output)
+
+    threads = [threading.Thread(target=run, args=(engine,)) for engine in 4 * (Interpreter, FrameInterpreter)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(outputs) == sorted(8 * [output, '100\n'])
+
+
+
+class BuggyInterpreter(Interpreter):
+    """ Its print_int handler fails with an IndexError of its own. """
+
+    def run_print_int(self, source):
+        [][0]
+
+
+def test_handler_errors_are_not_segfaults():
+    with pytest.raises(IndexError):
+        BuggyInterpreter(output=OutputBuffer(capture=True)).run(LOOP)
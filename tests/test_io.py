@@ -0,0 +1,119 @@
+import io
+
+import pytest
+
+from uc_interpreter import FrameInterpreter, Interpreter
+from uc_io import InputReader, OutputBuffer
+
+# main prints 1, 2 & 3 (the newline is printed by the exit)
+PRINTS = [
+    ('define', '@main'),
+    ('literal_int', 1, '%1'), ('print_int', '%1'),
+    ('literal_int', 2, '%2'), ('print_int', '%2'),
+    ('literal_int', 3, '%3'), ('print_int', '%3'),
+    ('return_void',),
+]
+
+# main prints a prompt, then the sum of the two ints read
+ADD = [
+    ('global_string', '@.str.0', '> '),
+    ('define', '@main'),
+    ('print_string', '@.str.0'),
+    ('read_int', '%1'), ('read_int', '%2'), ('add_int', '%1', '%2', '%3'), ('print_int', '%3'),
+    ('return_void',),
+]
+
+
+def _writes(policy, texts, **options):
+    # The text in the stream after each write
+    stream = io.StringIO()
+    output = OutputBuffer(stream, flush=policy, **options)
+    written = []
+    for text in texts:
+        output.write(text)
+        written.append(stream.getvalue())
+    output.flush()
+    return written, stream.getvalue()
+
+
+@pytest.mark.parametrize('policy, written', [
+    ('always', ['a', 'ab\n', 'ab\nc', 'ab\ncd']),
+    ('line', ['', 'ab\n', 'ab\n', 'ab\n']),
+    ('block', ['', '', 'ab\nc', 'ab\nc']),
+    ('exit', ['', '', '', '']),
+])
+def test_flush_policy(policy, written):
+    assert _writes(policy, ['a', 'b\n', 'c', 'd'], block_size=4) == (written, 'ab\ncd')
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        OutputBuffer(flush='never')
+
+
+def test_capture():
+    stream = io.StringIO()
+    output = OutputBuffer(stream, capture=True)
+    output.write('a\n')
+    output.flush()
+    assert stream.getvalue() == '' and output.getvalue() == 'a\n'
+    output.reset()
+    assert output.getvalue() == ''
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+def test_program_output_flushed_at_exit(engine):
+    stream = io.StringIO()
+    result = engine(output=OutputBuffer(stream, flush='exit')).run(PRINTS)
+    assert result.output is None and stream.getvalue() == '123\n'
+
+
+def _tokens(reader):
+    tokens = []
+    while True:
+        try:
+            tokens.append(reader.token())
+        except EOFError:
+            return tokens
+
+
+@pytest.mark.parametrize('reader', [
+    InputReader(text='10 ação\n\t-3  x'),
+    InputReader(text='10 ação\n\t-3  x'.encode()),
+    InputReader(io.StringIO('10 ação\n\t-3  x'), chunk_size=2),
+    InputReader(io.BytesIO('10 ação\n\t-3  x'.encode()), chunk_size=1),
+    InputReader(io.TextIOWrapper(io.BytesIO('10 ação\n\t-3  x'.encode()), 'utf-8'), chunk_size=3),
+])
+def test_tokens_across_chunks(reader):
+    # a token split by the chunks (or a character split in its bytes) is read whole
+    assert _tokens(reader) == ['10', 'ação', '-3', 'x']
+
+
+def test_input_read_in_chunks():
+    fills = []
+    reader = InputReader(io.StringIO('1 22 333 4444'), chunk_size=4)
+    reader.on_fill = lambda: fills.append(reader._pos)
+    assert reader.token() == '1' and len(fills) == 1
+    assert _tokens(reader) == ['22', '333', '4444']
+    assert len(fills) == 5
+
+
+class PromptedInput(io.StringIO):
+    """ Input that keeps the output written when each chunk is read. """
+
+    def __init__(self, text, output):
+        super().__init__(text)
+        self.output = output
+        self.prompts = []
+
+    def read(self, size=-1):
+        self.prompts.append(self.output.getvalue())
+        return super().read(size)
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+def test_prompt_flushed_before_reading(engine):
+    stream = io.StringIO()
+    source = PromptedInput('2 40', stream)
+    engine(output=OutputBuffer(stream, flush='exit'), input=InputReader(source)).run(ADD)
+    assert source.prompts == ['> ', '> '] and stream.getvalue() == '> 42\n'
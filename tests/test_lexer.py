@@ -0,0 +1,81 @@
+import glob
+import os
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SOURCES = sorted(glob.glob(os.path.join(TESTS_DIR, '*.uc')))
+
+ODD_TEXT = """int main() {  /* a block
+comment */ char c = 'x'; float f = 1.5 + .25;
+\tprint("a b", c, f); // line comment
+  x @ 1 $ y;
+}
+"""
+
+
+def _lexer(ucc, errors):
+    lexer = ucc.UCLexer(lambda msg, line, column: errors.append((msg, line, column)))
+    lexer.build()
+    return lexer
+
+
+def _tokens(ucc, text):
+    errors = []
+    lexer = _lexer(ucc, errors)
+    lexer.input(text)
+    tokens = []
+    while True:
+        token = lexer.token()
+        if token is None:
+            return tokens, errors
+        tokens.append((token.type, token.value, token.lineno, lexer.find_tok_column(token)))
+
+
+def _stream(ucc, text):
+    errors = []
+    stream = _lexer(ucc, errors).tokenize(text)
+    return [(stream.type(i), stream.value(i)) + stream.location(i) for i in range(len(stream))], errors
+
+
+@pytest.mark.parametrize('path', SOURCES, ids=os.path.basename)
+def test_tokenize_as_token(ucc, path):
+    with open(path) as source:
+        text = source.read()
+    assert _stream(ucc, text) == _tokens(ucc, text)
+
+
+def test_tokenize_as_token_with_errors(ucc):
+    tokens, errors = _tokens(ucc, ODD_TEXT)
+    assert [e[0] for e in errors] == ["Illegal character '@'", "Illegal character '$'"]
+    assert _stream(ucc, ODD_TEXT) == (tokens, errors)
+
+
+def test_stream_lexemes(ucc):
+    stream = _lexer(ucc, []).tokenize('x = 10;\nprint(x);')
+    assert len(stream) == 9
+    assert [stream.lexeme(i) for i in range(4)] == ['x', '=', '10', ';']
+    assert stream.value(2) == 10 and stream.location(4) == (2, 1)
+
+
+def test_line_starts(ucc):
+    lexer = _lexer(ucc, [])
+    lexer.input('\nint x;\n\n  x = 1;')
+    assert lexer.line_starts == [0, 1, 8, 9]
+
+
+@pytest.mark.parametrize('text', [ODD_TEXT, '\n\nx', 'x' * 100, 'print("a\nb");\n\n'])
+def test_find_column_of_every_offset(ucc, text):
+    # the same column as scanning back for the previous newline
+    lexer = _lexer(ucc, [])
+    lexer.input(text)
+    for lexpos in range(len(text) + 1):
+        assert lexer.find_column(lexpos) == lexpos - text.rfind('\n', 0, lexpos)
+
+
+def test_columns_of_a_long_line(ucc):
+    text = 'int main() { ' + 'x = x + 1; ' * 1000 + '}'
+    tokens, errors = _tokens(ucc, text)
+    assert not errors and tokens[-1] == ('RBRACE', '}', 1, len(text))
+    assert tokens[-2][3] == len(text) - 2
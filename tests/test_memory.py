@@ -0,0 +1,116 @@
+import pytest
+
+from uc_interpreter import FrameInterpreter, Interpreter
+from uc_io import OutputBuffer
+from uc_memory import CompactMemory, LazyMemory, ListMemory, MemoryAccessError
+from uc_transpiler import TranspiledInterpreter
+
+ENGINES = (Interpreter, FrameInterpreter, TranspiledInterpreter)
+
+
+def _element(index):
+    # main prints @v[index]
+    return [
+        ('global_int_4', '@v', [1, 2, 3, 4]),
+        ('define', '@main'),
+        ('literal_int', index, '%1'), ('elem_int', '@v', '%1', '%2'),
+        ('load_int_*', '%2', '%3'), ('print_int', '%3'),
+        ('return_void',),
+    ]
+
+
+def _engine(engine, memory):
+    return engine(memory=memory, output=OutputBuffer(capture=True))
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('memory', [ListMemory, CompactMemory, LazyMemory])
+def test_element_in_bounds(engine, memory):
+    assert _engine(engine, memory()).run(_element(3)).output == '4\n'
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('memory', [ListMemory, CompactMemory, LazyMemory])
+def test_negative_address(engine, memory):
+    with pytest.raises(MemoryAccessError, match='Segmentation fault'):
+        _engine(engine, memory()).run(_element(-100))
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_past_the_end_of_the_list(engine):
+    with pytest.raises(MemoryAccessError):
+        _engine(engine, ListMemory(size=16, limit=16)).run(_element(100))
+
+
+@pytest.mark.parametrize('memory', [CompactMemory, LazyMemory])
+def test_past_the_reserved_cells(memory):
+    with pytest.raises(MemoryAccessError):
+        _engine(FrameInterpreter, memory()).run(_element(100))
+
+
+@pytest.mark.parametrize('memory', [ListMemory, CompactMemory, LazyMemory])
+def test_limit(memory):
+    cells = memory(limit=100)
+    cells.reserve(100)
+    with pytest.raises(MemoryAccessError, match='Out of memory'):
+        cells.reserve(101)
+
+
+def test_compact_pages_keep_the_values_written():
+    cells = CompactMemory()
+    cells.reserve(3000)
+    cells.zero(0, 2048)
+    cells[5] = 2.5
+    cells[1030] = 'a'
+    cells[2050] = 7
+    assert (cells[4], cells[5], cells[1029], cells[1030], cells[2050], cells[2999]) == (0, 2.5, 0, 'a', 7, None)
+    with pytest.raises(MemoryAccessError):
+        cells[3000]
+    with pytest.raises(MemoryAccessError):
+        cells[-1] = 0
+
+
+def test_lazy_pages_are_shared_until_written():
+    values = list(range(3000))
+    cells = LazyMemory()
+    cells.reserve(6000)
+    cells.zero(0, 3000)
+    cells.write(3000, values)
+    assert cells.pages[0] is cells.pages[1]
+    assert (cells[5], cells[2047], cells[3000 + 2047], cells[5999]) == (0, 0, 2047, 2999)
+    cells[5] = 7
+    cells[3000 + 1500] = -1
+    assert (cells[5], cells[6], cells[1024], cells[4500], cells[4501]) == (7, 0, 0, -1, 1501)
+    assert values[1500] == 1500
+    assert cells.pages[0] is not cells.pages[1]
+
+
+def test_lazy_snapshot_and_restore():
+    cells = LazyMemory()
+    cells.reserve(4096)
+    cells.zero(0, 4096)
+    state = cells.snapshot()
+    cells[100] = 1
+    cells.reserve(5000)
+    cells[4500] = 2
+    cells.restore(state)
+    assert (cells.peak, cells[100]) == (4096, 0)
+    with pytest.raises(MemoryAccessError):
+        cells[4500]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_large_arrays_stay_small(engine):
+    # main zeroes a local array of 10**6 ints and prints its last element
+    code = [
+        ('global_int_1000000', '@g', [1]),
+        ('define', '@main'),
+        ('alloc_int_1000000', '%1'),
+        ('literal_int', 999999, '%2'), ('elem_int', '%1', '%2', '%3'),
+        ('literal_int', 5, '%4'), ('store_int_*', '%4', '%3'),
+        ('load_int_*', '%3', '%5'), ('print_int', '%5'),
+        ('return_void',),
+    ]
+    memory = LazyMemory()
+    assert _engine(engine, memory).run(code).output == '5\n'
+    assert memory.usage()['bytes'] < 10 ** 5
@@ -0,0 +1,84 @@
+import copy
+
+import pytest
+
+from uc_interpreter import FrameInterpreter, Interpreter
+from uc_io import InputReader, OutputBuffer
+from uc_optimizer import PASSES, Optimizer
+from uc_transpiler import TranspiledInterpreter
+from uc_verifier import verify
+
+# @square(n) returns n * n; main reads n, prints square(n + 2 * 3) and,
+# when it's above 50, the sum of n copies of 1.5 (folded constants,
+# copies of the loaded vars & dead temporaries)
+SQUARE = [
+    ('global_string', '@.str.0', 'big '),
+    ('define', '@square'),
+    ('alloc_int', '%2'), ('store_int', '%0', '%2'),
+    ('load_int', '%2', '%3'), ('load_int', '%2', '%4'), ('mul_int', '%3', '%4', '%5'),
+    ('store_int', '%5', '%1'), ('jump', '%6'),
+    ('6',),
+    ('load_int', '%1', '%7'), ('return_int', '%7'),
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('alloc_float', '%2'), ('alloc_int', '%3'),
+    ('read_int', '%1'),
+    ('literal_int', 2, '%4'), ('literal_int', 3, '%5'), ('mul_int', '%4', '%5', '%6'),
+    ('load_int', '%1', '%7'), ('add_int', '%7', '%6', '%8'),
+    ('param_int', '%8'), ('call', '@square', '%9'), ('print_int', '%9'),
+    ('literal_int', 50, '%10'), ('gt_int', '%9', '%10', '%11'),
+    ('literal_bool', True, '%12'), ('and_bool', '%11', '%12', '%13'),
+    ('cbranch', '%13', '%14', '%15'),
+    ('14',),
+    ('print_string', '@.str.0'),
+    ('literal_float', 0.0, '%16'), ('store_float', '%16', '%2'),
+    ('literal_int', 0, '%17'), ('store_int', '%17', '%3'),
+    ('18',),
+    ('load_int', '%3', '%19'), ('load_int', '%1', '%20'), ('lt_int', '%19', '%20', '%21'),
+    ('cbranch', '%21', '%22', '%15'),
+    ('22',),
+    ('load_float', '%2', '%23'), ('literal_float', 1.5, '%24'), ('add_float', '%23', '%24', '%25'),
+    ('store_float', '%25', '%2'),
+    ('literal_int', 1, '%26'), ('add_int', '%19', '%26', '%27'), ('store_int', '%27', '%3'),
+    ('literal_int', 7, '%28'),
+    ('jump', '%18'),
+    ('15',),
+    ('load_float', '%2', '%29'), ('print_float', '%29'),
+    ('return_void',),
+]
+
+
+def _output(engine, code, stdin=''):
+    result = engine(output=OutputBuffer(capture=True), input=InputReader(text=stdin)).run(code)
+    return result.exit_code, result.output
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter, TranspiledInterpreter])
+@pytest.mark.parametrize('stdin', ['0\n', '3\n', '10\n'])
+def test_same_output(engine, stdin):
+    optimized = Optimizer().optimize(SQUARE)
+    assert len(optimized) < len(SQUARE)
+    assert _output(engine, optimized, stdin) == _output(Interpreter, SQUARE, stdin)
+
+
+def test_same_output_of_sample(sum_program):
+    code, output = sum_program
+    assert _output(FrameInterpreter, Optimizer().optimize(code)) == (0, output)
+
+
+@pytest.mark.parametrize('disabled', PASSES)
+def test_each_pass_can_be_disabled(disabled):
+    optimizer = Optimizer(**{disabled: False})
+    optimized = optimizer.optimize(SQUARE)
+    assert _output(FrameInterpreter, optimized, '10\n') == _output(Interpreter, SQUARE, '10\n')
+    assert disabled not in optimizer.stats or optimizer.stats[disabled] == [0, 0]
+
+
+def test_code_is_not_changed_and_stays_valid():
+    code = copy.deepcopy(SQUARE)
+    optimizer = Optimizer()
+    optimized = optimizer.optimize(code)
+    assert code == SQUARE
+    verify(optimized, Interpreter().opcodes())
+    assert ('mul_int', '%4', '%5', '%6') not in optimized
+    assert sum(removed for removed, _ in optimizer.stats.values()) == len(SQUARE) - len(optimized)
+    assert 'constants' in optimizer.report()
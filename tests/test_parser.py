@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def tables_dir(ucc, monkeypatch, tmp_path):
+    """ A new directory of the tables cached by the production parsers. """
+    path = tmp_path / 'tables'
+    monkeypatch.setattr(ucc, 'TABLES_DIR', str(path))
+    return path
+
+
+def _show(parser, name='t2.uc'):
+    with open(os.path.join(TESTS_DIR, name)) as source:
+        return repr(parser.parse(source.read()))
+
+
+def _files(path):
+    return {name: os.stat(os.path.join(path, name)).st_mtime_ns for name in os.listdir(path)}
+
+
+def test_tables_cached(ucc, tables_dir):
+    key = ucc._tables_key()
+    parser = ucc.UCParser(production=True)
+    files = _files(tables_dir)
+    assert set(files) == {'uc_lextab_%s.py' % key, 'uc_parsetab_%s.pickle' % key}
+    # the second parser reads the tables, the same as built
+    cached = ucc.UCParser(production=True)
+    assert _files(tables_dir) == files
+    assert _show(cached) == _show(parser)
+
+
+def test_stale_tables_removed(ucc, tables_dir):
+    key = ucc._tables_key()
+    tables_dir.mkdir()
+    stale = ['uc_lextab_0123456789abcdef.py', 'uc_parsetab_0123456789abcdef.pickle',
+             'uc_parsetab_0123456789abcdef.pickle.42']
+    for name in stale + ['notes.txt']:
+        (tables_dir / name).write_text('')
+    ucc.UCParser(production=True)
+    assert set(os.listdir(tables_dir)) == {'uc_lextab_%s.py' % key, 'uc_parsetab_%s.pickle' % key, 'notes.txt'}
+
+
+def test_damaged_tables_built_again(ucc, tables_dir):
+    key = ucc._tables_key()
+    tables_dir.mkdir()
+    (tables_dir / ('uc_lextab_%s.py' % key)).write_text('raise ImportError\n')
+    (tables_dir / ('uc_parsetab_%s.pickle' % key)).write_bytes(b'damaged')
+    parser = ucc.UCParser(production=True)
+    assert _show(parser) == _show(ucc.get_parser())
+    assert (tables_dir / ('uc_parsetab_%s.pickle' % key)).read_bytes() != b'damaged'
+    assert 'ImportError' not in (tables_dir / ('uc_lextab_%s.py' % key)).read_text()
+
+
+def test_read_only_tables_dir(ucc, tables_dir, monkeypatch):
+    tables_dir.mkdir()
+    monkeypatch.setattr(ucc.os, 'access', lambda path, mode: False)
+    parser = ucc.UCParser(production=True)
+    assert os.listdir(tables_dir) == []
+    assert _show(parser) == _show(ucc.get_parser())
+
+
+def test_parser_shared_by_the_process(ucc, tables_dir, monkeypatch):
+    monkeypatch.setattr(ucc, '_shared_parser', None)
+    parser = ucc.get_parser()
+    assert ucc.get_parser() is parser
+    assert len(os.listdir(tables_dir)) == 2
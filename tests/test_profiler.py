@@ -0,0 +1,52 @@
+import pytest
+
+from uc_interpreter import FrameInterpreter, Interpreter
+from uc_io import OutputBuffer
+from uc_profiler import Profiler
+
+# main calls @inc 50 times in a loop
+CALLS = [
+    ('define', '@inc'),
+    ('alloc_int', '%2'), ('store_int', '%0', '%2'), ('load_int', '%2', '%3'),
+    ('literal_int', 1, '%4'), ('add_int', '%3', '%4', '%5'), ('store_int', '%5', '%1'),
+    ('load_int', '%1', '%6'), ('return_int', '%6'),
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('alloc_int', '%2'), ('alloc_int', '%3'),
+    ('literal_int', 0, '%4'), ('store_int', '%4', '%1'),
+    ('5',),
+    ('load_int', '%1', '%6'), ('literal_int', 50, '%7'), ('lt_int', '%6', '%7', '%8'),
+    ('cbranch', '%8', '%9', '%10'),
+    ('9',),
+    ('param_int', '%6'), ('call', '@inc', '%11'), ('store_int', '%11', '%1'),
+    ('jump', '%5'),
+    ('10',),
+    ('load_int', '%1', '%12'), ('print_int', '%12'),
+    ('return_void',),
+]
+
+
+def _profile(engine, **options):
+    profiler = Profiler()
+    result = engine(output=OutputBuffer(capture=True), profiler=profiler, **options).run(CALLS)
+    assert result.output == '50\n'
+    return profiler
+
+
+def test_counts():
+    profiler = _profile(Interpreter)
+    assert profiler.functions['@inc']['calls'] == 50
+    assert profiler.functions['@main']['calls'] == 1
+    assert profiler.opcodes['call'] == 50
+    assert profiler.opcodes['lt_int'] == 51
+    assert sum(profiler.opcodes.values()) == sum(f['instructions'] for f in profiler.functions.values())
+
+
+@pytest.mark.parametrize('fuse', [False, True])
+def test_same_counts_in_every_engine(fuse):
+    reference = _profile(Interpreter)
+    machine = FrameInterpreter(output=OutputBuffer(capture=True), profiler=Profiler(), fuse=fuse)
+    machine.run(CALLS)
+    assert bool(machine.fused) == fuse
+    assert machine.profiler.opcodes == reference.opcodes
+    assert {name: f['instructions'] for name, f in machine.profiler.functions.items()} == \
+        {name: f['instructions'] for name, f in reference.functions.items()}
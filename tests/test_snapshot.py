@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from uc_interpreter import FrameInterpreter, Interpreter
+from uc_memory import LazyMemory
+from uc_snapshot import LoadedProgram
+
+# main adds the int read to the global @total and prints it
+ACCUMULATE = [
+    ('global_int', '@total', 0),
+    ('define', '@main'),
+    ('alloc_int', '%1'), ('read_int', '%1'), ('load_int', '%1', '%2'),
+    ('load_int', '@total', '%3'), ('add_int', '%3', '%2', '%4'), ('store_int', '%4', '@total'),
+    ('load_int', '@total', '%5'), ('print_int', '%5'),
+    ('return_void',),
+]
+
+
+class CrashingInterpreter(Interpreter):
+    """ Kills its process when the program prints a negative int. """
+
+    def run_print_int(self, source):
+        if self._get_value(source) < 0:
+            os._exit(3)
+        super().run_print_int(source)
+
+
+@pytest.mark.parametrize('engine', [Interpreter, FrameInterpreter])
+def test_each_run_starts_from_the_snapshot(engine):
+    program = LoadedProgram(ACCUMULATE, interpreter=engine)
+    assert [program.run('%d\n' % n).output for n in (5, 7, 9)] == ['5\n', '7\n', '9\n']
+
+
+def test_snapshot_of_lazy_memory(sum_program):
+    code, output = sum_program
+    program = LoadedProgram(code, memory=LazyMemory())
+    assert program.run().output == program.run().output == output
+
+
+@pytest.mark.parametrize('fork', [True, False])
+def test_run_many(fork):
+    program = LoadedProgram(ACCUMULATE, interpreter=FrameInterpreter, max_instructions=1000)
+    program.run('100\n')
+    results = list(program.run_many(['%d\n' % n for n in range(10)], fork=fork, workers=3))
+    assert [r.index for r in results] == list(range(10))
+    assert [r.output for r in results] == ['%d\n' % n for n in range(10)]
+    assert program.run('1\n').output == '1\n'
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_crashed_child_is_isolated():
+    program = LoadedProgram(ACCUMULATE, interpreter=CrashingInterpreter)
+    results = list(program.run_many(['1\n', '-2\n', '3\n'], workers=2))
+    assert [r.status for r in results] == ['ok', 'error', 'ok']
+    assert [r.output for r in results] == ['1\n', '', '3\n']
+    assert 'status' in results[1].error
@@ -0,0 +1,71 @@
+import io
+
+import pytest
+
+import uc_text
+from uc_interpreter import Interpreter
+from uc_text import TextFormatError
+
+OPCODES = Interpreter().opcodes()
+
+
+def test_round_trip(sum_program):
+    code, _ = sum_program
+    text = uc_text.dumps(code)
+    assert text.count('\n') == len(code)
+    assert uc_text.loads(text) == code
+    assert uc_text.loads(text, OPCODES) == code
+
+
+def test_file_round_trip(sum_program, tmp_path):
+    code, _ = sum_program
+    path = str(tmp_path / 'program.ir')
+    uc_text.dump(code, path)
+    assert uc_text.load(path, OPCODES) == code
+
+
+def test_chunks(sum_program, monkeypatch):
+    code, _ = sum_program
+    monkeypatch.setattr(uc_text, 'CHUNK_SIZE', 7)
+    assert list(uc_text.iterload(io.StringIO(uc_text.dumps(code)))) == code
+
+
+def test_literals():
+    text = """('global_char_3', '@s', "it's")   # a comment
+    ('global_float_2', '@f', [1.5e3, -.25])
+    ( 'literal_int' , -7 , '%1' , )
+    ('literal_bool', False, '%2')
+    ('global_int_2_2', '@m',
+        [[1, 2], [3, 4]])
+    ('global_string', '@t', 'a\\nb')
+    """
+    assert uc_text.loads(text) == [
+        ('global_char_3', '@s', "it's"),
+        ('global_float_2', '@f', [1500.0, -0.25]),
+        ('literal_int', -7, '%1'),
+        ('literal_bool', False, '%2'),
+        ('global_int_2_2', '@m', [[1, 2], [3, 4]]),
+        ('global_string', '@t', 'a\nb'),
+    ]
+
+
+@pytest.mark.parametrize('text, line, column', [
+    ("('define', '@main')\n('jump' '%1')\n", 2, 9),
+    ("('define', '@main')\n  ('jump', %1)\n", 2, 12),
+    ("('define', '@main'),\n", 1, 20),
+    ("(1, 2)\n", 1, 6),
+    ("('1', '%2')\n", 1, 1),
+    ("('define', '@main'\n", 2, 1),
+    ("('define', ['@main')\n", 1, 20),
+])
+def test_syntax_errors(text, line, column):
+    with pytest.raises(TextFormatError) as e:
+        uc_text.loads(text)
+    assert (e.value.line, e.value.column) == (line, column)
+
+
+def test_opcode_errors():
+    with pytest.raises(TextFormatError, match='unknown opcode'):
+        uc_text.loads("('define', '@main')\n('frobnicate_int', '%1')\n", OPCODES)
+    with pytest.raises(TextFormatError, match='expected 3 operands'):
+        uc_text.loads("('add_int', '%1', '%2')\n", OPCODES)
@@ -0,0 +1,59 @@
+from uc_interpreter import FrameInterpreter, Interpreter
+from uc_io import OutputBuffer
+from uc_transpiler import TieredInterpreter, TranspiledInterpreter
+
+# @calc calls @add through the global pointer @operation:
+# main prints calc(9) .. calc(13)
+POINTER_CALL = [
+    ('global_int_*', '@operation'),
+    ('define', '@add'),
+    ('alloc_int', '%3'), ('alloc_int', '%4'),
+    ('store_int', '%0', '%3'), ('store_int', '%1', '%4'),
+    ('load_int', '%3', '%5'), ('load_int', '%4', '%6'),
+    ('add_int', '%5', '%6', '%7'), ('store_int', '%7', '%2'),
+    ('load_int', '%2', '%8'), ('return_int', '%8'),
+    ('define', '@calc'),
+    ('alloc_int', '%2'), ('store_int', '%0', '%2'),
+    ('load_int', '%2', '%3'), ('literal_int', 1, '%4'),
+    ('param_int', '%3'), ('param_int', '%4'),
+    ('load_int_*', '@operation', '%5'), ('call', '%5', '%6'),
+    ('store_int', '%6', '%1'), ('load_int', '%1', '%7'), ('return_int', '%7'),
+    ('define', '@main'),
+    ('alloc_int', '%1'),
+    ('get_int_*', '@add', '@operation'),
+    ('literal_int', 9, '%2'), ('store_int', '%2', '%1'),
+    ('3',),
+    ('load_int', '%1', '%4'), ('literal_int', 14, '%5'), ('lt_int', '%4', '%5', '%6'),
+    ('cbranch', '%6', '%7', '%8'),
+    ('7',),
+    ('param_int', '%4'), ('call', '@calc', '%9'), ('print_int', '%9'),
+    ('literal_int', 1, '%10'), ('add_int', '%4', '%10', '%11'), ('store_int', '%11', '%1'),
+    ('jump', '%3'),
+    ('8',),
+    ('return_void',),
+]
+
+
+def _output(interpreter, **options):
+    return interpreter(output=OutputBuffer(capture=True), **options).run(POINTER_CALL).output
+
+
+def test_pointer_call_in_every_engine():
+    for interpreter in (Interpreter, FrameInterpreter, TranspiledInterpreter):
+        assert _output(interpreter) == '1011121314\n'
+
+
+def test_pointer_call_from_promoted_function():
+    for hot_calls in (1, 2, 3):
+        for hot_loops in (1, 2, 1000):
+            assert _output(TieredInterpreter, hot_calls=hot_calls, hot_loops=hot_loops) == '1011121314\n'
+
+
+def test_promotion(sum_program):
+    code, output = sum_program
+    machine = TieredInterpreter(output=OutputBuffer(capture=True), hot_loops=2)
+    assert machine.run(code).output == output
+    assert machine.promoted == {'@main': 'loops'}
+    machine = TieredInterpreter(output=OutputBuffer(capture=True), hot_calls=2)
+    assert machine.run(POINTER_CALL).output == '1011121314\n'
+    assert machine.promoted == {'@add': 'calls', '@calc': 'calls'}
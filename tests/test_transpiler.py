@@ -0,0 +1,62 @@
+import os
+
+from uc_io import OutputBuffer
+from uc_transpiler import TranspiledInterpreter, _code_cache
+
+# main prints 42
+PRINT_42 = [
+    ('define', '@main'),
+    ('literal_int', 42, '%1'), ('print_int', '%1'),
+    ('return_void',),
+]
+
+
+def _run(**options):
+    _code_cache.clear()
+    return TranspiledInterpreter(output=OutputBuffer(capture=True), **options).run(PRINT_42).output
+
+
+def test_no_disk_cache_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv('UC_CACHE_DIR', raising=False)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    assert TranspiledInterpreter().cache_dir is False
+    assert _run() == '42\n'
+    assert os.listdir(tmp_path) == []
+
+
+def test_disk_cache_from_environment(monkeypatch, tmp_path):
+    cache_dir = tmp_path / 'uc'
+    monkeypatch.setenv('UC_CACHE_DIR', str(cache_dir))
+    assert _run() == '42\n'
+    assert len(os.listdir(cache_dir)) == 1
+    assert os.stat(cache_dir).st_mode & 0o777 == 0o700
+    assert _run() == '42\n'
+
+
+def test_shared_cache_dir_is_not_used(tmp_path):
+    tmp_path.chmod(0o777)
+    assert _run(cache_dir=str(tmp_path)) == '42\n'
+    assert os.listdir(tmp_path) == []
+
+
+class ModInterpreter(TranspiledInterpreter):
+    """ Also runs mod_float, that the other interpreters only warn about. """
+
+    def run_mod_float(self, left, right, target):
+        pass
+
+
+def test_cache_key_of_class_and_verification():
+    code = [
+        ('define', '@main'),
+        ('literal_float', 7.5, '%1'), ('literal_float', 2.0, '%2'), ('literal_float', 0.0, '%3'),
+        ('mod_float', '%1', '%2', '%3'), ('print_float', '%3'),
+        ('return_void',),
+    ]
+    _code_cache.clear()
+    assert ModInterpreter(output=OutputBuffer(capture=True)).run(code).output == '1.5\n'
+    output = TranspiledInterpreter(output=OutputBuffer(capture=True)).run(code).output
+    assert output == 'Warning: No run_mod_float() method\n0.0\n'
+    assert len(_code_cache) == 2
+    assert ModInterpreter(output=OutputBuffer(capture=True), verify=True).run(code).output == '1.5\n'
+    assert len(_code_cache) == 3
@@ -0,0 +1,81 @@
+import pytest
+
+from uc_interpreter import FrameInterpreter, Interpreter
+from uc_io import OutputBuffer
+from uc_verifier import VerificationError, check_opcode, verify
+
+OPCODES = Interpreter().opcodes()
+
+
+def _errors(code):
+    with pytest.raises(VerificationError) as e:
+        verify(code, OPCODES)
+    return e.value.errors
+
+
+def _main(*ops):
+    return [('define', '@main')] + list(ops) + [('return_void',)]
+
+
+def test_valid_code(sum_program):
+    code, output = sum_program
+    verify(code, OPCODES)
+    for engine in (Interpreter, FrameInterpreter):
+        machine = engine(output=OutputBuffer(capture=True), verify=True)
+        assert machine.run(code).output == output
+        assert machine.verified
+
+
+@pytest.mark.parametrize('op, message', [
+    (('frobnicate_int', '%1'), 'unknown opcode'),
+    (('jump_int', '%1'), 'unexpected modifiers'),
+    (('print',), 'missing type'),
+    (('alloc_int_0', '%1'), 'malformed modifier'),
+    (('alloc_int_x', '%1'), 'malformed modifier'),
+    (('add_int', '%1', '%2'), 'expected 3 operands'),
+])
+def test_check_opcode(op, message):
+    _kind, error = check_opcode(op, OPCODES)
+    assert _kind is None and message in error
+
+
+@pytest.mark.parametrize('code, message', [
+    (_main(('print_int', '%3')), 'register %3 used before defined'),
+    (_main(('jump', '%9')), 'undefined label %9'),
+    (_main(('1',), ('1',)), 'label defined twice'),
+    (_main(('load_int', '@x', '%1')), 'undeclared global @x'),
+    (_main(('call', '@f', '%1')), 'call to undefined function @f'),
+    ([('literal_int', 1, '%1')] + _main(), 'instruction outside a function'),
+    ([('define', '@f'), ('return_void',)], 'No @main function'),
+])
+def test_rejections(code, message):
+    assert any(message in error for error in _errors(code))
+
+
+def test_register_defined_on_one_path_only():
+    code = _main(
+        ('alloc_int', '%1'), ('literal_bool', True, '%2'), ('cbranch', '%2', '%3', '%4'),
+        ('3',), ('literal_int', 1, '%5'), ('jump', '%4'),
+        ('4',), ('print_int', '%5'))
+    assert _errors(code) == ["8: ('print_int', '%5'): register %5 used before defined"]
+
+
+def test_address_of_unallocated_register():
+    # without allocs, the registers defined by the code are not in memory
+    code = _main(('literal_int', 1, '%1'), ('get_int_*', '%1', '%2'),
+                 ('literal_int', 0, '%3'), ('elem_int', '%2', '%3', '%4'), ('elem_int', '%3', '%3', '%5'))
+    assert _errors(code) == ["2: ('get_int_*', '%1', '%2'): address of unallocated register %1",
+                             "5: ('elem_int', '%3', '%3', '%5'): address of unallocated register %3"]
+    verify(_main(('alloc_int_2', '%1'), ('literal_int', 0, '%2'), ('elem_int', '%1', '%2', '%3'),
+                 ('get_int_*', '%3', '%4')), OPCODES)
+
+
+def test_every_error_is_listed(sum_program):
+    assert len(_errors(sum_program[0] + _main(('print_int', '%7'), ('jump', '%8')))) == 2
+
+
+def test_interpreter_rejects_before_running():
+    output = OutputBuffer(capture=True)
+    with pytest.raises(VerificationError):
+        Interpreter(output=output, verify=True).run(_main(('print_string', '@s'), ('jump', '%1')))
+    assert output.getvalue() == ''
@@ -0,0 +1,192 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_batch.py
+#
+# run_batch function: runs many uCIR programs (each one against its input)
+#                     in a pool of processes
+#                     see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+"""
+To grade or regression-test a set of programs, build a list of jobs, where
+each job is a pair (code, stdin): code is the list of instruction tuples of
+a program and stdin is the text read by it.  For example:
+
+       jobs = [(code, "10\n"), (code, "20\n"), (other_code, "")]
+       for result in run_batch(jobs, timeout=2.0, max_instructions=10**7):
+           print(result.index, result.status, result.exit_code, result.output)
+
+The jobs run in a ProcessPoolExecutor, each one in a fresh interpreter, and
+the results come back in the order of the jobs.  The status of a result is
+'ok', 'limit' (the instruction budget or the timeout was exceeded) or
+'error' (the program raised an exception, see the error field).
+
+Every job has a timeout (DEFAULT_TIMEOUT seconds, unless given), so no
+job can block the batch.  A job that kills its worker (e.g., a segfault or
+a C stack overflow) or that hangs past its timeout (plus _GRACE seconds,
+when the timeout of the interpreter can't stop it) doesn't take down the
+batch: the workers are
+stopped, the jobs that were running run again, each one alone in a new
+pool, and only the guilty job gets an 'error' (or 'limit') result.
+"""
+import multiprocessing
+import os
+import signal
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from time import perf_counter
+from uc_interpreter import Interpreter, LimitExceeded
+from uc_io import InputReader, OutputBuffer
+
+
+# Seconds a job may run by default
+DEFAULT_TIMEOUT = 60.0
+
+# Seconds a job may run past its timeout before its worker is stopped
+_GRACE = 5.0
+
+# Signal that stops a worker (os.kill terminates the process on Windows)
+_KILL = getattr(signal, 'SIGKILL', signal.SIGTERM)
+
+BatchResult = namedtuple('BatchResult', ['index', 'status', 'exit_code', 'output', 'time', 'error'])
+
+
+def run_outcome(index, output, run):
+    """ Call run (a method returning a RunResult) and return the BatchResult
+        of the job index: its status, exit code, the text of output (an
+        OutputBuffer(capture=True)), its time and the error, if any.
+        Also used by LoadedProgram.run_many (see uc_snapshot.py).
+    """
+    start = perf_counter()
+    try:
+        exit_code, _ = run()
+        status, error = 'ok', None
+    except LimitExceeded as e:
+        exit_code, status, error = None, 'limit', str(e)
+    except Exception as e:
+        exit_code, status, error = None, 'error', '%s: %s' % (e.__class__.__name__, e)
+    return BatchResult(index, status, exit_code, output.getvalue(), perf_counter() - start, error)
+
+
+def _run_job(job):
+    """ Run a single job in the worker process. """
+    index, code, stdin, interpreter, timeout, max_instructions = job
+    output = OutputBuffer(capture=True)
+    machine = interpreter(output=output, input=InputReader(text=stdin),
+                          max_instructions=max_instructions, timeout=timeout)
+    return run_outcome(index, output, partial(machine.run, code))
+
+
+def _run_chunk(chunk):
+    """ Run the jobs of a chunk in the worker process. """
+    return [_run_job(job) for job in chunk]
+
+
+def _failed(job, status, error):
+    """ The result of a job that stopped its worker. """
+    return BatchResult(job[0], status, None, '', None, error)
+
+
+def _register_worker(pids):
+    """ Initializer of the workers: record the pid of the worker process. """
+    pids.put(os.getpid())
+
+
+def _stop(pool, pids):
+    """ Kill the workers of the pool (some may be hung) and shut it down.
+        pids has the pid of each worker started by the pool (see
+        _register_worker), so no private attribute of the pool is used.
+    """
+    while not pids.empty():
+        try:
+            os.kill(pids.get(), _KILL)
+        except OSError:
+            pass    # the worker is already gone
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_chunks(chunks, workers, timeout, results):
+    """ Run the chunks in a pool, up to workers chunks at a time (so each
+        one starts when submitted and its deadline is known), storing
+        the results.  When a worker dies or a chunk passes its deadline,
+        the pool is stopped and the jobs of the running chunks are
+        returned, with the reason.  The other chunks stay in chunks.
+    """
+    pids = multiprocessing.SimpleQueue()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_register_worker, initargs=(pids,))
+    running = {}        # future -> (chunk, deadline)
+    try:
+        while chunks or running:
+            while chunks and len(running) < workers:
+                chunk = chunks.popleft()
+                _deadline = perf_counter() + len(chunk) * (timeout + _GRACE)
+                running[pool.submit(_run_chunk, chunk)] = (chunk, _deadline)
+            _deadlines = [_deadline for _, _deadline in running.values() if _deadline is not None]
+            _wait = max(0.0, min(_deadlines) - perf_counter()) if _deadlines else None
+            done, _ = wait(running, timeout=_wait, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                chunk, _ = running.pop(future)
+                try:
+                    for result in future.result():
+                        results[result.index] = result
+                except BrokenProcessPool:
+                    broken = True
+                    running[future] = (chunk, None)
+                except Exception as e:
+                    # e.g., a job or a result that can't be pickled
+                    for job in chunk:
+                        results[job[0]] = _failed(job, 'error', '%s: %s' % (e.__class__.__name__, e))
+            if broken or not done:
+                for future, (chunk, _) in running.items():
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        for result in future.result():
+                            results[result.index] = result
+                _reason = ('error', "The worker process died while running the job") if broken \
+                    else ('limit', "Time limit of %s seconds exceeded (the worker was stopped)" % timeout)
+                return [job for chunk, _ in running.values() for job in chunk
+                        if results[job[0]] is None], _reason
+        return [], None
+    finally:
+        if running:
+            _stop(pool, pids)
+        else:
+            pool.shutdown(wait=True)
+        pids.close()
+
+
+def run_batch(jobs, workers=None, timeout=DEFAULT_TIMEOUT, max_instructions=None,
+              interpreter=Interpreter, chunksize=None):
+    """ Run the (code, stdin) jobs in a pool of workers processes.
+        timeout (seconds, required) and max_instructions limit each
+        job, and interpreter is the class used to run them (e.g., the
+        faster FrameInterpreter).  Returns the list of BatchResult.
+    """
+    if timeout is None or timeout <= 0:
+        raise ValueError("run_batch needs a positive timeout, not %r" % (timeout,))
+    jobs = [(index, code, stdin, interpreter, timeout, max_instructions)
+            for index, (code, stdin) in enumerate(jobs)]
+    if not jobs:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        # a few chunks per worker amortize the pickling of small jobs
+        chunksize = max(1, len(jobs) // (4 * workers))
+    results = [None] * len(jobs)
+    chunks = deque(jobs[start:start + chunksize] for start in range(0, len(jobs), chunksize))
+    while chunks:
+        suspects, _ = _run_chunks(chunks, workers, timeout, results)
+        # any of the jobs running when the pool failed may be guilty:
+        # run each one alone, so a failure is surely its own
+        for job in suspects:
+            _left, _reason = _run_chunks(deque([[job]]), 1, timeout, results)
+            if _left:
+                results[job[0]] = _failed(job, *_reason)
+    return results
@@ -0,0 +1,227 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_binary.py
+#
+# Binary form of the uCIR: dump & load functions and the BinaryProgram class,
+#                          a memory-mapped program that the interpreters run
+#                          as the list of instruction tuples
+#                          see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+"""
+Save the code (the list of instruction tuples) once, and load it to run:
+
+       dump(code, 'program.ucb')
+       ...
+       with load('program.ucb') as program:
+           result = FrameInterpreter().run(program)
+
+load maps the file in memory, so the instruction arrays are not read
+or copied, and their pages are shared by all the processes that run the
+same file.  Only the pool is unmarshaled when the program is loaded, so
+the load time grows with the number of distinct names & literals (and
+the size of the initializers) of the code, not with its length.  The BinaryProgram is a read-only
+sequence of instruction tuples, decoded when indexed, and list(program)
+(or program.tolist()) converts it back to the tuple form.  dumps & loads
+do the same with bytes.
+
+The file has a header, followed by three arrays of 32-bit unsigned ints
+(little endian) and the pool, in the marshal format:
+
+       header     magic 'uCIR', version, marshal version of the pool,
+                  number of instructions & operands and size of the pool,
+                  in bytes
+       opcodes    index of the opcode of each instruction in the opcode table
+       starts     index of the first operand of each instruction (and the
+                  end of the last one) in the operands array
+       operands   index of each operand in the constant pool
+       pool       (opcode table, constant pool): the opcodes & the operands
+                  (names, literals & initializers) used by the code, once each
+"""
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+
+_MAGIC = b'uCIR'
+_VERSION = 2
+_HEADER = struct.Struct('<4sIIIII')
+_ALIGN = 8
+
+
+class BinaryFormatError(Exception):
+    """ The data is not a valid binary uCIR (or it was written by another version). """
+    pass
+
+
+class BinaryProgram(object):
+    """
+    The instructions of a binary uCIR, indexed as a list of tuples.  The
+    arrays are views of the data (a mmap, when loaded from a file), so
+    only the pool is copied.  The interpreters read the code while they
+    run it, so close the program (or leave its with block) after that.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self._view = memoryview(data)
+        if len(data) < _HEADER.size:
+            raise BinaryFormatError("Truncated header")
+        _magic, _version, _marshal, _count, _noperands, _pool = _HEADER.unpack_from(data)
+        if _magic != _MAGIC or _version != _VERSION:
+            raise BinaryFormatError("Not a binary uCIR of version %d" % _VERSION)
+        if _marshal != marshal.version:
+            raise BinaryFormatError("Pool in marshal version %d, expected %d" % (_marshal, marshal.version))
+        _offset = _align(_HEADER.size)
+        self.opcodes, _offset = self._array(_offset, _count)
+        self.starts, _offset = self._array(_offset, _count + 1)
+        self.operands, _offset = self._array(_offset, _noperands)
+        if _offset + _pool > len(data):
+            raise BinaryFormatError("Truncated pool")
+        try:
+            self.names, self.pool = marshal.loads(self._view[_offset:_offset + _pool])
+        except (EOFError, ValueError, TypeError):
+            raise BinaryFormatError("Invalid pool")
+        self._digest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, pc):
+        if isinstance(pc, slice):
+            return [self[_pc] for _pc in range(*pc.indices(len(self)))]
+        if pc < 0:
+            pc += len(self)
+        _operands = self.operands[self.starts[pc]:self.starts[pc + 1]]
+        return (self.names[self.opcodes[pc]],) + tuple(map(self.pool.__getitem__, _operands))
+
+    def __iter__(self):
+        for pc in range(len(self)):
+            yield self[pc]
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __repr__(self):
+        # Identifies the code by its content (e.g., in the transpiler cache)
+        if self._digest is None:
+            self._digest = hashlib.sha256(self._view).hexdigest()
+        return 'BinaryProgram(%s)' % self._digest
+
+    def close(self):
+        """ Release the data.  The program can't be indexed after that. """
+        _data = self.data
+        for _items in (self.opcodes, self.starts, self.operands, self._view):
+            if isinstance(_items, memoryview):
+                _items.release()
+        self.opcodes = self.starts = self.operands = self._view = self.data = None
+        if isinstance(_data, mmap.mmap):
+            _data.close()
+
+    def tolist(self):
+        """ Return the code in the tuple form. """
+        return list(self)
+
+    def _array(self, offset, count):
+        # An array of count uint32 at offset, without copying it if possible
+        _end = offset + 4 * count
+        if _end > len(self.data):
+            raise BinaryFormatError("Truncated arrays")
+        if sys.byteorder == 'little':
+            _items = self._view[offset:_end].cast('I')
+        else:
+            _items = array('I', self._view[offset:_end])
+            _items.byteswap()
+        return _items, _align(_end)
+
+
+def _align(offset):
+    return (offset + _ALIGN - 1) & ~(_ALIGN - 1)
+
+
+def _intern(table, keys, value):
+    # Index of value in table, adding it once (0, False & 0.0, -0.0 differ)
+    if isinstance(value, (list, tuple)):
+        table.append(value)
+        return len(table) - 1
+    _key = (value.__class__, repr(value) if value.__class__ is float else value)
+    _index = keys.get(_key)
+    if _index is None:
+        _index = keys[_key] = len(table)
+        table.append(value)
+    return _index
+
+
+def dumps(ircode):
+    """ Return the binary form of the code, a list of instruction tuples. """
+    names, pool = [], []
+    _name_keys, _pool_keys = {}, {}
+    opcodes = array('I')
+    starts = array('I', [0])
+    operands = array('I')
+    for op in ircode:
+        opcodes.append(_intern(names, _name_keys, op[0]))
+        operands.extend(_intern(pool, _pool_keys, arg) for arg in op[1:])
+        starts.append(len(operands))
+    _pool = marshal.dumps((tuple(names), tuple(pool)))
+    _data = bytearray(_HEADER.pack(_MAGIC, _VERSION, marshal.version, len(opcodes), len(operands), len(_pool)))
+    for _items in (opcodes, starts, operands):
+        if sys.byteorder != 'little':
+            _items.byteswap()
+        _data += bytes(_align(len(_data)) - len(_data))
+        _data += _items.tobytes()
+    _data += bytes(_align(len(_data)) - len(_data))
+    _data += _pool
+    return bytes(_data)
+
+
+def dump(ircode, path):
+    """ Write the binary form of the code to the file path. """
+    _data = dumps(ircode)
+    # write & rename, so a program being loaded never sees a partial file
+    _fd, _tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(_fd, 'wb') as _file:
+            _file.write(_data)
+        # mkstemp creates the file readable by its owner only, but the
+        # other users must be able to map it as any file open() creates
+        os.chmod(_tmp, 0o666 & ~_umask())
+        os.replace(_tmp, path)
+    except BaseException:
+        os.unlink(_tmp)
+        raise
+
+
+def _umask():
+    # The umask of the process (it can only be read by setting it)
+    _mask = os.umask(0)
+    os.umask(_mask)
+    return _mask
+
+
+def loads(data):
+    """ Return the BinaryProgram of the bytes data (see dumps). """
+    return BinaryProgram(data)
+
+
+def load(path):
+    """ Map the file path in memory and return its BinaryProgram. """
+    with open(path, 'rb') as _file:
+        _data = mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return BinaryProgram(_data)
+    except BaseException:
+        _data.close()
+        raise
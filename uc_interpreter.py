@@ -10,7 +10,45 @@
 # Redistribution and use in source form with or without modification are
 # permitted but the source code must retain the above copyright notice.
 # ---------------------------------------------------------------------------------
-import sys
+import asyncio
+import operator
+from collections import namedtuple
+from functools import partial
+from time import perf_counter
+from types import MappingProxyType
+from uc_io import InputReader, OutputBuffer
+from uc_memory import FlatView, ListMemory, MemoryAccessError
+from uc_verifier import verify
+
+
+# Result of Interpreter.run: the value returned by main & the captured output
+RunResult = namedtuple('RunResult', ['exit_code', 'output'])
+
+
+class _Halt(Exception):
+    """ Raised by the sentinel placed after the last linked instruction. """
+    pass
+
+
+class LimitExceeded(Exception):
+    """ Raised when a program exceeds its instruction budget or its time limit. """
+    pass
+
+
+# Number of instructions between two checks of the limits of a program
+_CHECK_EVERY = 1024
+
+
+class _Frame(object):
+    """ State of the caller saved by run_call & restored by _pop. """
+    __slots__ = ('vars', 'labels', 'fp', 'register', 'pc')
+
+    def __init__(self, vars, labels, fp, register, pc):
+        self.vars = vars            # Offsets of the registers of the caller
+        self.labels = labels        # Label table of the caller
+        self.fp = fp                # Frame pointer of the caller
+        self.register = register    # Register of the caller to the return value
+        self.pc = pc                # Return address (program counter)
 
 
 class Interpreter(object):
@@ -34,34 +72,73 @@ class Interpreter(object):
              self.run_add_int('%1', '%2', '%3')
              self.run_print_int('%3')
 
+    All the state of the machine, including its memory, belongs to the
+    object, so many interpreters can run in the same process (and in
+    different threads).
+
     Instructions for use:
-        1. Instantiate an object of the Interpreter class
+        1. Instantiate an object of the Interpreter class, optionally
+           passing the memory backend (see uc_memory.py), the
+           output buffer and the input reader of the program (see
+           uc_io.py), a profiler (see uc_profiler.py) and the limits
+           of the program: max_instructions (a positive count) and
+           timeout (seconds).
+           With verify=True, the code is checked before it runs
+           (see uc_verifier.py)
         2. Call the run method of this object passing the produced
-           code as a parameter
+           code as a parameter. It returns the exit code of the program
+           and its output, when captured (OutputBuffer(capture=True))
+        3. To run the same code many times, call load once, save its
+           state with snapshot and, for each run, restore it, set the
+           input and call execute (see uc_snapshot.py)
     """
 
-    def __init__(self):
-        global inputline, M
-        inputline = []
-        M = 10000 * [None]      # Memory for global & local vars
+    def __init__(self, memory=None, output=None, input=None, profiler=None,
+                 max_instructions=None, timeout=None, verify=False):
+        # Memory for global & local vars. It grows on demand.
+        self.memory = memory if memory is not None else ListMemory()
+        self.M = self.memory.cells
+        # Buffered output of the program, flushed before reading the input
+        self.output = output if output is not None else OutputBuffer()
+        # Tokens read by the program, from sys.stdin by default
+        self.input = input if input is not None else InputReader()
+        self.input.on_fill = self.output.flush
+        # Optional profiler. When given, run uses an instrumented loop
+        self.profiler = profiler
+        # Superinstructions of the linked program: pc -> number of instructions
+        self.fused = {}
+        # Optional limits. When given (and no profiler), run checks them
+        if max_instructions is not None and max_instructions <= 0:
+            raise ValueError("max_instructions must be positive, not %r" % (max_instructions,))
+        self.max_instructions = max_instructions
+        self.timeout = timeout
+        # Instructions run between two yields to the event loop (run_async)
+        self.quantum = None
+        # Verify the code before loading it (see uc_verifier.py). The
+        # verified code is linked without checking each instruction.
+        self.verify = verify
+        self.verified = False
 
         self.globals = {}       # Dictionary of address of global vars & constants
-        self.vars = {}          # Dictionary of address of local vars relative to sp
+        self.vars = {}          # Dictionary of offset of local vars relative to fp
+        self.fp = 0             # Frame pointer (address of the frame of the current function)
 
         self.offset = 0         # offset (index) of local & global vars. Note that
                                 # each instance of var has absolute address in Memory
-        self.stack = []         # Stack to save address of vars between calls
-        self.sp = []            # Stack to save & restore the last offset
+        self.stack = []         # Stack of the frames (see _Frame) of the callers
 
         self.params = []        # List of parameters from caller (address)
         self.result = None      # Result Value (address) from the callee
 
-        self.registers = []     # Stack of register names (in the caller) to return value
-        self.returns = []       # Stack of return addresses (program counters)
+        self.functions = {}     # Label table (label -> pc) of each function, built by run
+        self.labels = {}        # Label table of the current function
+        self.layouts = {}       # Frame layout (register -> offset, size) of each function
 
         self.pc = 0             # Program Counter
         self.start = 0          # PC of the main function
+        self.exit_code = None   # Value returned by main
         self.code = None
+        self.program = None     # Linked code: one bound handler per instruction
 
     def _extract_operation(self, source):
         _modifier = {}
@@ -79,182 +156,444 @@ class Interpreter(object):
         return (_opcode, _modifier)
 
     def _copy_data(self, address, size, value):
+        # the initializer is not copied here: the memory writes (or, in
+        # the LazyMemory, shares) the chars of a string or a view of the
+        # values of the rows of a matrix, in row-major order
         if isinstance(value, str):
-            _value = list(value)
+            _value = value[:size]
         elif any(isinstance(item, list) for item in value):
-            _value = [item for sublist in value for item in sublist]
+            if len(set(len(row) for row in value)) == 1:
+                _value = FlatView(value, size)
+            else:
+                _value = [item for sublist in value for item in sublist][:size]
         else:
-            _value = value
-        M[address:address+size] = _value
+            _value = value[:size] if len(value) > size else value
+        self.memory.write(address, _value)
 
     def run(self, ircode):
         """
         Run intermediate code in the interpreter.  ircode is a list
-        of instruction tuples.  Each instruction (opcode, *args) is
-        dispatched to a method self.run_opcode(*args)
+        of instruction tuples (or a BinaryProgram, see uc_binary.py,
+        indexed as such a list).  Each instruction (opcode, *args) is
+        dispatched to a method self.run_opcode(*args).  Returns the
+        pair (exit code, output), where output is the text captured by
+        the output buffer, or None if it was written to a stream.
         """
+        self.load(ircode)
+        return self.execute()
+
+    def load(self, ircode):
+        """
+        Load the intermediate code: store the global vars & constants,
+        and link the code (the addresses of globals are known then).
+        The program is ready to execute from its main function, and
+        its state can be saved with snapshot, to run it many times.
+        """
+        if self.verify:
+            verify(ircode, self.opcodes())
+            self.verified = True
+        self._load(ircode)
+        self.program = self._link(ircode)
+        self.pc = self.start
+
+    def execute(self):
+        """ Run the program loaded by load (see run). """
+        try:
+            self._dispatch()
+        except _Halt:
+            pass
+        finally:
+            self.output.flush()
+        return RunResult(self.exit_code or 0, self.output.getvalue() if self.output.capture else None)
+
+    async def run_async(self, ircode, quantum=1000):
+        """
+        Same as run, but as a coroutine that yields to the event loop
+        every quantum instructions, so that many programs can run in
+        the same thread, each one in its task:
+
+            await asyncio.gather(*(Interpreter(input=AsyncInputReader(reader),
+                                               max_instructions=10**7).run_async(code)
+                                   for reader in sessions))
+
+        When the input reader has a wait coroutine (see AsyncInputReader
+        in uc_io.py), it's awaited before each read instruction that
+        would block.  The limits are checked as in run; the timeout is
+        wall clock time, including the time waiting for the input.  With
+        a profiler, the time of each function also includes the time
+        the task waits for the input & for the other tasks.
+        """
+        # the quantum only selects the linked code (see _counting)
+        self.quantum = quantum
+        try:
+            self.load(ircode)
+        finally:
+            self.quantum = None
+        try:
+            await self._execute_async(self.program, quantum)
+        except _Halt:
+            pass
+        finally:
+            self.output.flush()
+        return RunResult(self.exit_code or 0, self.output.getvalue() if self.output.capture else None)
+
+    def opcodes(self):
+        """ Return the opcodes that have a run_ method (see uc_verifier.py). """
+        return {name[4:] for name in dir(self) if name.startswith('run_') and name != 'run_async'}
+
+    def snapshot(self):
+        """
+        Return the state of a loaded program (see load), before it runs:
+        the cells of the memory in use & the offset of the next cell.
+        """
+        return self.memory.snapshot(), self.offset
+
+    def restore(self, state):
+        """ Return to a state saved by snapshot, ready to execute again. """
+        _memory, self.offset = state
+        self.memory.restore(_memory)
+        self.pc = self.start
+        self.fp = 0
+        self.vars = {}
+        self.labels = {}
+        self.stack = []
+        self.params = []
+        self.exit_code = None
+
+    def _load(self, ircode):
+        # Store the global vars & constants. Also, set the start pc to the
+        # main function entry and build the label table of each function, once.
+        M = self.M
 
-        # First, store the global vars & constants
-        # Also, set the start pc to the main function entry
         self.code = ircode
         self.pc = 0
         self.offset = 0
-        while True:
-            try:
-                op = ircode[self.pc]
-            except IndexError:
-                break
-            if not op[0].isdigit():
+        _labels = None
+        for op in ircode:
+            if op[0].isdigit():
+                # labels don't go to memory, just in the table of the function
+                _labels['%' + op[0]] = self.pc + 1
+            else:
                 opcode, modifier = self._extract_operation(op[0])
                 if opcode.startswith('global'):
-                    self.globals[op[1]] = self.offset
                     # get the size of global var
                     if not modifier:
                         # size equals 1 or is a constant, so we use only
                         # one slot in the memory to make it simple.
+                        self.globals[op[1]] = self._alloc(1)
                         if len(op) == 3:
-                            M[self.offset] = op[2]
-                        self.offset += 1
+                            M[self.globals[op[1]]] = op[2]
                     else:
                         _len = 1
                         for args in modifier.values():
                             if args.isdigit():
                                 _len *= int(args)
+                        self.globals[op[1]] = self._alloc(_len)
                         if len(op) == 3:
-                            self._copy_data(self.offset, _len, op[2])
-                        self.offset += _len
+                            self._copy_data(self.globals[op[1]], _len, op[2])
                 elif opcode == 'define':
-                        self.globals[op[1]] = self.offset
-                        M[self.offset] = self.pc
-                        self.offset += 1
+                        self.globals[op[1]] = self._alloc(1)
+                        M[self.globals[op[1]]] = self.pc
                         if op[1] == '@main':
                             self.start = self.pc
+                        _labels = {}
+                        self.functions[op[1]] = MappingProxyType(_labels)
             self.pc += 1
 
-        # Now, running the program starting from the main function
-        self.pc = self.start
+    def _counting(self):
+        # True when the run must count the instructions: the profiler,
+        # the limits & the quantum of run_async need the linked program
+        return (self.profiler is not None or self.max_instructions is not None
+                or self.timeout is not None or self.quantum is not None)
+
+    def _dispatch(self):
+        # Run the linked program with the loop required by the options
+        if self.profiler is not None:
+            self._execute_profiled(self.program, self.code)
+        elif self.max_instructions is not None or self.timeout is not None:
+            self._execute_limited(self.program)
+        else:
+            self._execute(self.program)
+
+    def _execute(self, program):
+        # Each slot of the linked program is a handler with its args
+        # already bound, so the loop only fetches & calls it.
         while True:
-            try:
-                op = ircode[self.pc]
-            except IndexError:
-                break
+            op = program[self.pc]
             self.pc += 1
-            if not op[0].isdigit():
-                opcode, modifier = self._extract_operation(op[0])
-                if hasattr(self, "run_" + opcode):
-                    if not modifier:
-                        getattr(self, "run_" + opcode)(*op[1:])
+            op()
+
+    async def _execute_async(self, program, quantum):
+        # Same as _execute_limited, yielding to the event loop after each
+        # quantum of instructions and awaiting the input before a read.
+        # With a profiler, it also does the work of _execute_profiled.
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.prepare(self.code)
+            events = profiler.events + [None]
+            owners = profiler.owners
+            counts = len(program) * [0]
+        budget = self.max_instructions
+        deadline = None if self.timeout is None else perf_counter() + self.timeout
+        _wait = getattr(self.input, 'wait', None)
+        _ready = getattr(self.input, 'ready', None)
+        reads = [_wait is not None and op[0].startswith('read') for op in self.code] + [False]
+        executed = 0
+        try:
+            while True:
+                _count = quantum if budget is None else min(quantum, budget - executed)
+                if _count <= 0:
+                    raise LimitExceeded("Instruction budget of %d exceeded" % budget)
+                for _ in range(_count):
+                    pc = self.pc
+                    if reads[pc] and not _ready():
+                        await _wait()
+                    op = program[pc]
+                    self.pc = pc + 1
+                    if profiler is not None:
+                        counts[pc] += 1
+                        if events[pc] is not None:
+                            if events[pc] == 'enter':
+                                profiler.enter(owners[pc])
+                            else:
+                                profiler.leave()
+                    op()
+                executed += _count
+                if deadline is not None and perf_counter() > deadline:
+                    raise LimitExceeded("Time limit of %s seconds exceeded" % self.timeout)
+                await asyncio.sleep(0)
+        finally:
+            if profiler is not None:
+                profiler.finish(counts, self.fused)
+
+    def _execute_limited(self, program):
+        # Same as _execute, checking the instruction budget (exactly) and
+        # the time limit (every _CHECK_EVERY instructions).
+        budget = self.max_instructions
+        deadline = None if self.timeout is None else perf_counter() + self.timeout
+        executed = 0
+        check = _CHECK_EVERY if budget is None else min(_CHECK_EVERY, budget)
+        while True:
+            op = program[self.pc]
+            self.pc += 1
+            op()
+            executed += 1
+            if executed == check:
+                if budget is not None and executed >= budget:
+                    raise LimitExceeded("Instruction budget of %d exceeded" % budget)
+                if deadline is not None and perf_counter() > deadline:
+                    raise LimitExceeded("Time limit of %s seconds exceeded" % self.timeout)
+                check += _CHECK_EVERY if budget is None else min(_CHECK_EVERY, budget - executed)
+
+    def _execute_profiled(self, program, ircode):
+        # Same as _execute, counting the instructions of each pc and
+        # telling the profiler when a function is entered or left.
+        profiler = self.profiler
+        profiler.prepare(ircode)
+        events = profiler.events + [None]
+        owners = profiler.owners
+        counts = len(program) * [0]
+        try:
+            while True:
+                pc = self.pc
+                counts[pc] += 1
+                op = program[pc]
+                self.pc = pc + 1
+                if events[pc] is not None:
+                    if events[pc] == 'enter':
+                        profiler.enter(owners[pc])
                     else:
-                        getattr(self, "run_" + opcode + '_')(*op[1:], **modifier)
-                else:
-                    print("Warning: No run_" + opcode + "() method", flush=True)
+                        profiler.leave()
+                op()
+        finally:
+            profiler.finish(counts, self.fused)
+
+    def _link(self, ircode):
+        """
+        Link the intermediate code once, before running it. Each
+        instruction is decoded and replaced by its run_opcode method
+        with the arguments & modifiers bound to it.  Labels & globals
+        (stored by _load) become no-ops and a sentinel that halts the machine is appended,
+        so that the pc of every instruction remains the same.
+        """
+        program = []
+        for op in ircode:
+            if op[0].isdigit() or op[0].startswith('global'):
+                program.append(self._nop)
+                continue
+            opcode, modifier = self._extract_operation(op[0])
+            if not self.verified and not hasattr(self, "run_" + opcode):
+                program.append(partial(self._no_method, opcode))
+            elif not modifier:
+                program.append(partial(getattr(self, "run_" + opcode), *op[1:]))
+            else:
+                program.append(partial(getattr(self, "run_" + opcode + '_'), *op[1:], **modifier))
+        program.append(self._halt)
+        return program
 
     #
     # Auxiliary methods
     #
-    def _alloc_labels(self):
-        # Alloc labels for current function definition. Due to the uCIR and due to
-        # the chosen memory model, this is done every time we enter a function.
-        _lpc = self.pc
-        while True:
-            try:
-                _opcode = self.code[_lpc][0]
-                _lpc += 1
-                if _opcode == 'define':
-                    break
-                elif _opcode.isdigit():
-                    # labels don't go to memory, just in the dictionary
-                    self.vars['%' + _opcode] = _lpc
-            except IndexError:
-                break
+    def _alloc(self, size):
+        # Alloc size cells at the top of the used memory, returning their address
+        _address = self.offset
+        self.offset += size
+        self.memory.reserve(self.offset)
+        return _address
 
-    def _alloc_reg(self, target):
-        # Alloc space in memory and save the offset in the dictionary
-        # for new vars or tempraries, only.
-        if target not in self.vars:
-            self.vars[target] = self.offset
-            self.offset += 1
+    def _dim(self, modifier):
+        # Number of memory cells described by the modifiers (* is ignored)
+        _dim = 1
+        for arg in modifier.values():
+            if arg.isdigit():
+                _dim *= int(arg)
+        return _dim
+
+    def _exit(self, value):
+        # Stop the machine with the value returned by main (0 if None)
+        self.output.write('\n')
+        self.exit_code = 0 if value is None else value
+        raise _Halt()
+
+    def _frame_layout(self, ircode, start):
+        # Compute the layout of the function that begins at the pc start:
+        # the slot of each register and the size of its frame. Registers
+        # %n goes to the slot n, so the parameters and the return value
+        # are where the _push expects them. Labels come from run.
+        size = 0
+        arrays = []
+        for pc in range(start + 1, len(ircode)):
+            op = ircode[pc]
+            if op[0] == 'define':
+                break
+            if op[0].isdigit():
+                continue
+            for arg in op[1:]:
+                if isinstance(arg, str) and arg.startswith('%'):
+                    size = max(size, int(arg[1:]) + 1)
+            opcode, modifier = self._extract_operation(op[0])
+            if opcode.startswith('alloc') and modifier:
+                arrays.append((op[1], self._dim(modifier)))
+            elif opcode.startswith('load') and 'ptr0' not in modifier and modifier:
+                arrays.append((op[2], self._dim(modifier)))
+        slots = {}
+        for name, dim in arrays:
+            if dim > 1 and name not in slots:
+                slots[name] = size
+                size += dim
+        return slots, size, self.functions[ircode[start][1]]
 
     def _get_address(self, source):
         if source.startswith('@'):
             return self.globals[source]
         else:
-            return self.vars[source]
-
-    def _get_input(self):
-        global inputline
-        while True:
-            if len(inputline) > 0:
-                break
-            inputline = sys.stdin.readline()
-            if not inputline:
-                print("Unexpected end of input file.", flush=True)
-            inputline = inputline[:-1].strip().split()
+            return self.fp + self.vars[source]
 
     def _get_value(self, source):
+        M = self.M
         if source.startswith('@'):
             return M[self.globals[source]]
         else:
-            return M[self.vars[source]]
+            return M[self.fp + self.vars[source]]
+
+    def _halt(self):
+        raise _Halt()
+
+    def _layout(self, source):
+        # Frame layout of the function source, computed on its first call:
+        # the register %n at the offset n and the arrays after them.
+        _layout = self.layouts.get(source)
+        if _layout is None:
+            _slots, _size, _ = self._frame_layout(self.code, self.M[self.globals[source]])
+            # %0 is the return value of main & functions without parameters
+            _size = max(_size, 1)
+            _registers = max(min(_slots.values(), default=_size), 1)
+            _offsets = {'%' + str(k): k for k in range(_registers)}
+            _offsets.update(_slots)
+            _layout = self.layouts[source] = (_offsets, _size)
+        return _layout
 
     def _load_multiple_values(self, size, varname, target):
-        self.vars[target] = self.offset
-        self.offset += size
+        # the target has room for the values in the frame layout
         self._store_multiple_values(size, target, varname)
 
-    def _push(self):
-        # save the addresses of the vars from caller & their last offset
-        self.stack.append(self.vars)
-        self.sp.append(self.offset)
+    def _bad_address(self, address):
+        # elem computes the only addresses that are not of a var, so it
+        # checks them: the plain list of the ListMemory would read the
+        # negative ones from its end and fail on the ones past it
+        raise MemoryAccessError("Segmentation fault: address %d out of [0, %d)" % (address, len(self.M)))
 
-        # clear the dictionary of caller local vars and their offsets in memory
-        # and copy the parameters passed to the callee in their local vars.
-        # Finally, cleanup the parameters list used to transfer these vars
-        self.vars = {}
-        idx = -1
-        for idx, val in enumerate(self.params):
-            # Note that arrays (size >=1) are passed by reference only.
-            self.vars['%' + str(idx)] = self.offset
-            M[self.offset] = M[val]
-            self.offset += 1
+    def _no_method(self, opcode):
+        self.output.write("Warning: No run_" + opcode + "() method\n")
+
+    def _nop(self):
+        pass
+
+    def _push(self, source):
+        M = self.M
+        # alloc the frame of the callee (the caller was saved by run_call)
+        # and copy the parameters, at once, to its first registers.  Note
+        # that arrays (size >=1) are passed by reference only.
+        _params = self.params
+        _count = len(_params)
+        self.vars, _size = self._layout(source)
+        fp = self.fp = self._alloc(max(_size, _count + 1))
+        M[fp:fp + _count] = [M[val] for val in _params]
         self.params = []
 
-        # alloc register to the return value & initialize it with 0.
-        self.vars['%' + str(idx+1)] = self.offset
-        M[self.offset] = 0
-        self.offset += 1
+        # the register after the parameters gets the return value, starting with 0
+        M[fp + _count] = 0
 
-        self._alloc_labels()
+        # the labels of the callee were computed before running the program
+        self.labels = self.functions[source]
 
     def _pop(self, target):
-        if self.returns:
+        M = self.M
+        if self.stack:
             # get the return value
             _value = M[target]
-            # restore the vars of the caller
-            self.vars = self.stack.pop()
+            # release the frame of the callee & restore the caller
+            _frame = self.stack.pop()
+            self.offset = self.fp
+            self.fp = _frame.fp
+            self.vars = _frame.vars
+            self.labels = _frame.labels
             # store in the caller return register the _value
-            M[self.vars[self.registers.pop()]] = _value
-            # restore the last offset from the caller
-            self.offset = self.sp.pop()
+            M[self.fp + self.vars[_frame.register]] = _value
             # jump to the return point in the caller
-            self.pc = self.returns.pop()
+            self.pc = _frame.pc
         else:
             # We reach the end of main function, so return to system
             # with the code returned by main in the return register.
-            print(flush=True)
             if target is None:
                 # void main () was defined, so exit with value 0
-                sys.exit(0)
+                self._exit(None)
             else:
-                sys.exit(M[target])
+                self._exit(M[target])
+
+    def _read_value(self, convert):
+        # Consume the next token of the input, converting it when possible
+        try:
+            _token = self.input.token()
+        except EOFError:
+            self.output.write("Unexpected end of input file.\n")
+            self._exit(1)
+        if convert is not None:
+            try:
+                return convert(_token)
+            except ValueError:
+                pass
+        return _token
 
     def _store_deref(self, target, value):
+        M = self.M
         if target.startswith('@'):
             M[M[self.globals[target]]] = value
         else:
-            M[M[self.vars[target]]] = value
+            M[M[self.fp + self.vars[target]]] = value
 
     def _store_multiple_values(self, dim, target, value):
+        M = self.M
         _left = self._get_address(target)
         _right = self._get_address(value)
         if value.startswith('@'):
@@ -265,17 +604,17 @@ class Interpreter(object):
         M[_left:_left+dim] = M[_right:_right+dim]
 
     def _store_value(self, target, value):
+        M = self.M
         if target.startswith('@'):
             M[self.globals[target]] = value
         else:
-            M[self.vars[target]] = value
+            M[self.fp + self.vars[target]] = value
 
     #
     # Run Operations, except Binary, Relational & Cast
     #
     def run_alloc_int(self, varname):
-        self._alloc_reg(varname)
-        M[self.vars[varname]] = 0
+        self.M[self.fp + self.vars[varname]] = 0
 
     run_alloc_float = run_alloc_int
     run_alloc_char = run_alloc_int
@@ -285,47 +624,47 @@ class Interpreter(object):
         for arg in kwargs.values():
             if arg.isdigit():
                 _dim *= int(arg)
-        self.vars[varname] = self.offset
-        M[self.offset:self.offset + _dim] = _dim * [0]
-        self.offset += _dim
+        # the frame layout has room for the array
+        self.memory.zero(self.fp + self.vars[varname], _dim)
 
     run_alloc_float_ = run_alloc_int_
     run_alloc_char_ = run_alloc_int_
 
     def run_call(self, source, target):
-        # alloc register to return and append it to register stack
-        self._alloc_reg(target)
-        self.registers.append(target)
-        # save the return pc in the return stack
-        self.returns.append(self.pc)
+        M = self.M
+        # save the caller, with its register to the return value & the return pc
+        self.stack.append(_Frame(self.vars, self.labels, self.fp, target, self.pc))
         # jump to the calle function
         if source.startswith('@'):
             self.pc = M[self.globals[source]]
         else:
-            self.pc = M[self.vars[source]]
+            self.pc = M[self.fp + self.vars[source]]
 
     def run_cbranch(self, expr_test, true_target, false_target):
-        if M[self.vars[expr_test]]:
-            self.pc = self.vars[true_target]
+        if self.M[self.fp + self.vars[expr_test]]:
+            self.pc = self.labels[true_target]
         else:
-            self.pc = self.vars[false_target]
+            self.pc = self.labels[false_target]
 
     # Enter the function
     def run_define(self, source):
         if source == '@main':
-            # alloc register to the return value but not initialize it.
-            # We use the "None" value to check if main function returns void.
-            self._alloc_reg('%0')
-            # alloc the labels with respective pc's
-            self._alloc_labels()
+            # alloc the frame & the register to the return value but not
+            # initialize it. We use the "None" value to check if main
+            # function returns void.
+            self.vars, _size = self._layout(source)
+            self.fp = self._alloc(_size)
+            # use the labels of main with respective pc's
+            self.labels = self.functions[source]
         else:
-            self._push()
+            self._push(source)
 
     def run_elem_int(self, source, index, target):
-        self._alloc_reg(target)
         _aux = self._get_address(source)
         _idx = self._get_value(index)
         _address = _aux + _idx
+        if not 0 <= _address < len(self.M):
+            self._bad_address(_address)
         self._store_value(target, _address)
 
     run_elem_float = run_elem_int
@@ -344,26 +683,26 @@ class Interpreter(object):
     run_get_char_ = run_get_int_
 
     def run_jump(self, target):
-        self.pc = self.vars[target]
+        self.pc = self.labels[target]
 
     # load literals into registers
     def run_literal_int(self, value, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = value
+        self.M[self.fp + self.vars[target]] = value
 
     run_literal_float = run_literal_int
     run_literal_char = run_literal_int
+    run_literal_bool = run_literal_int
 
     # Load/stores
     def run_load_int(self, varname, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = self._get_value(varname)
+        self.M[self.fp + self.vars[target]] = self._get_value(varname)
 
     run_load_float = run_load_int
     run_load_char = run_load_int
     run_load_bool = run_load_int
 
     def run_load_int_(self, varname, target, **kwargs):
+        M = self.M
         _ref = 0
         _dim = 1
         for arg in kwargs.values():
@@ -374,76 +713,48 @@ class Interpreter(object):
         if _ref == 0:
             self._load_multiple_values(_dim, varname, target)
         elif _dim == 1 and _ref == 1:
-            self._alloc_reg(target)
-            M[self.vars[target]] = M[self._get_value(varname)]
+            M[self.fp + self.vars[target]] = M[self._get_value(varname)]
 
     run_load_float_ = run_load_int_
     run_load_char_ = run_load_int_
 
     def run_param_int(self, source):
-        self.params.append(self.vars[source])
+        self.params.append(self.fp + self.vars[source])
 
     run_param_float = run_param_int
     run_param_char = run_param_int
 
     def run_print_string(self, source):
-        _res = list(self._get_value((source)))
-        for c in _res:
-            print(c, end="", flush=True)
+        # the whole string goes to the output at once
+        self.output.write(''.join(self._get_value(source)))
 
     def run_print_int(self, source):
-        print(self._get_value(source), end="", flush=True)
+        self.output.write(str(self._get_value(source)))
 
     run_print_float = run_print_int
     run_print_char = run_print_int
     run_print_bool = run_print_int
 
     def run_read_int(self, source):
-        global inputline
-        self._get_input()
-        try:
-            v1 = inputline[0]
-            inputline = inputline[1:]
-            try:
-                v2 = int(v1)
-            except:
-                v2 = v1
-        except:
-            print("Illegal input value.", flush=True)
-        self._alloc_reg(source)
-        self._store_value(source, v2)
+        _value = self._read_value(int)
+        self._store_value(source, _value)
 
     def run_read_float(self, source):
-        global inputline
-        self._get_input()
-        try:
-            v1 = inputline[0]
-            inputline = inputline[1:]
-            try:
-                v2 = float(v1)
-            except:
-                v2 = v1
-        except:
-            print("Illegal input value.", flush=True)
-        self._alloc_reg(source)
-        self._store_value(source, v2)
+        _value = self._read_value(float)
+        self._store_value(source, _value)
 
     def run_read_char(self, source):
-        global inputline
-        self._get_input()
-        v1 = inputline[0]
-        inputline = inputline[1:]
-        self._alloc_reg(source)
-        self._store_value(source, v1)
+        _value = self._read_value(None)
+        self._store_value(source, _value)
 
     def run_return_int(self, target):
-        self._pop(self.vars[target])
+        self._pop(self.fp + self.vars[target])
 
     run_return_float = run_return_int
     run_return_char = run_return_int
 
     def run_return_void(self):
-        self._pop(M[self.vars['%0']])
+        self._pop(self.M[self.fp + self.vars['%0']])
 
     def run_store_int(self, source, target):
         self._store_value(target, self._get_value(source))
@@ -472,28 +783,28 @@ class Interpreter(object):
     # perform binary, relational & cast operations
     #
     def run_add_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] + M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] + M[fp + regs[right]]
 
     def run_sub_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] - M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] - M[fp + regs[right]]
 
     def run_mul_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] * M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] * M[fp + regs[right]]
 
     def run_mod_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] % M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] % M[fp + regs[right]]
 
     def run_div_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] // M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] // M[fp + regs[right]]
 
     def run_div_float(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] / M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] / M[fp + regs[right]]
 
     # Floating point ops (same as int)
     run_add_float = run_add_int
@@ -502,28 +813,28 @@ class Interpreter(object):
 
     # Integer comparisons
     def run_lt_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] < M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] < M[fp + regs[right]]
 
     def run_le_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] <= M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] <= M[fp + regs[right]]
 
     def run_gt_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] > M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] > M[fp + regs[right]]
 
     def run_ge_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] >= M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] >= M[fp + regs[right]]
 
     def run_eq_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] == M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] == M[fp + regs[right]]
 
     def run_ne_int(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] != M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] != M[fp + regs[right]]
 
     # Float comparisons
     run_lt_float = run_lt_int
@@ -546,21 +857,472 @@ class Interpreter(object):
     run_ne_bool = run_ne_int
 
     def run_and_bool(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] and M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] and M[fp + regs[right]]
 
     def run_or_bool(self, left, right, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = M[self.vars[left]] or M[self.vars[right]]
+        M, fp, regs = self.M, self.fp, self.vars
+        M[fp + regs[target]] = M[fp + regs[left]] or M[fp + regs[right]]
 
     def run_not_bool(self, source, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = not self._get_value(source)
+        self.M[self.fp + self.vars[target]] = not self._get_value(source)
 
     def run_sitofp(self, source, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = float(self._get_value(source))
+        self.M[self.fp + self.vars[target]] = float(self._get_value(source))
 
     def run_fptosi(self, source, target):
-        self._alloc_reg(target)
-        M[self.vars[target]] = int(self._get_value(source))
+        self.M[self.fp + self.vars[target]] = int(self._get_value(source))
+
+
+# Binary & relational operations of the uCIR, shared by the linked handlers
+# of the FrameInterpreter and the constant folding of the Optimizer.  Note that div_int is an integer division and
+# that and/or keep the Python semantics used by run_and_bool & run_or_bool.
+BINARY_OPS = {
+    'add': operator.add, 'sub': operator.sub, 'mul': operator.mul,
+    'mod': operator.mod, 'div': operator.floordiv,
+    'lt': operator.lt, 'le': operator.le, 'gt': operator.gt,
+    'ge': operator.ge, 'eq': operator.eq, 'ne': operator.ne,
+    'and': lambda left, right: left and right,
+    'or': lambda left, right: left or right,
+}
+
+
+class FrameInterpreter(Interpreter):
+    """
+    Runs the uC intermediate code resolving the operands once, at link
+    time, instead of looking up the name of each register in the
+    self.vars dictionary on every access.
+
+    For each function (define region) a frame layout is computed: the
+    register %n is kept in the slot n of the frame and the arrays are
+    placed after the last register.  Each frame lives in the memory M
+    starting at the frame pointer self.fp, so that a local operand is
+    accessed as M[fp + k] and a global one as M[k], where k and the
+    kind of the operand were decided by the linker.  The labels are
+    also resolved to their pc's, so jumps don't need the dictionary.
+
+    With fuse=True, the linker also replaces frequent sequences of
+    instructions by superinstructions (see the superinstructions table),
+    which run the whole sequence in a single dispatch.  The number of
+    sites fused for each superinstruction is kept in fusion_stats, and
+    with count_fusions=True also the number of times they were executed
+    (see fusion_report).  A profiler still counts each instruction of a
+    superinstruction under its own opcode.
+
+    Instructions for use are the same of the Interpreter class.  It
+    runs the same programs, printing the same output.
+    """
+
+    # Superinstructions: (name, length) of the sequences of instructions
+    # fused by the method _fuse_<name>, tried in this order.  To add a new
+    # one, write the method returning the closure of the fused sequence
+    # (or None when the operands don't fit) and add it here.
+    superinstructions = (
+        ('load_load_binary_store', 4),
+        ('compare_cbranch', 2),
+        ('literal_binary', 2),
+    )
+
+    def __init__(self, memory=None, output=None, input=None, profiler=None,
+                 max_instructions=None, timeout=None, fuse=False, count_fusions=False, verify=False):
+        super().__init__(memory, output, input, profiler, max_instructions, timeout, verify)
+        self.frames = []        # Stack of (return pc, caller fp, address of return value)
+        self._layout = None     # (slots, size, labels) of the function being linked
+        self._link_pc = 0       # pc of the instruction being linked
+
+        self.fuse = fuse                    # Link superinstructions
+        self.count_fusions = count_fusions  # Count the executions of each superinstruction
+        self.fusion_stats = {}              # name -> [sites, executions]
+
+    def _link(self, ircode):
+        """
+        Link the intermediate code, replacing each instruction by a
+        closure with its operands already resolved to frame slots,
+        global addresses or pc's.
+        """
+        program = []
+        self.fused = {}
+        _fused_until = 0
+        for pc, op in enumerate(ircode):
+            self._link_pc = pc
+            if op[0].isdigit() or op[0].startswith('global'):
+                program.append(self._nop)
+                continue
+            opcode, modifier = self._extract_operation(op[0])
+            if opcode == 'define':
+                self._layout = self._frame_layout(ircode, pc)
+            _kind = opcode.split('_')[0]
+            if not self.verified and (not hasattr(self, "run_" + opcode) or self._layout is None):
+                program.append(partial(self._no_method, opcode))
+                continue
+            if self.fuse and pc >= _fused_until:
+                # the instructions inside a superinstruction are linked as
+                # usual, but they are only reached through their head.
+                _fused, _length = self._fuse_at(ircode, pc)
+                if _fused is not None:
+                    program.append(_fused)
+                    _fused_until = pc + _length
+                    self.fused[pc] = _length
+                    continue
+            if _kind in BINARY_OPS:
+                program.append(self._link_binary(opcode, *op[1:]))
+            else:
+                program.append(getattr(self, "_link_" + _kind)(opcode, modifier, *op[1:]))
+        program.append(self._halt)
+        return program
+
+    def restore(self, state):
+        super().restore(state)
+        self.frames = []
+
+    def fusion_report(self):
+        """ Return a text table with the sites & executions of each superinstruction. """
+        lines = ['%-28s %10s %12s' % ('superinstruction', 'sites', 'executions')]
+        for name, (sites, executions) in sorted(self.fusion_stats.items(), key=lambda item: -item[1][0]):
+            lines.append('%-28s %10d %12s' % (name, sites, executions if self.count_fusions else '-'))
+        return '\n'.join(lines)
+
+    #
+    # Auxiliary methods
+    #
+    def _binary_fn(self, opcode):
+        # Python function of a binary or relational operation
+        return operator.truediv if opcode == 'div_float' else BINARY_OPS[opcode.split('_')[0]]
+
+    def _leave(self, value):
+        M = self.M
+        # Return from the callee, storing the value in the caller register
+        if self.frames:
+            self.pc, fp, address = self.frames.pop()
+            self.offset = self.fp
+            self.fp = fp
+            M[address] = value
+        else:
+            self._exit(value)
+
+    def _operand(self, name):
+        # Resolve an operand to a pair (k, is_global)
+        if name.startswith('@'):
+            return self.globals[name], True
+        return self._slot(name), False
+
+    def _slot(self, name):
+        # Resolve a local operand to its slot in the frame
+        _slot = self._layout[0].get(name)
+        return int(name[1:]) if _slot is None else _slot
+
+    #
+    # Linkers: each one returns the closure that runs the instruction
+    #
+    def _link_alloc(self, opcode, modifier, varname):
+        M = self.M
+        _slot = self._slot(varname)
+        _dim = self._dim(modifier)
+        if _dim == 1:
+            def run():
+                M[self.fp + _slot] = 0
+        else:
+            def run():
+                self.memory.zero(self.fp + _slot, _dim)
+        return run
+
+    def _link_binary(self, opcode, left, right, target):
+        M = self.M
+        _fn = self._binary_fn(opcode)
+        _left, _right, _target = self._slot(left), self._slot(right), self._slot(target)
+
+        def run():
+            fp = self.fp
+            M[fp + _target] = _fn(M[fp + _left], M[fp + _right])
+        return run
+
+    def _link_call(self, opcode, modifier, source, target):
+        M = self.M
+        _source, _global = self._operand(source)
+        _target = self._slot(target)
+
+        def run():
+            fp = self.fp
+            self.frames.append((self.pc, fp, fp + _target))
+            self.pc = M[_source if _global else fp + _source]
+        return run
+
+    def _link_cbranch(self, opcode, modifier, expr_test, true_target, false_target):
+        M = self.M
+        _test = self._slot(expr_test)
+        _labels = self._layout[2]
+        _true, _false = _labels[true_target], _labels[false_target]
+
+        def run():
+            self.pc = _true if M[self.fp + _test] else _false
+        return run
+
+    def _link_copy(self, dim, source, target):
+        M = self.M
+        _source, _sglobal = self._operand(source)
+        _target, _tglobal = self._operand(target)
+
+        def run():
+            fp = self.fp
+            _left = _target if _tglobal else fp + _target
+            _right = _source if _sglobal else fp + _source
+            if _sglobal and isinstance(M[_right], str):
+                M[_left:_left + dim] = list(M[_right])
+            else:
+                M[_left:_left + dim] = M[_right:_right + dim]
+        return run
+
+    def _link_define(self, opcode, modifier, source):
+        M = self.M
+        _size = self._layout[1]
+        if source == '@main':
+            # the return value of main is not initialized, as in run_define
+            def run():
+                self.fp = self._alloc(_size)
+            return run
+
+        def run():
+            _params = self.params
+            fp = self._alloc(max(_size, len(_params) + 1))
+            for idx, val in enumerate(_params):
+                M[fp + idx] = M[val]
+            M[fp + len(_params)] = 0
+            self.params = []
+            self.fp = fp
+        return run
+
+    def _link_elem(self, opcode, modifier, source, index, target):
+        M = self.M
+        _source, _global = self._operand(source)
+        _index, _target = self._slot(index), self._slot(target)
+
+        def run():
+            fp = self.fp
+            _address = (_source if _global else fp + _source) + M[fp + _index]
+            if not 0 <= _address < len(M):
+                self._bad_address(_address)
+            M[fp + _target] = _address
+        return run
+
+    def _link_fptosi(self, opcode, modifier, source, target):
+        return self._link_unary(int, source, target)
+
+    def _link_get(self, opcode, modifier, source, target):
+        M = self.M
+        _source, _sglobal = self._operand(source)
+        _target, _tglobal = self._operand(target)
+
+        def run():
+            fp = self.fp
+            M[_target if _tglobal else fp + _target] = _source if _sglobal else fp + _source
+        return run
+
+    def _link_jump(self, opcode, modifier, target):
+        _target = self._layout[2][target]
+
+        def run():
+            self.pc = _target
+        return run
+
+    def _link_literal(self, opcode, modifier, value, target):
+        M = self.M
+        _target = self._slot(target)
+
+        def run():
+            M[self.fp + _target] = value
+        return run
+
+    def _link_load(self, opcode, modifier, varname, target):
+        M = self.M
+        if modifier and 'ptr0' not in modifier:
+            return self._link_copy(self._dim(modifier), varname, target)
+        _source, _global = self._operand(varname)
+        _target = self._slot(target)
+        if not modifier:
+            def run():
+                fp = self.fp
+                M[fp + _target] = M[_source if _global else fp + _source]
+        else:
+            def run():
+                fp = self.fp
+                M[fp + _target] = M[M[_source if _global else fp + _source]]
+        return run
+
+    def _link_not(self, opcode, modifier, source, target):
+        return self._link_unary(operator.not_, source, target)
+
+    def _link_param(self, opcode, modifier, source):
+        _source = self._slot(source)
+
+        def run():
+            self.params.append(self.fp + _source)
+        return run
+
+    def _link_print(self, opcode, modifier, source):
+        M = self.M
+        _source, _global = self._operand(source)
+        if opcode == 'print_string':
+            def run():
+                self.output.write(''.join(M[_source if _global else self.fp + _source]))
+        else:
+            def run():
+                self.output.write(str(M[_source if _global else self.fp + _source]))
+        return run
+
+    def _link_read(self, opcode, modifier, source):
+        M = self.M
+        _source, _global = self._operand(source)
+        _convert = {'read_int': int, 'read_float': float}.get(opcode)
+
+        def run():
+            M[_source if _global else self.fp + _source] = self._read_value(_convert)
+        return run
+
+    def _link_return(self, opcode, modifier, target=None):
+        M = self.M
+        if target is None:
+            return partial(self._leave, None)
+        _target = self._slot(target)
+
+        def run():
+            self._leave(M[self.fp + _target])
+        return run
+
+    def _link_sitofp(self, opcode, modifier, source, target):
+        return self._link_unary(float, source, target)
+
+    def _link_store(self, opcode, modifier, source, target):
+        M = self.M
+        if modifier and 'ptr0' not in modifier:
+            return self._link_copy(self._dim(modifier), source, target)
+        _target, _global = self._operand(target)
+        _source = self._slot(source)
+        if not modifier:
+            def run():
+                fp = self.fp
+                M[_target if _global else fp + _target] = M[fp + _source]
+        else:
+            def run():
+                fp = self.fp
+                M[M[_target if _global else fp + _target]] = M[fp + _source]
+        return run
+
+    def _link_unary(self, fn, source, target):
+        M = self.M
+        _source, _global = self._operand(source)
+        _target = self._slot(target)
+
+        def run():
+            fp = self.fp
+            M[fp + _target] = fn(M[_source if _global else fp + _source])
+        return run
+
+    #
+    # Superinstructions: each one gets the pc of the first instruction and
+    # the (opcode, modifier, args) of the sequence, and returns its closure.
+    #
+    def _fuse_at(self, ircode, pc):
+        # Try the superinstructions at pc. Returns (closure, length) or (None, 0)
+        for name, length in self.superinstructions:
+            window = ircode[pc:pc + length]
+            if len(window) < length or any(op[0].isdigit() or op[0] == 'define' for op in window):
+                continue
+            ops = [self._extract_operation(op[0]) + (op[1:],) for op in window]
+            run = getattr(self, '_fuse_' + name)(pc, *ops)
+            if run is not None:
+                _stats = self.fusion_stats.setdefault(name, [0, 0])
+                _stats[0] += 1
+                if self.count_fusions:
+                    run = self._counted(_stats, run)
+                return run, length
+        return None, 0
+
+    def _counted(self, stats, fused):
+        def run():
+            stats[1] += 1
+            fused()
+        return run
+
+    def _fuse_compare_cbranch(self, pc, cmp, branch):
+        # (op_type left right t) (cbranch t true false)
+        (opcode, _, args), (bopcode, _, bargs) = cmp, branch
+        if opcode.split('_')[0] not in BINARY_OPS or bopcode != 'cbranch' or args[2] != bargs[0]:
+            return None
+        M = self.M
+        _fn = self._binary_fn(opcode)
+        _left, _right, _target = self._slot(args[0]), self._slot(args[1]), self._slot(args[2])
+        _labels = self._layout[2]
+        _true, _false = _labels[bargs[1]], _labels[bargs[2]]
+
+        def run():
+            fp = self.fp
+            M[fp + _target] = _result = _fn(M[fp + _left], M[fp + _right])
+            self.pc = _true if _result else _false
+        return run
+
+    def _fuse_literal_binary(self, pc, literal, binary):
+        # (literal_type value t) (op_type t x t2) or (op_type x t t2)
+        (lopcode, _, largs), (opcode, _, args) = literal, binary
+        if not lopcode.startswith('literal') or opcode.split('_')[0] not in BINARY_OPS:
+            return None
+        _value, _name = largs
+        if _name not in args[:2] or args[2] == _name:
+            return None
+        M = self.M
+        _fn = self._binary_fn(opcode)
+        _slot, _target, _next = self._slot(_name), self._slot(args[2]), pc + 2
+        if args[0] == args[1]:
+            def run():
+                fp = self.fp
+                M[fp + _slot] = _value
+                M[fp + _target] = _fn(_value, _value)
+                self.pc = _next
+        elif args[0] == _name:
+            _right = self._slot(args[1])
+
+            def run():
+                fp = self.fp
+                M[fp + _slot] = _value
+                M[fp + _target] = _fn(_value, M[fp + _right])
+                self.pc = _next
+        else:
+            _left = self._slot(args[0])
+
+            def run():
+                fp = self.fp
+                M[fp + _slot] = _value
+                M[fp + _target] = _fn(M[fp + _left], _value)
+                self.pc = _next
+        return run
+
+    def _fuse_load_load_binary_store(self, pc, load1, load2, binary, store):
+        # (load_type a t1) (load_type b t2) (op_type t1 t2 t3) (store_type t3 c)
+        (l1opcode, l1modifier, l1args), (l2opcode, l2modifier, l2args) = load1, load2
+        (opcode, _, args), (sopcode, smodifier, sargs) = binary, store
+        if not (l1opcode.startswith('load') and l2opcode.startswith('load') and sopcode.startswith('store')):
+            return None
+        if l1modifier or l2modifier or smodifier or opcode.split('_')[0] not in BINARY_OPS:
+            return None
+        _temps = (l1args[1], l2args[1], args[2])
+        if args != _temps or sargs[0] != args[2] or len(set(_temps)) != 3:
+            return None
+        if set(_temps) & {l1args[0], l2args[0], sargs[1]}:
+            return None
+        M = self.M
+        _fn = self._binary_fn(opcode)
+        _a, _ga = self._operand(l1args[0])
+        _b, _gb = self._operand(l2args[0])
+        _c, _gc = self._operand(sargs[1])
+        _t1, _t2, _t3 = (self._slot(t) for t in _temps)
+        _next = pc + 4
+
+        def run():
+            fp = self.fp
+            _v1 = M[_a if _ga else fp + _a]
+            _v2 = M[_b if _gb else fp + _b]
+            M[fp + _t1] = _v1
+            M[fp + _t2] = _v2
+            M[fp + _t3] = _result = _fn(_v1, _v2)
+            M[_c if _gc else fp + _c] = _result
+            self.pc = _next
+        return run
@@ -0,0 +1,225 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_io.py
+#
+# Input & output of the programs run by the uC interpreter
+#                      see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+import asyncio
+import codecs
+import io
+import re
+import sys
+
+# A token of the input is any sequence of non whitespace characters
+_token = re.compile(r'\S+')
+
+
+class OutputBuffer(object):
+    """
+    Buffer for the output of a program.  Instead of one print (and one
+    system call) per value, the text is accumulated and written to the
+    stream according to the flush policy:
+
+        'always': flush on every write (unbuffered)
+        'line':   flush when a newline is written
+        'block':  flush when block_size characters are accumulated
+        'exit':   flush only when flush() is called
+
+    The interpreter always flushes before reading the input, so that
+    prompts appear before the program waits, and when the program ends.
+    If stream is None, the current sys.stdout is used.  When capture is
+    True, the text is never written: it is kept to be read by getvalue.
+    """
+
+    policies = ('always', 'line', 'block', 'exit')
+
+    def __init__(self, stream=None, flush='line', block_size=8192, capture=False):
+        if flush not in self.policies:
+            raise ValueError("Unknown flush policy: %s" % flush)
+        self.stream = stream
+        self.policy = flush
+        self.block_size = block_size
+        self.capture = capture
+        self._buffer = []
+        self._size = 0
+        # select the write method once, instead of testing the policy on each write
+        self.write = getattr(self, '_write_' + ('exit' if capture else flush))
+
+    def flush(self):
+        """ Write the buffered text to the stream. """
+        if self._buffer and not self.capture:
+            _stream = self.stream if self.stream is not None else sys.stdout
+            _stream.write(''.join(self._buffer))
+            _stream.flush()
+            self._buffer = []
+            self._size = 0
+
+    def getvalue(self):
+        """ Return the text buffered but not flushed yet (all of it, if captured). """
+        return ''.join(self._buffer)
+
+    def reset(self):
+        """ Discard the buffered text (e.g., the text captured from the last run). """
+        self._buffer = []
+        self._size = 0
+
+    def _write_always(self, text):
+        self._buffer.append(text)
+        self.flush()
+
+    def _write_line(self, text):
+        self._buffer.append(text)
+        if '\n' in text:
+            self.flush()
+
+    def _write_block(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.block_size:
+            self.flush()
+
+    def _write_exit(self, text):
+        self._buffer.append(text)
+
+
+class InputReader(object):
+    """
+    Reader of the input of a program.  The input is read in large chunks
+    (or taken at once from an in-memory text) and split in tokens lazily:
+    a cursor walks over the text, and only the token returned is copied.
+    Use as follows:
+
+        InputReader()                       # read from sys.stdin
+        InputReader(open('input.txt'))      # read from a file
+        InputReader(text='10 20\\n30')       # read from a string (or bytes)
+
+    Reading from a stream uses read1 on its binary buffer when it exists,
+    so an interactive input returns as soon as a line is available.  The
+    on_fill callback is called before each read of the stream (the
+    interpreter uses it to flush the output).
+    """
+
+    def __init__(self, stream=None, text=None, chunk_size=65536):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.on_fill = None
+        self._data = ''
+        self._pos = 0
+        self._eof = False
+        self._read = None
+        self._decoder = None
+        if text is not None:
+            self._data = text.decode() if isinstance(text, bytes) else text
+            self._eof = True
+
+    def token(self):
+        """ Return the next whitespace separated token. Raise EOFError at the end. """
+        while True:
+            _match = _token.search(self._data, self._pos)
+            if _match is not None and (_match.end() < len(self._data) or self._eof):
+                self._pos = _match.end()
+                return _match.group()
+            if self._eof:
+                self._pos = len(self._data)
+                raise EOFError("Unexpected end of input file.")
+            self._fill(_match.start() if _match is not None else len(self._data))
+
+    def _fill(self, start):
+        # Keep the unread tail of the text (a partial token) and append a new chunk
+        if self.on_fill is not None:
+            self.on_fill()
+        if self._read is None:
+            self._open()
+        _chunk = self._read(self.chunk_size)
+        if not _chunk:
+            self._eof = True
+        if self._decoder is not None:
+            # a chunk may end in the middle of a character, that decodes to ''
+            _chunk = self._decoder.decode(_chunk, final=self._eof)
+        self._data = self._data[start:] + _chunk
+        self._pos = 0
+
+    def _open(self):
+        # Select the fastest read method of the stream
+        _stream = self.stream if self.stream is not None else sys.stdin
+        _buffer = getattr(_stream, 'buffer', None)
+        if _buffer is not None and hasattr(_buffer, 'read1'):
+            self._read = _buffer.read1
+            self._decoder = codecs.getincrementaldecoder(
+                getattr(_stream, 'encoding', None) or 'utf-8')()
+        else:
+            self._read = _stream.read
+            if isinstance(_stream, (io.RawIOBase, io.BufferedIOBase)):
+                self._decoder = codecs.getincrementaldecoder('utf-8')()
+
+
+class AsyncInputReader(InputReader):
+    """
+    Reader of the input of a program run by Interpreter.run_async.  The
+    text comes from an asyncio.StreamReader, or is pushed by the server
+    with feed and close (e.g., the messages of an interactive session):
+
+        AsyncInputReader(reader)            # read from an asyncio.StreamReader
+        input = AsyncInputReader()          # read what is fed
+        input.feed('10 20\\n'); ...; input.close()
+
+    The interpreter awaits wait before each read instruction when no
+    token is ready, so token never blocks.  As in the InputReader, the
+    on_fill callback is called before waiting for more input.
+    """
+
+    def __init__(self, reader=None, chunk_size=65536):
+        super().__init__(chunk_size=chunk_size)
+        self.reader = reader
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._event = None
+
+    def feed(self, text):
+        """ Append text (or bytes) to the input. """
+        if self._eof:
+            raise ValueError("feed after close")
+        if isinstance(text, bytes):
+            text = self._decoder.decode(text)
+        self._data = self._data[self._pos:] + text
+        self._pos = 0
+        self._wake()
+
+    def close(self):
+        """ Mark the end of the input. """
+        self._eof = True
+        self._wake()
+
+    def ready(self):
+        """ True when token returns without waiting: a whole token or the end is buffered. """
+        _match = _token.search(self._data, self._pos)
+        return self._eof or (_match is not None and _match.end() < len(self._data))
+
+    async def wait(self):
+        """ Wait until a token (or the end of the input) is ready. """
+        while not self.ready():
+            if self.on_fill is not None:
+                self.on_fill()
+            if self.reader is not None:
+                _chunk = await self.reader.read(self.chunk_size)
+                if _chunk:
+                    self.feed(_chunk)
+                else:
+                    self.close()
+            else:
+                if self._event is None:
+                    self._event = asyncio.Event()
+                self._event.clear()
+                await self._event.wait()
+
+    def _fill(self, start):
+        raise RuntimeError("AsyncInputReader must be awaited before reading (see run_async)")
+
+    def _wake(self):
+        if self._event is not None:
+            self._event.set()
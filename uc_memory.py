@@ -0,0 +1,338 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_memory.py
+#
+# Memory backends for the uC interpreter: a plain Python list, a compact
+#                      memory built on typed arrays and a lazy one, that
+#                      shares its pages of zeros & initializers
+#                      see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+import sys
+from array import array, typecodes
+from itertools import chain, islice
+
+
+class MemoryAccessError(Exception):
+    pass
+
+
+class Memory(object):
+    """
+    Base class of the memory backends used by the Interpreter.  The
+    memory is a sequence of cells, and each cell holds a single value
+    (int, float, char, bool, ref or a whole string constant).
+
+    The interpreter reads & writes the cells through the cells attribute
+    (M[address]), so it should be as fast to index as possible. Before
+    using new cells, the interpreter must reserve them: the memory grows
+    on demand, up to an optional limit of cells.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit      # Maximum number of cells (None: unlimited)
+        self.peak = 0           # Highest number of cells reserved so far
+        self.cells = None       # Indexable storage of the cells
+
+    def reserve(self, end):
+        """ Make sure that the cells [0, end) can be used. """
+        if end > self.peak:
+            if self.limit is not None and end > self.limit:
+                raise MemoryAccessError(
+                    "Out of memory: %d cells requested, limit is %d" % (end, self.limit))
+            self.peak = end
+            self._grow(end)
+
+    def zero(self, address, size):
+        """ Fill size cells, starting at address, with zeros. """
+        self.cells[address:address + size] = size * [0]
+
+    def write(self, address, values):
+        """ Copy the sequence of values into the cells starting at address. """
+        self.cells[address:address + len(values)] = values
+
+    def snapshot(self):
+        """ Return a copy of the cells reserved so far, to restore later. """
+        return self.peak, self.cells[:self.peak]
+
+    def restore(self, state):
+        """ Return the cells to a snapshot. The cells reserved after it become None. """
+        _peak, _cells = state
+        self.cells[:self.peak] = _cells + (self.peak - _peak) * [None]
+        self.peak = _peak
+
+    def usage(self):
+        """ Report the peak & the capacity in cells, and the approximate size in bytes. """
+        return {'peak': self.peak, 'capacity': self._capacity(), 'bytes': self._sizeof()}
+
+    def _capacity(self):
+        return len(self.cells)
+
+    def _grow(self, end):
+        pass
+
+    def _sizeof(self):
+        return sys.getsizeof(self.cells)
+
+
+class ListMemory(Memory):
+    """
+    The memory is a plain list of boxed values. This is the fastest
+    backend, because the interpreter indexes the list directly. The
+    list doubles its size when more cells are reserved.  The list
+    itself only detects the accesses past its end (the interpreter
+    reports them as a MemoryAccessError), so the interpreter checks
+    that the addresses computed by elem are not negative.  An access
+    to the cells past the reserved ones (but within the list) is not
+    detected: use the CompactMemory to check every access.
+    """
+
+    def __init__(self, size=10000, limit=None):
+        super().__init__(limit)
+        self.cells = size * [None]
+
+    def _grow(self, end):
+        if end > len(self.cells):
+            _size = max(end, 2 * len(self.cells))
+            if self.limit is not None:
+                _size = min(_size, self.limit)
+            self.cells.extend((_size - len(self.cells)) * [None])
+
+
+# The compact memory is divided in pages of PAGE_SIZE cells.  A page is
+# None while untouched, an array while all its values have the same type
+# (int64, float64 or char), or a list when the values are mixed.
+PAGE_BITS = 10
+PAGE_SIZE = 1 << PAGE_BITS
+_PAGE_MASK = PAGE_SIZE - 1
+
+_CHAR = 'w' if 'w' in typecodes else 'u'
+_typecodes = {int: 'q', float: 'd', str: _CHAR}
+_types = {'q': int, 'd': float, _CHAR: str}
+
+
+class CompactMemory(Memory):
+    """
+    A memory built on typed pages.  The pages filled in bulk, like the
+    zeroed arrays of alloc_*_N or the global initializers, are stored
+    as unboxed arrays of int64, float64 or char, while the pages with
+    registers and mixed values are lists.  A typed page is converted to
+    a list when it receives a value of other type, so the values read
+    back are always the ones written.  Each access is checked against
+    the reserved cells.
+
+    The cells are indexed through methods, so this backend is slower
+    than the ListMemory, but it uses much less memory on large arrays.
+    """
+
+    def __init__(self, limit=None):
+        super().__init__(limit)
+        self.cells = self
+        self.pages = []
+
+    def __len__(self):
+        return self.peak
+
+    def __getitem__(self, address):
+        if isinstance(address, slice):
+            return [self[_addr] for _addr in range(*address.indices(self.peak))]
+        if not 0 <= address < self.peak:
+            raise MemoryAccessError(
+                "Segmentation fault: read at address %s, out of [0, %d)" % (address, self.peak))
+        _page = self.pages[address >> PAGE_BITS]
+        if _page is None:
+            return None
+        return _page[address & _PAGE_MASK]
+
+    def __setitem__(self, address, value):
+        if isinstance(address, slice):
+            self.write(address.start, value)
+            return
+        if not 0 <= address < self.peak:
+            raise MemoryAccessError(
+                "Segmentation fault: write at address %s, out of [0, %d)" % (address, self.peak))
+        _idx = address >> PAGE_BITS
+        _page = self.pages[_idx]
+        if _page is None:
+            _page = self.pages[_idx] = PAGE_SIZE * [None]
+        elif _page.__class__ is array:
+            if value.__class__ is _types[_page.typecode]:
+                try:
+                    _page[address & _PAGE_MASK] = value
+                    return
+                except (OverflowError, TypeError):
+                    pass
+            _page = self.pages[_idx] = _page.tolist()
+        _page[address & _PAGE_MASK] = value
+
+    def zero(self, address, size):
+        _end = address + size
+        while address < _end:
+            _count = min(PAGE_SIZE - (address & _PAGE_MASK), _end - address)
+            if _count == PAGE_SIZE:
+                self.pages[address >> PAGE_BITS] = array('q', bytes(8 * PAGE_SIZE))
+            else:
+                for _addr in range(address, address + _count):
+                    self[_addr] = 0
+            address += _count
+
+    def write(self, address, values):
+        _end = address + len(values)
+        _pos = 0
+        while address < _end:
+            _count = min(PAGE_SIZE - (address & _PAGE_MASK), _end - address)
+            _chunk = values[_pos:_pos + _count]
+            if _count == PAGE_SIZE:
+                self.pages[address >> PAGE_BITS] = self._make_page(_chunk)
+            else:
+                for _addr, _value in zip(range(address, address + _count), _chunk):
+                    self[_addr] = _value
+            address += _count
+            _pos += _count
+
+    def snapshot(self):
+        return self.peak, [self._copy_page(_page) for _page in self.pages]
+
+    def restore(self, state):
+        _peak, _pages = state
+        self.pages[:] = [self._copy_page(_page) for _page in _pages] + (len(self.pages) - len(_pages)) * [None]
+        self.peak = _peak
+
+    def _copy_page(self, page):
+        # Copy the pages that may be written; the shared ones are kept
+        return page[:] if page.__class__ is list or page.__class__ is array else page
+
+    def _make_page(self, values):
+        # A typed page if all the values have the same type, else a list
+        _typecode = _typecodes.get(values[0].__class__)
+        if _typecode is not None and all(v.__class__ is values[0].__class__ for v in values):
+            try:
+                return array(_typecode, values)
+            except (OverflowError, TypeError):
+                pass
+        return list(values)
+
+    def _capacity(self):
+        return len(self.pages) * PAGE_SIZE
+
+    def _grow(self, end):
+        _pages = (end + PAGE_SIZE - 1) >> PAGE_BITS
+        if _pages > len(self.pages):
+            self.pages.extend((_pages - len(self.pages)) * [None])
+
+    def _sizeof(self):
+        return sys.getsizeof(self.pages) + sum(sys.getsizeof(p) for p in self.pages if p is not None)
+
+
+class FlatView(object):
+    """
+    Read-only sequence of the first size values of a list of rows, in
+    row-major order, without copying them.  Used to store the nested
+    initializers of global arrays.
+    """
+
+    def __init__(self, rows, size):
+        self.rows = rows
+        self.width = len(rows[0]) if rows else 1
+        self.size = min(size, self.width * len(rows))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[_idx] for _idx in range(*index.indices(self.size))]
+        if not 0 <= index < self.size:
+            raise IndexError("FlatView index out of range")
+        return self.rows[index // self.width][index % self.width]
+
+    def __iter__(self):
+        return islice(chain.from_iterable(self.rows), self.size)
+
+
+# Pages of the LazyMemory that are not materialized: a page of zeros &
+# a window of PAGE_SIZE values of an initializer, shared with the code
+_ZERO = object()
+
+
+class _Window(object):
+    __slots__ = ('values', 'start')
+
+    def __init__(self, values, start):
+        self.values = values
+        self.start = start
+
+
+class LazyMemory(CompactMemory):
+    """
+    A compact memory where whole pages of zeros and of initializers are
+    not materialized until they are written.  alloc_*_N of a large
+    array only marks its pages as zero pages, and a large global
+    initializer is kept by reference (the values of the code or a
+    FlatView of its rows), so reading them doesn't copy anything.  The
+    first write to one of these pages copies it to a page of its own
+    (copy-on-write).
+
+    Programs that declare large tables but touch little of them start
+    fast and stay small.  Only whole pages are shared, so the values of
+    partial pages are copied as in the CompactMemory.
+    """
+
+    def __getitem__(self, address):
+        if isinstance(address, slice) or not 0 <= address < self.peak:
+            return super().__getitem__(address)
+        _page = self.pages[address >> PAGE_BITS]
+        if _page is _ZERO:
+            return 0
+        if _page.__class__ is _Window:
+            return _page.values[_page.start + (address & _PAGE_MASK)]
+        if _page is None:
+            return None
+        return _page[address & _PAGE_MASK]
+
+    def __setitem__(self, address, value):
+        if not isinstance(address, slice) and 0 <= address < self.peak:
+            self._materialize(address >> PAGE_BITS)
+        super().__setitem__(address, value)
+
+    def zero(self, address, size):
+        _end = address + size
+        while address < _end:
+            _count = min(PAGE_SIZE - (address & _PAGE_MASK), _end - address)
+            if _count == PAGE_SIZE:
+                self.pages[address >> PAGE_BITS] = _ZERO
+            elif self.pages[address >> PAGE_BITS] is not _ZERO:
+                for _addr in range(address, address + _count):
+                    self[_addr] = 0
+            address += _count
+
+    def write(self, address, values):
+        # the values are kept by reference: the callers never change them
+        _end = address + len(values)
+        _pos = 0
+        while address < _end:
+            _count = min(PAGE_SIZE - (address & _PAGE_MASK), _end - address)
+            if _count == PAGE_SIZE:
+                self.pages[address >> PAGE_BITS] = _Window(values, _pos)
+            else:
+                for _addr, _idx in zip(range(address, address + _count), range(_pos, _pos + _count)):
+                    self[_addr] = values[_idx]
+            address += _count
+            _pos += _count
+
+    def _materialize(self, index):
+        # Give the page its own copy of the zeros or of the initializer
+        _page = self.pages[index]
+        if _page is _ZERO:
+            self.pages[index] = array('q', bytes(8 * PAGE_SIZE))
+        elif _page.__class__ is _Window:
+            self.pages[index] = self._make_page(_page.values[_page.start:_page.start + PAGE_SIZE])
+
+    def _sizeof(self):
+        # the shared pages don't count
+        return sys.getsizeof(self.pages) + sum(sys.getsizeof(p) for p in self.pages
+                                               if p is not None and p is not _ZERO and p.__class__ is not _Window)
@@ -0,0 +1,353 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_optimizer.py
+#
+# Optimizer class: peephole passes over the uCIR (copy propagation, constant
+#                  folding, dead temporaries & jump threading) that remove
+#                  instructions before the code is run
+#                  see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+"""
+Optimize the code before running it:
+
+       optimizer = Optimizer()
+       code = optimizer.optimize(code)
+       print(optimizer.report())
+       result = FrameInterpreter().run(code)
+
+Each pass can be disabled, e.g., Optimizer(jumps=False).  The passes run
+over each function, in this order, until none of them changes the code:
+
+    copies      in a block, the loads of a local var whose value is in a
+                register (stored or loaded before) are replaced by that
+                register in the instructions that follow
+    constants   in a block, the binary, not & cast operations with
+                literal operands become literals, and a cbranch on a
+                literal becomes a jump
+    dead        the literals, loads, operations, stores & allocs of
+                registers that are never read are removed
+    jumps       jumps & branches to a jump go to its target, the jumps to
+                the next instruction, the unreachable instructions and the
+                labels without jumps to them are removed
+
+The optimized code runs as the original one: it prints the same output
+and returns the same exit code.  The vars whose address is taken (get,
+elem & the arrays) and the globals are left in memory, since pointers &
+calls may change them, and the divisions are kept, since they may fail.
+The code must be valid (see uc_verifier.py).
+
+stats has, for each pass, the number of instructions it removed and the
+number of instructions it changed (see report).
+"""
+import operator
+import re
+from uc_interpreter import BINARY_OPS
+from uc_verifier import operand_roles
+
+
+# Names of the passes, in the order they run
+PASSES = ('copies', 'constants', 'dead', 'jumps')
+
+# Most rounds of the passes over a function
+_MAX_ROUNDS = 10
+
+# Kinds removed by the pass dead, when their target is never read
+_pure = {'literal', 'load', 'store', 'alloc', 'get', 'elem', 'not', 'sitofp',
+         'add', 'sub', 'mul', 'lt', 'le', 'gt', 'ge', 'eq', 'ne', 'and', 'or'}
+
+# Unary operations folded by the pass constants (as run by the interpreters)
+_unary_ops = {'not': operator.not_, 'sitofp': float, 'fptosi': int}
+
+# Type of the literal that holds a folded value
+_literal_types = {bool: 'bool', int: 'int', float: 'float', str: 'char'}
+
+_register = re.compile(r'%\d+$')
+
+
+class Optimizer(object):
+    """
+    Peephole optimizer of the uCIR.  optimize returns a new list of
+    instructions, without changing the given one.
+    """
+
+    def __init__(self, copies=True, constants=True, dead=True, jumps=True):
+        self.enabled = {'copies': copies, 'constants': constants, 'dead': dead, 'jumps': jumps}
+        self.stats = {}         # pass -> [removed, changed]
+        self.before = 0         # Instructions before & after the last optimize
+        self.after = 0
+
+    def optimize(self, ircode):
+        """ Return the optimized code. """
+        self.stats = {name: [0, 0] for name in PASSES}
+        self.before = len(ircode)
+        code = []
+        _body = None
+        for op in ircode:
+            if op[0] == 'define':
+                if _body is not None:
+                    code += self._function(_body)
+                code.append(op)
+                _body = []
+            elif _body is None:
+                code.append(op)
+            else:
+                _body.append(op)
+        if _body is not None:
+            code += self._function(_body)
+        self.after = len(code)
+        return code
+
+    def report(self):
+        """ Return a text table with the instructions removed & changed by each pass. """
+        lines = ['%-12s %10s %10s' % ('pass', 'removed', 'changed')]
+        for name in PASSES:
+            if self.enabled[name]:
+                lines.append('%-12s %10d %10d' % (name, *self.stats[name]))
+        _removed = self.before - self.after
+        lines.append('%d -> %d instructions (%.1f%% removed)' % (
+            self.before, self.after, 100.0 * _removed / self.before if self.before else 0.0))
+        return '\n'.join(lines)
+
+    #
+    # Auxiliary methods
+    #
+    def _function(self, body):
+        # Run the passes over the body of a function until nothing changes.
+        # A body with instructions of unknown kinds is not optimized.
+        if any(not op[0].isdigit() and operand_roles(op) is None for op in body):
+            return body
+        for _ in range(_MAX_ROUNDS):
+            _changed = False
+            for name in PASSES:
+                if self.enabled[name]:
+                    body, _removed, _rewritten = getattr(self, '_' + name)(body)
+                    self.stats[name][0] += _removed
+                    self.stats[name][1] += _rewritten
+                    _changed = _changed or _removed or _rewritten
+            if not _changed:
+                break
+        return body
+
+    def _addressed(self, body):
+        # The registers whose address is taken, and the arrays
+        addressed = set()
+        for op in body:
+            if op[0].isdigit():
+                continue
+            _kind, _dims = _kind_of(op)
+            if _kind in ('get', 'elem'):
+                addressed.add(op[1])
+            elif _dims and _kind in ('alloc', 'load', 'store'):
+                addressed.update(op[1:])
+        return addressed
+
+    def _constants(self, body):
+        # Fold the operations on literals of each block
+        code = []
+        values = {}
+        _rewritten = 0
+        for op in body:
+            if op[0].isdigit():
+                values.clear()
+                code.append(op)
+                continue
+            _kind, _ = _kind_of(op)
+            _new = None
+            try:
+                if _kind in BINARY_OPS and op[1] in values and op[2] in values:
+                    _fn = operator.truediv if op[0] == 'div_float' else BINARY_OPS[_kind]
+                    _new = _literal(_fn(values[op[1]], values[op[2]]), op[3])
+                elif _kind in _unary_ops and op[1] in values:
+                    _new = _literal(_unary_ops[_kind](values[op[1]]), op[2])
+            except (ArithmeticError, TypeError, ValueError):
+                pass    # the operation fails when run, as it should
+            if _kind == 'cbranch' and op[1] in values:
+                _new = ('jump', op[2] if values[op[1]] else op[3])
+            if _new is not None:
+                op = _new
+                _kind = op[0].split('_')[0]
+                _rewritten += 1
+            for _reg in _defs(op):
+                values.pop(_reg, None)
+            if _kind == 'literal' and _register.match(op[2]):
+                values[op[2]] = op[1]
+            elif _kind in ('jump', 'cbranch', 'return'):
+                values.clear()
+            code.append(op)
+        return code, 0, _rewritten
+
+    def _copies(self, body):
+        # Propagate the registers that hold the values of the local vars
+        addressed = self._addressed(body)
+        code = []
+        values = {}     # var -> register with its value
+        aliases = {}    # register -> register with the same value
+        _rewritten = 0
+        for op in body:
+            if op[0].isdigit():
+                values.clear()
+                aliases.clear()
+                code.append(op)
+                continue
+            _kind, _dims = _kind_of(op)
+            _uses = _value_uses(op, _kind, _dims)
+            _new = op[:1] + tuple(aliases.get(_arg, _arg) if _pos in _uses else _arg
+                                  for _pos, _arg in enumerate(op[1:]))
+            if _new != op:
+                op = _new
+                _rewritten += 1
+            for _reg in _defs(op):
+                # the register changed: forget what it held
+                values.pop(_reg, None)
+                aliases.pop(_reg, None)
+                for _table in (values, aliases):
+                    for _key in [_key for _key, _value in _table.items() if _value == _reg]:
+                        del _table[_key]
+            if not _dims and _kind == 'store' and op[2] not in addressed and _register.match(op[2]):
+                values[op[2]] = op[1]
+            elif not _dims and _kind == 'load' and op[1] not in addressed and _register.match(op[1]):
+                if op[1] in values:
+                    aliases[op[2]] = values[op[1]]
+                else:
+                    values[op[1]] = op[2]
+            elif _kind in ('jump', 'cbranch', 'return'):
+                values.clear()
+                aliases.clear()
+            code.append(op)
+        return code, 0, _rewritten
+
+    def _dead(self, body):
+        # Remove the instructions whose target is never read
+        _removed = 0
+        while True:
+            reads = set()
+            for op in body:
+                if not op[0].isdigit():
+                    reads.update(_reads(op))
+            code = [op for op in body if not _is_dead(op, reads)]
+            if len(code) == len(body):
+                return code, _removed, 0
+            _removed += len(body) - len(code)
+            body = code
+
+    def _jumps(self, body):
+        # Thread the jumps, removing the useless ones & the dead code
+        _removed = len(body)
+        _rewritten = 0
+        # the target of each label that is followed by a jump
+        _targets = {}
+        _pending = []
+        for op in body:
+            if op[0].isdigit():
+                _pending.append('%' + op[0])
+                continue
+            if op[0] == 'jump':
+                for _label in _pending:
+                    _targets[_label] = op[1]
+            _pending = []
+
+        def resolve(label):
+            _seen = set()
+            while label in _targets and label not in _seen:
+                _seen.add(label)
+                label = _targets[label]
+            return label
+
+        code = []
+        _reachable = True
+        for op in body:
+            if op[0].isdigit():
+                _reachable = True
+            elif not _reachable:
+                continue
+            elif op[0] == 'jump' or op[0] == 'cbranch':
+                _new = op[:-2] + tuple(resolve(_label) for _label in op[-2:]) if op[0] == 'cbranch' \
+                    else ('jump', resolve(op[1]))
+                if _new[0] == 'cbranch' and _new[2] == _new[3]:
+                    _new = ('jump', _new[2])
+                if _new != op:
+                    op = _new
+                    _rewritten += 1
+                _reachable = False
+            elif op[0].startswith('return'):
+                _reachable = False
+            code.append(op)
+
+        # the jumps to the labels that follow them
+        body = code
+        code = []
+        for idx, op in enumerate(body):
+            if op[0] == 'jump':
+                _next = idx + 1
+                while _next < len(body) and body[_next][0].isdigit():
+                    if '%' + body[_next][0] == op[1]:
+                        break
+                    _next += 1
+                if _next < len(body) and body[_next][0].isdigit():
+                    continue
+            code.append(op)
+
+        # the labels that nobody jumps to
+        _used = set()
+        for op in code:
+            if op[0] == 'jump':
+                _used.add(op[1])
+            elif op[0] == 'cbranch':
+                _used.update(op[2:])
+        code = [op for op in code if not op[0].isdigit() or '%' + op[0] in _used]
+        return code, _removed - len(code), _rewritten
+
+
+def _defs(op):
+    # The registers written by op
+    _roles_of = operand_roles(op)
+    return [_arg for _role, _arg in zip(_roles_of, op[1:]) if _role == 'def' and _register.match(str(_arg))]
+
+
+def _is_dead(op, reads):
+    # True when op only computes a register that is never read
+    if op[0].isdigit():
+        return False
+    _kind, _dims = _kind_of(op)
+    if _kind not in _pure or (_dims and _kind != 'get'):
+        return False
+    _target = op[-1] if _kind != 'alloc' else op[1]
+    return _register.match(_target) is not None and _target not in reads
+
+
+def _kind_of(op):
+    # The kind of op and its modifiers (dims & *)
+    _parts = op[0].split('_')
+    return _parts[0], _parts[2:]
+
+
+def _literal(value, target):
+    # The literal of the folded value, or None for the values without it
+    _type = _literal_types.get(value.__class__)
+    if _type is None or (value.__class__ is float and value - value != 0.0):
+        return None     # no literal of that type, or inf & nan
+    return ('literal_' + _type, value, target)
+
+
+def _reads(op):
+    # The registers read by op (including the address operands)
+    _roles_of = operand_roles(op)
+    _read = [_arg for _role, _arg in zip(_roles_of, op[1:]) if _role in ('use', 'callee')]
+    if op[0] == 'return_void':
+        _read.append('%0')   # main returns the value in %0 (None if void)
+    return _read
+
+
+def _value_uses(op, kind, dims):
+    # Positions of the operands of op read as values, that can be replaced
+    # by a register with the same value.  The address operands (get & elem
+    # sources, arrays) and the params (read at the call) are kept.
+    if kind in ('get', 'param') or (dims and kind in ('load', 'store') and '*' not in dims):
+        return ()
+    return {_pos for _pos, _role in enumerate(operand_roles(op)) if _role in ('use', 'callee')
+            and not (kind == 'elem' and _pos == 0)}
@@ -0,0 +1,121 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_profiler.py
+#
+# Profiler class: counts the instructions & calls of a program run by the
+#                 uC interpreter, and the time spent in each function
+#                 see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+import json
+from time import perf_counter
+
+
+class Profiler(object):
+    """
+    Collects the profile of a program run by the Interpreter:
+
+        - the number of instructions executed of each opcode;
+        - for each function (define region), the number of calls, the
+          number of instructions executed in its body and the cumulative
+          time spent in it, including the time spent in its callees.
+
+    The interpreter only uses the profiler when one is given to it, with
+    a separate (instrumented) dispatch loop, so the normal loop has no
+    cost at all.  The superinstructions of the FrameInterpreter with
+    fuse=True are profiled too: each instruction fused into one of them
+    is counted under its own opcode, as if it ran alone.  Use as follows:
+
+        profiler = Profiler()
+        Interpreter(profiler=profiler).run(code)
+        print(profiler.report())
+        profiler.to_json()
+    """
+
+    def __init__(self):
+        self.opcodes = {}       # opcode -> instructions executed
+        self.functions = {}     # function -> {'calls', 'instructions', 'time'}
+        self.names = []         # opcode of each pc
+        self.owners = []        # function of each pc
+        self.events = []        # for each pc: 'enter', 'leave' or None
+        self._stack = []        # (function, start time) of the active calls
+        self._active = {}       # function -> number of active calls (recursion)
+
+    def prepare(self, ircode):
+        """ Build the tables of each pc of the code, before running it. """
+        self.names, self.owners, self.events = [], [], []
+        _function = None
+        for op in ircode:
+            _event = None
+            if op[0].isdigit():
+                _name = 'label'
+            else:
+                _aux = op[0].split('_')
+                _name = '_'.join(a if not a.isdigit() else 'N' for a in _aux)
+                if _aux[0] == 'define':
+                    _function = op[1]
+                    self.functions.setdefault(_function, {'calls': 0, 'instructions': 0, 'time': 0.0})
+                    _event = 'enter'
+                elif _aux[0] == 'return':
+                    _event = 'leave'
+            self.names.append(_name)
+            self.owners.append(_function)
+            self.events.append(_event)
+
+    def enter(self, function):
+        """ A call of function begins (its define is executed). """
+        self.functions[function]['calls'] += 1
+        self._active[function] = self._active.get(function, 0) + 1
+        self._stack.append((function, perf_counter()))
+
+    def leave(self):
+        """ The innermost call returns. Only the outermost call of a
+            recursive function adds to its cumulative time. """
+        if self._stack:
+            _function, _start = self._stack.pop()
+            self._active[_function] -= 1
+            if not self._active[_function]:
+                self.functions[_function]['time'] += perf_counter() - _start
+
+    def finish(self, counts, fused=None):
+        """ Close the calls still active (main) and sum up the counts per pc.
+            fused maps the pc of each superinstruction to its number of
+            instructions (see FrameInterpreter): only its first pc is
+            counted, and each of the others runs as many times.
+        """
+        while self._stack:
+            self.leave()
+        if fused:
+            counts = list(counts)
+            for _pc, _length in fused.items():
+                for _inner in range(_pc + 1, _pc + _length):
+                    counts[_inner] += counts[_pc]
+        for pc, count in enumerate(counts):
+            if count and pc < len(self.names):
+                self.opcodes[self.names[pc]] = self.opcodes.get(self.names[pc], 0) + count
+                if self.owners[pc] is not None:
+                    self.functions[self.owners[pc]]['instructions'] += count
+
+    def report(self):
+        """ Return the profile as a text table. """
+        lines = ['%-24s %10s %14s %14s' % ('function', 'calls', 'instructions', 'cumtime (s)')]
+        for name, f in sorted(self.functions.items(), key=lambda item: -item[1]['time']):
+            lines.append('%-24s %10d %14d %14.6f' % (name, f['calls'], f['instructions'], f['time']))
+        lines.append('')
+        lines.append('%-24s %10s %14s' % ('opcode', 'count', '%'))
+        _total = sum(self.opcodes.values()) or 1
+        for name, count in sorted(self.opcodes.items(), key=lambda item: -item[1]):
+            lines.append('%-24s %10d %14.2f' % (name, count, 100.0 * count / _total))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        """ Return the profile as a JSON document. """
+        return json.dumps({
+            'instructions': sum(self.opcodes.values()),
+            'opcodes': self.opcodes,
+            'functions': self.functions,
+        }, indent=2, sort_keys=True)
@@ -0,0 +1,146 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_snapshot.py
+#
+# LoadedProgram class: loads & links a uCIR program once and runs it against
+#                      many inputs, restoring a snapshot of its initial state
+#                      or forking a process per input
+#                      see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+"""
+To test a program against many inputs, load it once and run it for each one:
+
+       program = LoadedProgram(code, interpreter=FrameInterpreter, max_instructions=10**7)
+       exit_code, output = program.run("10\n")
+       for result in program.run_many(["10\n", "20\n", "30\n"]):
+           print(result.index, result.status, result.exit_code, result.output)
+
+The globals, the constants and the linked code are built only once.  run
+restores the snapshot of the memory taken after the load, and run_many forks
+a child process per input (up to workers at a time), so the children share
+the pages of the loaded program copy-on-write and a crash of one of them
+doesn't affect the others.  The results of run_many are BatchResult (see
+uc_batch.py), in the order of the inputs.  Without os.fork (or with
+fork=False), run_many runs the inputs one after the other in this process.
+"""
+import os
+import pickle
+import selectors
+import signal
+from time import perf_counter
+from uc_batch import BatchResult, run_outcome
+from uc_interpreter import Interpreter
+from uc_io import InputReader, OutputBuffer
+
+
+class LoadedProgram(object):
+    """
+    A uCIR program loaded & linked by an interpreter, ready to run many
+    times.  The options (memory, max_instructions, timeout, ...) are
+    passed to the interpreter class.  The output is always captured.
+    """
+
+    def __init__(self, code, interpreter=Interpreter, **options):
+        self.output = OutputBuffer(capture=True)
+        self.machine = interpreter(output=self.output, **options)
+        self.machine.load(code)
+        self.state = self.machine.snapshot()
+        self.dirty = False      # the machine has run since the snapshot
+
+    def run(self, stdin=''):
+        """ Run the program reading the stdin text. Returns the RunResult. """
+        self._reset(stdin)
+        return self.machine.execute()
+
+    def run_many(self, inputs, fork=True, workers=None):
+        """ Run the program against each stdin text of inputs, yielding
+            a BatchResult per input.  With fork, each input runs in a
+            child process, up to workers (default: cpu count) at a time.
+        """
+        if not fork or not hasattr(os, 'fork'):
+            for index, stdin in enumerate(inputs):
+                yield self._run_one(index, stdin)
+            return
+        if self.dirty:
+            # the children must start from the snapshot
+            self.machine.restore(self.state)
+            self.dirty = False
+        yield from self._run_forked(inputs, workers or os.cpu_count() or 1)
+
+    def _fork(self, selector, index, stdin):
+        # Start a child that runs the input and writes back its pickled result
+        _read, _write = os.pipe()
+        _pid = os.fork()
+        if _pid == 0:
+            _status = 1
+            try:
+                os.close(_read)
+                with open(_write, 'wb') as _pipe:
+                    pickle.dump(self._run_one(index, stdin), _pipe)
+                _status = 0
+            finally:
+                os._exit(_status)
+        os.close(_write)
+        selector.register(_read, selectors.EVENT_READ, (index, _pid, [], perf_counter()))
+
+    def _reap(self, selector, key):
+        # The child closed its pipe: wait for it and decode its result
+        _index, _pid, _chunks, _start = key.data
+        selector.unregister(key.fd)
+        os.close(key.fd)
+        _, _status = os.waitpid(_pid, 0)
+        if _status == 0 and _chunks:
+            return pickle.loads(b''.join(_chunks))
+        return BatchResult(_index, 'error', None, '', perf_counter() - _start,
+                           'Child process exited with status %d' % _status)
+
+    def _reset(self, stdin):
+        if self.dirty:
+            self.machine.restore(self.state)
+        self.dirty = True
+        self.output.reset()
+        self.machine.input = InputReader(text=stdin)
+        self.machine.input.on_fill = self.output.flush
+
+    def _run_forked(self, inputs, workers):
+        selector = selectors.DefaultSelector()
+        jobs = enumerate(inputs)
+        results = {}
+        running = 0
+        following = 0
+        try:
+            while True:
+                while running < workers:
+                    _job = next(jobs, None)
+                    if _job is None:
+                        break
+                    self._fork(selector, *_job)
+                    running += 1
+                if not running:
+                    break
+                for key, _ in selector.select():
+                    _data = os.read(key.fd, 1 << 16)
+                    if _data:
+                        key.data[2].append(_data)
+                    else:
+                        _result = self._reap(selector, key)
+                        results[_result.index] = _result
+                        running -= 1
+                while following in results:
+                    yield results.pop(following)
+                    following += 1
+        finally:
+            # Stop the children left when the caller closes the generator
+            for key in list(selector.get_map().values()):
+                os.kill(key.data[1], signal.SIGKILL)
+                self._reap(selector, key)
+            selector.close()
+
+    def _run_one(self, index, stdin):
+        self._reset(stdin)
+        return run_outcome(index, self.output, self.machine.execute)
@@ -0,0 +1,241 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_text.py
+#
+# Text form of the uCIR: dump & load functions for the notation used in the
+#                        notebooks, one instruction tuple per line, parsed as
+#                        a stream
+#                        see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+"""
+The text form is the one printed in uCIR_Examples.ipynb: each instruction
+is a tuple of Python literals (strings, ints, floats, booleans & nested
+lists for the initializers) and usually takes one line:
+
+       ('global_int', '@n', 3)
+       ('define', '@main')
+       ('load_int', '@n', '%3')
+       ('1',)
+       ('return_void',)
+
+To write & read it:
+
+       dump(code, 'program.ir')
+       code = load('program.ir')
+       result = Interpreter().run(code)
+
+iterload(file) yields the instructions of an open text file while reading
+it in chunks, so a program can be linked as it arrives, and loads/dumps
+do the same with a str.  The reader scans the chunks with a single regular
+expression (no eval, no string per line), checks the syntax as it goes and
+raises a TextFormatError with the line & column of the first error.  Given
+opcodes (the names of the run_ methods, see Interpreter.opcodes), each
+instruction is also checked as in uc_verifier.py: opcode, modifiers and
+number of operands.  The registers & the labels are checked by verify,
+which needs the whole program.
+
+The names (opcodes, registers & globals) are interned, so the repeated
+ones share the same string.
+"""
+import ast
+import re
+import sys
+from uc_verifier import check_opcode
+
+
+# Chars read at a time by iterload
+CHUNK_SIZE = 1 << 20
+
+# The tokens of the text form.  Whitespace & comments (#) have no group.
+_token = re.compile(r"""
+    \s+ | \#[^\n]*
+  | ([()\[\],])
+  | '((?:[^'\\\n]|\\.)*)'
+  | "((?:[^"\\\n]|\\.)*)"
+  | ([-+]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|inf|nan))
+  | (True|False)
+  | (.)
+""", re.VERBOSE)
+
+_PUNCT, _SINGLE, _DOUBLE, _NUMBER, _BOOL, _ERROR = range(1, 7)
+
+# A whole instruction in a line, when its operands are plain names &
+# numbers (most of them): matched at once, without the tokens.
+_operand = r"""('[^'\\\n]*'|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|True|False)"""
+_line = re.compile(r"""\s*\('([^'\\\n]*)'[ \t]*""" + 3 * (r"""(?:,[ \t]*%s[ \t]*)?""" % _operand)
+                   + r""",?[ \t]*\)[ \t]*(?:\#[^\n]*)?(?:\n|$)""")
+
+
+class TextFormatError(Exception):
+    """ The text is not a valid uCIR.  line & column locate the error. """
+
+    def __init__(self, message, line, column):
+        super().__init__("%d:%d: %s" % (line, column, message))
+        self.line = line
+        self.column = column
+
+
+class _Reader(object):
+    # Parser of the tokens of the text form. It keeps its state between
+    # chunks: the open tuple & lists and the position of the chunk.
+    def __init__(self, opcodes):
+        self.opcodes = opcodes
+        self.stack = []         # the open tuple & the lists inside it
+        self.after_item = False  # the last token was an item (a comma may follow)
+        self.line = 1           # line of the start of the chunk
+        self.chunk = ''
+
+    def error(self, message, pos):
+        _start = self.chunk.rfind('\n', 0, pos) + 1
+        raise TextFormatError(message, self.line + self.chunk.count('\n', 0, pos), pos - _start + 1)
+
+    def feed(self, chunk):
+        # Parse a chunk that ends at the end of a line, yielding each
+        # instruction closed in it
+        self.chunk = chunk
+        _match = _line.match
+        _intern = sys.intern
+        pos = 0
+        while pos < len(chunk):
+            match = None if self.stack else _match(chunk, pos)
+            if match is None:
+                pos = yield from self.tokens(chunk, pos)
+                continue
+            _items = [_intern(match.group(1))]
+            for _arg in match.groups()[1:]:
+                if _arg is None:
+                    break
+                if _arg[0] == "'":
+                    _items.append(_intern(_arg[1:-1]))
+                elif _arg == 'True' or _arg == 'False':
+                    _items.append(_arg == 'True')
+                elif '.' in _arg or 'e' in _arg or 'E' in _arg:
+                    _items.append(float(_arg))
+                else:
+                    _items.append(int(_arg))
+            yield self.instruction(_items, match.start(1) - 2)
+            pos = match.end()
+        self.line += chunk.count('\n')
+
+    def finish(self):
+        if self.stack:
+            self.chunk = ''
+            self.error("unexpected end of the text", 0)
+
+    def tokens(self, chunk, pos):
+        # Parse the tokens from pos up to the end of an instruction (or of
+        # the chunk), yielding it.  Returns the position after it.
+        stack = self.stack
+        for match in _token.finditer(chunk, pos):
+            kind = match.lastindex
+            if kind is None:
+                continue
+            if kind == _PUNCT:
+                _char = match.group(1)
+                if _char == ',':
+                    if not self.after_item:
+                        self.error("unexpected ','", match.start())
+                    self.after_item = False
+                    continue
+                if _char == '(' or _char == '[':
+                    if self.after_item or (_char == '(') != (not stack):
+                        self.error("unexpected '%s'" % _char, match.start())
+                    stack.append([])
+                    self.after_item = False
+                    continue
+                if not stack or (_char == ')') != (len(stack) == 1):
+                    self.error("unexpected '%s'" % _char, match.start())
+                _items = stack.pop()
+                self.after_item = True
+                if stack:
+                    stack[-1].append(_items)
+                    continue
+                yield self.instruction(_items, match.start())
+                self.after_item = False
+                return match.end()
+            if self.after_item or not stack:
+                self.error("unexpected %s" % match.group(), match.start())
+            self.after_item = True
+            if kind == _SINGLE or kind == _DOUBLE:
+                _value = match.group(kind)
+                if '\\' in _value:
+                    _value = ast.literal_eval(match.group())
+                elif len(stack) == 1:
+                    _value = sys.intern(_value)
+            elif kind == _NUMBER:
+                _value = match.group(kind)
+                if _value.isdigit() or (_value[1:].isdigit() and _value[0] in '+-'):
+                    _value = int(_value)
+                else:
+                    _value = float(_value)
+            elif kind == _BOOL:
+                _value = match.group(kind) == 'True'
+            else:
+                self.error("unexpected %r" % match.group(), match.start())
+            stack[-1].append(_value)
+        return len(chunk)
+
+    def instruction(self, items, pos):
+        # Check the tuple closed at pos
+        if not items or items[0].__class__ is not str:
+            self.error("an instruction must begin with its opcode", pos)
+        op = tuple(items)
+        if op[0].isdigit():
+            if len(op) > 1:
+                self.error("a label has no operands", pos)
+        elif self.opcodes is not None:
+            _kind, _form = check_opcode(op, self.opcodes)
+            if _kind is None:
+                self.error("%r: %s" % (op, _form), pos)
+        return op
+
+
+def iterload(file, opcodes=None):
+    """ Yield the instructions read from the text file, a chunk at a time. """
+    reader = _Reader(opcodes)
+    _rest = ''
+    while True:
+        _chunk = file.read(CHUNK_SIZE)
+        if not _chunk:
+            break
+        # parse up to the last complete line, so no token is split
+        _end = _chunk.rfind('\n') + 1
+        if not _end:
+            _rest += _chunk
+            continue
+        yield from reader.feed(_rest + _chunk[:_end] if _rest else _chunk[:_end])
+        _rest = _chunk[_end:]
+    if _rest:
+        yield from reader.feed(_rest)
+    reader.finish()
+
+
+def loads(text, opcodes=None):
+    """ Return the instructions of the text. """
+    reader = _Reader(opcodes)
+    code = list(reader.feed(text))
+    reader.finish()
+    return code
+
+
+def load(path, opcodes=None):
+    """ Return the instructions of the text file path. """
+    with open(path, encoding='utf-8') as _file:
+        return list(iterload(_file, opcodes))
+
+
+def dumps(ircode):
+    """ Return the text form of the code, one instruction per line. """
+    return ''.join([repr(op) + '\n' for op in ircode])
+
+
+def dump(ircode, path):
+    """ Write the text form of the code to the file path. """
+    with open(path, 'w', encoding='utf-8') as _file:
+        for _start in range(0, len(ircode), 4096):
+            _file.write(dumps(ircode[_start:_start + 4096]))
@@ -0,0 +1,639 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_transpiler.py
+#
+# TranspiledInterpreter class: runs the uC intermediate representation by
+#                              translating each function to Python code
+#                              see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+"""
+The TranspiledInterpreter is used as the other interpreters:
+
+       result = TranspiledInterpreter().run(code)
+
+or, to compile only the functions where the program spends its time,
+
+       result = TieredInterpreter().run(code)
+
+Each define region of the code becomes a Python function, where the
+registers are local variables of the function, and the jumps & branches
+select the next block of a dispatch loop.  The generated module is
+compiled once per process, keyed by the hash of the uCIR.  Its code
+object can also be kept on disk, so the next process running the same
+code only loads it: the disk cache is off unless a cache_dir is given
+or $UC_CACHE_DIR is set.
+
+The Interpreter class remains the reference of the semantics.  Since
+the generated code doesn't count instructions, runs with a profiler,
+with limits or with run_async fall back to the linked code of the
+FrameInterpreter.
+"""
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import threading
+from functools import partial
+from uc_interpreter import FrameInterpreter
+
+
+# Version of the generated code, part of the key of the cached modules
+_VERSION = 3
+
+# Serializes the changes of the recursion limit (see _raise_recursion_limit)
+_recursion_lock = threading.Lock()
+
+# Code objects already loaded by this process, by key
+_code_cache = {}
+
+# Python operators of the binary & relational operations of the uCIR
+_operators = {
+    'add': '+', 'sub': '-', 'mul': '*', 'mod': '%', 'div': '//',
+    'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>=', 'eq': '==', 'ne': '!=',
+    'and': 'and', 'or': 'or',
+}
+
+
+def _copy(M, left, right, dim, is_global):
+    # Copy dim cells from right to left (a global string is split in chars)
+    if is_global and isinstance(M[right], str):
+        M[left:left + dim] = list(M[right])
+    else:
+        M[left:left + dim] = M[right:right + dim]
+
+
+def _raise_recursion_limit(limit):
+    # Raise the recursion limit of the process to limit, if it's lower
+    with _recursion_lock:
+        if sys.getrecursionlimit() < limit:
+            sys.setrecursionlimit(limit)
+
+
+def default_cache_dir():
+    """ Directory of the cached modules: $UC_CACHE_DIR, or False (no disk cache) """
+    return os.environ.get('UC_CACHE_DIR') or False
+
+
+def _private_dir(path):
+    # Whether path is a directory that only this user can write: the cached
+    # code objects are executed, so a cache others can write is not used
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if not hasattr(os, 'getuid'):
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+class TranspiledInterpreter(FrameInterpreter):
+    """
+    Runs the uC intermediate code translated to Python.  The frame
+    layout of each function is the same of the FrameInterpreter, but
+    only the registers whose address is taken (arrays & the variables
+    used by get, elem or copied by load/store) are kept in the memory
+    M.  The other registers are local variables of the Python function.
+
+    cache_dir is the directory of the cached code objects, or False
+    to compile the code once per process (the default, unless
+    $UC_CACHE_DIR is set, see default_cache_dir).  The directory is
+    created private to the user, and it's not used if other users can
+    write to it.  The source generated by the last translation is kept
+    in self.source.
+
+    Deep recursions of the uC program are recursions of the Python
+    functions, so running a program raises the recursion limit of the
+    whole process to recursion_limit, if it's lower.  This side effect
+    outlives the run: the limit is global to the process, so it's never
+    lowered, as a run in another thread may be deep in its recursion.
+    """
+
+    recursion_limit = 100000
+
+    def __init__(self, memory=None, output=None, input=None, profiler=None,
+                 max_instructions=None, timeout=None, cache_dir=None, verify=False):
+        super().__init__(memory, output, input, profiler, max_instructions, timeout, verify=verify)
+        self.cache_dir = default_cache_dir() if cache_dir is None else cache_dir
+        self.source = None      # Python source generated for the program
+        self._main = None       # Python function of @main
+        self._resident = None   # Registers kept in memory, in the function being translated
+        self._params = []       # Operands of the pending param instructions
+        self._blocks = None     # Block index of each label of the function
+        self._main_function = False
+        self._block = 0         # Index of the block being translated
+
+    def _link(self, ircode):
+        # The profiler, the limits & run_async count the instructions of the linked code
+        if self._counting():
+            return super()._link(ircode)
+        _namespace = self._namespace()
+        exec(self._compile(ircode), _namespace)
+        self._main = _namespace['_fns'][self.start]
+        return None
+
+    def _namespace(self):
+        # Globals of the generated code
+        return {
+            'self': self, 'M': self.M, '_alloc': self._alloc, '_copy': _copy,
+            '_exit': self._exit, '_halt': self._halt, '_bad_address': self._bad_address,
+            '_no_method': self._no_method, '_read': self._read_value,
+            '_write': self.output.write, '_zero': self.memory.zero,
+        }
+
+    def _dispatch(self):
+        _raise_recursion_limit(self.recursion_limit)
+        if self.program is not None:
+            super()._dispatch()
+        else:
+            self._main()
+
+    #
+    # Code cache
+    #
+    def _compile(self, ircode, start=None):
+        # Return the code object of the program (or of the function that
+        # begins at the pc start), from the caches if possible.  The code
+        # generated also depends on the run_ methods of the class (see
+        # _no_method) and on the verification, so both are in the key.
+        _class = '%s.%s' % (self.__class__.__module__, self.__class__.__qualname__)
+        _key = hashlib.sha256(('%d:%s:%s:%s:%r' % (_VERSION, _class, self.verified, start, ircode))
+                              .encode()).hexdigest()
+        _code = _code_cache.get(_key)
+        if _code is not None:
+            return _code
+        _path = None
+        if self.cache_dir and self._cache_ready():
+            _path = os.path.join(self.cache_dir, '%s.%s.ucc' % (_key, sys.implementation.cache_tag))
+            try:
+                with open(_path, 'rb') as f:
+                    _code = marshal.load(f)
+            except (OSError, EOFError, ValueError, TypeError):
+                _code = None
+        if _code is None:
+            if start is None:
+                self.source = self.transpile(ircode)
+            else:
+                self.source = self.transpile_function(ircode, start)
+            _code = compile(self.source, '<uCIR %s>' % _key[:12], 'exec')
+            if _path is not None:
+                self._save(_path, _code)
+        _code_cache[_key] = _code
+        return _code
+
+    def _cache_ready(self):
+        # Create the cache directory, private to the user; the cache is
+        # optional, so it's skipped if it can't be created or is not private
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        except OSError:
+            return False
+        return _private_dir(self.cache_dir)
+
+    def _save(self, path, code):
+        # Write the code object atomically; the cache is optional, so
+        # any error writing it is ignored.
+        try:
+            fd, _tmp = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(code, f)
+            os.replace(_tmp, path)
+        except OSError:
+            pass
+
+    #
+    # Translation
+    #
+    def transpile(self, ircode):
+        """
+        Return the Python source of the program.  The addresses of the
+        globals & the label tables must be already computed (see run).
+        """
+        _defines = [pc for pc, op in enumerate(ircode) if op[0] == 'define']
+        _arities = self._arities(ircode)
+        lines = ['# generated from the uCIR, do not edit']
+        for idx, start in enumerate(_defines):
+            end = _defines[idx + 1] if idx + 1 < len(_defines) else len(ircode)
+            lines += self._function(ircode, start, end, _arities.get(ircode[start][1], 0))
+        lines.append('_fns = {%s}' % ', '.join('%d: _f%d' % (pc, pc) for pc in _defines))
+        return '\n'.join(lines) + '\n'
+
+    def transpile_function(self, ircode, start):
+        """
+        Return the Python source of the function that begins at the pc
+        start: _f<start>, called with the values of its arguments, and
+        _f<start>_osr(fp, block), which continues an activation of the
+        function that was running in the linked code, at the given block,
+        with its registers in the frame at fp.  The other functions are
+        called through the names _f<pc> of the globals of the module.
+        """
+        end = start + 1
+        while end < len(ircode) and ircode[end][0] != 'define':
+            end += 1
+        _arity = self._arities(ircode).get(ircode[start][1], 0)
+        lines = ['# generated from the uCIR, do not edit']
+        lines += self._function(ircode, start, end, _arity, osr=True)
+        return '\n'.join(lines) + '\n'
+
+    def _arities(self, ircode):
+        # Number of parameters of each function, from its direct calls
+        arities = {}
+        _count = 0
+        for op in ircode:
+            if op[0].startswith('param'):
+                _count += 1
+            elif op[0] == 'call':
+                arities[op[1]] = max(arities.get(op[1], 0), _count)
+                _count = 0
+        return arities
+
+    def _inputs(self, ircode, start, end):
+        # Registers of the function read before being written (in the
+        # order of the code): the parameters, since functions may also
+        # be called through pointers, where the arity is not known.
+        inputs = set()
+        written = set()
+        for pc in range(start + 1, end):
+            op = ircode[pc]
+            if op[0].isdigit():
+                continue
+            opcode, modifier = self._extract_operation(op[0])
+            _kind = opcode.split('_')[0]
+            if _kind in ('jump', 'define'):
+                continue
+            _args = [op[1]] if _kind == 'cbranch' else list(op[1:])
+            _target = None
+            if _kind in ('alloc', 'read'):
+                _target = _args[0]
+            elif _kind != 'store' or modifier.get('ptr0') is None:
+                if _kind not in ('param', 'print', 'return', 'cbranch'):
+                    _target = _args[-1]
+            for arg in _args:
+                if isinstance(arg, str) and arg.startswith('%') and arg != _target and arg not in written:
+                    inputs.add(arg)
+            written.add(_target)
+        return inputs
+
+    def _function(self, ircode, start, end, arity, osr=False):
+        # Translate the define region [start, end) to a Python function,
+        # and also to its entry from the linked code when osr is True
+        name = ircode[start][1]
+        self._layout = self._frame_layout(ircode, start)
+        self._resident = self._addressed(ircode, start, end) | set(self._layout[0])
+        self._main_function = name == '@main'
+        self._params = []
+
+        # split the region in blocks: the entry block & one per label
+        blocks = [[]]
+        self._blocks = {}
+        for pc in range(start + 1, end):
+            if ircode[pc][0].isdigit():
+                self._blocks['%' + ircode[pc][0]] = len(blocks)
+                blocks.append([])
+            else:
+                blocks[-1].append(ircode[pc])
+
+        # The parameters & the return value of a callee are the registers
+        # %0..%n, where n is the number of arguments; the ones missing in
+        # a call default to 0, as the return value in the _push.  The
+        # registers of main read before being written start as None.
+        _inputs = self._inputs(ircode, start, end)
+        if self._main_function:
+            _args, _inits = [], sorted(_inputs, key=lambda reg: int(reg[1:]))
+        else:
+            arity = max([arity] + [int(reg[1:]) for reg in _inputs])
+            _args, _inits = ['%%%d' % idx for idx in range(arity + 1)], []
+        lines = ['', '', 'def _f%d(%s):' % (start, ', '.join('r%s=0' % reg[1:] for reg in _args)),
+                 '    # %s' % name]
+        _body = []
+        if self._resident:
+            _body.append('fp = _alloc(%d)' % max(self._layout[1], len(_args)))
+        for reg in _args:
+            if reg in self._resident:
+                _body.append('M[fp + %d] = r%s' % (self._slot(reg), reg[1:]))
+        for reg in _inits:
+            _body.append('%s = None' % self._rvalue(reg))
+        _loop = []
+        for idx, block in enumerate(blocks):
+            self._block = idx
+            _code = self._block_code(block, idx + 1 < len(blocks))
+            if idx == 0:
+                _body += _code
+            else:
+                _loop.append('    if _b == %d:' % idx)
+                _loop += ['        ' + line for line in _code]
+        if _loop:
+            _body += ['while True:'] + _loop
+        lines += ['    ' + line for line in _body]
+        if osr and _loop:
+            # the registers that are locals are loaded from the frame
+            lines += ['', '', 'def _f%d_osr(fp, _b):' % start, '    # %s, from the linked code' % name]
+            for reg in sorted(self._registers(ircode, start, end) - self._resident, key=lambda reg: int(reg[1:])):
+                lines.append('    r%s = M[fp + %d]' % (reg[1:], self._slot(reg)))
+            lines += ['    ' + line for line in ['while True:'] + _loop]
+        return lines
+
+    def _addressed(self, ircode, start, end):
+        # Registers whose address is used, so they must stay in memory
+        addressed = set()
+        for pc in range(start + 1, end):
+            op = ircode[pc]
+            if op[0].isdigit():
+                continue
+            opcode, modifier = self._extract_operation(op[0])
+            _kind = opcode.split('_')[0]
+            if _kind in ('get', 'elem'):
+                addressed.add(op[1])
+            elif _kind in ('load', 'store') and modifier and 'ptr0' not in modifier:
+                addressed.update(op[1:3])
+        return {name for name in addressed if name.startswith('%')}
+
+    def _registers(self, ircode, start, end):
+        # Registers used by the function (labels are not registers)
+        registers = set()
+        for pc in range(start + 1, end):
+            op = ircode[pc]
+            if op[0] == 'jump' or op[0].isdigit():
+                continue
+            _args = op[1:2] if op[0] == 'cbranch' else op[1:]
+            registers.update(arg for arg in _args if isinstance(arg, str) and arg.startswith('%'))
+        return registers
+
+    def _block_code(self, block, has_next):
+        # Translate the instructions of a block.  The code after a jump,
+        # branch or return is unreachable, so it is dropped.
+        lines = []
+        for op in block:
+            opcode, modifier = self._extract_operation(op[0])
+            _kind = opcode.split('_')[0]
+            if not self.verified and not hasattr(self, "run_" + opcode):
+                lines.append('_no_method(%r)' % opcode)
+            elif _kind in _operators:
+                lines += self._emit_binary(opcode, *op[1:])
+            else:
+                lines += getattr(self, "_emit_" + _kind)(opcode, modifier, *op[1:])
+            if _kind in ('jump', 'cbranch', 'return'):
+                return lines
+        lines.append('_b = %d' % (self._block + 1) if has_next else '_halt()')
+        return lines
+
+    def _goto(self, label):
+        # Select the block of the label; backward jumps restart the loop
+        _target = self._blocks[label]
+        if _target <= self._block:
+            return ['_b = %d' % _target, 'continue']
+        return ['_b = %d' % _target]
+
+    def _address(self, name):
+        # Expression of the address of an operand
+        if name.startswith('@'):
+            return '%d' % self.globals[name]
+        return 'fp + %d' % self._slot(name)
+
+    def _rvalue(self, name):
+        # Expression of the value of an operand (also valid as a target)
+        if name.startswith('@'):
+            return 'M[%d]' % self.globals[name]
+        if name in self._resident:
+            return 'M[fp + %d]' % self._slot(name)
+        return 'r%s' % name[1:]
+
+    #
+    # Emitters: each one returns the lines of Python code of the instruction
+    #
+    def _emit_alloc(self, opcode, modifier, varname):
+        _dim = self._dim(modifier)
+        if _dim == 1:
+            return ['%s = 0' % self._rvalue(varname)]
+        return ['_zero(%s, %d)' % (self._address(varname), _dim)]
+
+    def _emit_binary(self, opcode, left, right, target):
+        _op = '/' if opcode == 'div_float' else _operators[opcode.split('_')[0]]
+        return ['%s = %s %s %s' % (self._rvalue(target), self._rvalue(left), _op, self._rvalue(right))]
+
+    def _emit_call(self, opcode, modifier, source, target):
+        _args = ', '.join(self._params)
+        self._params = []
+        if source in self.functions:
+            _fn = '_f%d' % self.M[self.globals[source]]
+        else:
+            _fn = '_fns[%s]' % self._rvalue(source)
+        return ['%s = %s(%s)' % (self._rvalue(target), _fn, _args)]
+
+    def _emit_cbranch(self, opcode, modifier, expr_test, true_target, false_target):
+        return (['if %s:' % self._rvalue(expr_test)] + ['    ' + line for line in self._goto(true_target)] +
+                ['else:'] + ['    ' + line for line in self._goto(false_target)])
+
+    def _emit_copy(self, dim, source, target):
+        return ['_copy(M, %s, %s, %d, %s)' % (self._address(target), self._address(source),
+                                              dim, source.startswith('@'))]
+
+    def _emit_elem(self, opcode, modifier, source, index, target):
+        _target = self._rvalue(target)
+        return ['%s = %s + %s' % (_target, self._address(source), self._rvalue(index)),
+                'if not 0 <= %s < len(M): _bad_address(%s)' % (_target, _target)]
+
+    def _emit_fptosi(self, opcode, modifier, source, target):
+        return ['%s = int(%s)' % (self._rvalue(target), self._rvalue(source))]
+
+    def _emit_get(self, opcode, modifier, source, target):
+        return ['%s = %s' % (self._rvalue(target), self._address(source))]
+
+    def _emit_jump(self, opcode, modifier, target):
+        return self._goto(target)
+
+    def _emit_literal(self, opcode, modifier, value, target):
+        if isinstance(value, float) and value != value or value in (float('inf'), float('-inf')):
+            return ['%s = float(%r)' % (self._rvalue(target), repr(value))]
+        return ['%s = %r' % (self._rvalue(target), value)]
+
+    def _emit_load(self, opcode, modifier, varname, target):
+        if modifier and 'ptr0' not in modifier:
+            return self._emit_copy(self._dim(modifier), varname, target)
+        if not modifier:
+            return ['%s = %s' % (self._rvalue(target), self._rvalue(varname))]
+        return ['%s = M[%s]' % (self._rvalue(target), self._rvalue(varname))]
+
+    def _emit_not(self, opcode, modifier, source, target):
+        return ['%s = not %s' % (self._rvalue(target), self._rvalue(source))]
+
+    def _emit_param(self, opcode, modifier, source):
+        self._params.append(self._rvalue(source))
+        return []
+
+    def _emit_print(self, opcode, modifier, source):
+        if opcode == 'print_string':
+            return ["_write(''.join(%s))" % self._rvalue(source)]
+        return ['_write(str(%s))' % self._rvalue(source)]
+
+    def _emit_read(self, opcode, modifier, source):
+        _convert = {'read_int': 'int', 'read_float': 'float'}.get(opcode, 'None')
+        return ['%s = _read(%s)' % (self._rvalue(source), _convert)]
+
+    def _emit_return(self, opcode, modifier, target=None):
+        _value = 'None' if target is None else self._rvalue(target)
+        if self._main_function:
+            return ['_exit(%s)' % _value]
+        if self._resident:
+            return ['self.offset = fp', 'return %s' % _value]
+        return ['return %s' % _value]
+
+    def _emit_sitofp(self, opcode, modifier, source, target):
+        return ['%s = float(%s)' % (self._rvalue(target), self._rvalue(source))]
+
+    def _emit_store(self, opcode, modifier, source, target):
+        if modifier and 'ptr0' not in modifier:
+            return self._emit_copy(self._dim(modifier), source, target)
+        if not modifier:
+            return ['%s = %s' % (self._rvalue(target), self._rvalue(source))]
+        return ['M[%s] = %s' % (self._rvalue(target), self._rvalue(source))]
+
+
+class _Return(Exception):
+    """ Raised when a function run in the linked code returns to the compiled code. """
+    pass
+
+
+class TieredInterpreter(TranspiledInterpreter):
+    """
+    Runs the uC intermediate code in the linked code of the
+    FrameInterpreter, and translates to Python only the hot functions.
+
+    Each function has two counters: its calls and the backward jumps
+    (back edges) executed in its loops.  When a function is called
+    hot_calls times, it is compiled and its next calls (from the
+    linked code or from the compiled code) run the compiled version.
+    When its loops execute hot_loops back edges, it is compiled as well
+    and the activation running in the linked code continues in the
+    compiled code, from the block of the loop (on-stack replacement),
+    so a hot loop in main is compiled too.
+
+    The compiled functions call the cold ones through the linked code.
+    The names of the compiled functions & the reason of their
+    promotion ('calls' or 'loops') are kept in self.promoted.  As in
+    the TranspiledInterpreter, runs with a profiler, with limits or with
+    run_async use only the linked code.
+    """
+
+    def __init__(self, memory=None, output=None, input=None, profiler=None,
+                 max_instructions=None, timeout=None, cache_dir=None, hot_calls=100, hot_loops=1000,
+                 verify=False):
+        super().__init__(memory, output, input, profiler, max_instructions, timeout, cache_dir, verify)
+        self.hot_calls = hot_calls
+        self.hot_loops = hot_loops
+        self.promoted = {}          # name of the compiled functions -> reason
+        self._tiering = False       # Count calls & back edges (see _counting)
+        self._counters = {}         # pc of the define -> [calls, back edges]
+        self._natives = {}          # pc of the define -> compiled function
+        self._osr = {}              # pc of the define -> entry of the compiled function
+        self._globals = None        # Namespace shared by the compiled functions
+        self._function_pc = None    # pc of the define of the function being linked
+        self._return_pc = None      # pc of the sentinel that raises _Return
+
+    def _link(self, ircode):
+        self._tiering = not self._counting()
+        _defines = [self.M[self.globals[name]] for name in self.functions]
+        self._counters = {pc: [0, 0] for pc in _defines}
+        program = super(TranspiledInterpreter, self)._link(ircode)
+        if self._tiering:
+            # the functions not compiled yet are called through _invoke
+            self._return_pc = len(program)
+            program.append(self._return)
+            self._globals = self._namespace()
+            for pc in _defines:
+                self._globals['_f%d' % pc] = partial(self._invoke, pc)
+            # the calls through a pointer (see _emit_call)
+            self._globals['_fns'] = {pc: self._globals['_f%d' % pc] for pc in _defines}
+        return program
+
+    def _frame_layout(self, ircode, start):
+        self._function_pc = start
+        return super()._frame_layout(ircode, start)
+
+    def _invoke(self, pc, *args):
+        M = self.M
+        # Call from the compiled code the function that begins at pc
+        _count = self._counters[pc]
+        _count[0] += 1
+        if _count[0] >= self.hot_calls:
+            return self._promote(pc, 'calls')(*args)
+        # run it in the linked code, with the arguments & the return
+        # value in a temporary area, until it returns to the sentinel
+        _base = self._alloc(len(args) + 1)
+        _result = _base + len(args)
+        M[_base:_result] = list(args)
+        self.params = list(range(_base, _result))
+        _pc = self.pc
+        self.frames.append((self._return_pc, self.fp, _result))
+        self.pc = pc
+        try:
+            self._execute(self.program)
+        except _Return:
+            pass
+        self.pc = _pc
+        self.offset = _base
+        return M[_result]
+
+    def _promote(self, pc, reason):
+        # Compile the function that begins at pc, for its next calls
+        exec(self._compile(self.code, pc), self._globals)
+        self._natives[pc] = self._globals['_f%d' % pc]
+        self._globals['_fns'][pc] = self._natives[pc]
+        self._osr[pc] = self._globals.get('_f%d_osr' % pc)
+        self.promoted[self.code[pc][1]] = reason
+        return self._natives[pc]
+
+    def _return(self):
+        raise _Return()
+
+    #
+    # Linkers with the counters of the tiers
+    #
+    def _link_call(self, opcode, modifier, source, target):
+        if not self._tiering:
+            return super()._link_call(opcode, modifier, source, target)
+        M = self.M
+        _source, _global = self._operand(source)
+        _target = self._slot(target)
+        _natives, _counters = self._natives, self._counters
+
+        def run():
+            fp = self.fp
+            pc = M[_source if _global else fp + _source]
+            _fn = _natives.get(pc)
+            if _fn is None:
+                _count = _counters[pc]
+                _count[0] += 1
+                if _count[0] < self.hot_calls:
+                    self.frames.append((self.pc, fp, fp + _target))
+                    self.pc = pc
+                    return
+                _fn = self._promote(pc, 'calls')
+            _args = [M[address] for address in self.params]
+            self.params = []
+            M[fp + _target] = _fn(*_args)
+        return run
+
+    def _link_jump(self, opcode, modifier, target):
+        _target = self._layout[2][target]
+        if not self._tiering or _target > self._link_pc:
+            return super()._link_jump(opcode, modifier, target)
+        # a back edge: the labels are the blocks 1.. of the compiled code
+        _block = 1 + sorted(self._layout[2].values()).index(_target)
+        _pc = self._function_pc
+        _count = self._counters[_pc]
+
+        def run():
+            _count[1] += 1
+            if _count[1] < self.hot_loops:
+                self.pc = _target
+                return
+            if _pc not in self._natives:
+                self._promote(_pc, 'loops')
+            self._leave(self._osr[_pc](self.fp, _block))
+        return run
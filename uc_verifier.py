@@ -0,0 +1,267 @@
+# ---------------------------------------------------------------------------------
+# uc: uc_verifier.py
+#
+# verify function: checks a uCIR program once, before it runs, so that the
+#                  interpreters can link it without checking each instruction
+#                  see https://github.com/iviarcio/mc921
+#
+# Copyright (c) 2019-2020, Marcio M Pereira All rights reserved.
+#
+# This software is provided by the author, "as is" without any warranties
+# Redistribution and use in source form with or without modification are
+# permitted but the source code must retain the above copyright notice.
+# ---------------------------------------------------------------------------------
+"""
+The interpreters verify the code when created with verify=True:
+
+       result = FrameInterpreter(verify=True).run(code)
+
+or it can be verified alone, given the opcodes that have a run_ method:
+
+       verify(code, opcodes)
+
+check_opcode(op, opcodes) checks a single instruction, as it's read, and
+operand_roles(op) tells which of its operands are read & written.
+
+verify raises a VerificationError, listing every problem found, when:
+    - an opcode is unknown, has malformed modifiers (each one must be a
+      positive dimension or *) or the wrong number of operands;
+    - a register is read before it is defined on some path of its
+      function (the parameters & the return value are defined when the
+      function starts, as %0 .. %n-1, where %n is the first alloc or,
+      without allocs, the first register defined);
+    - a get or elem takes the address of a register that is not in
+      memory: one defined on entry, allocated, loaded as an array or
+      holding an address;
+    - a jump or cbranch targets a label that is not in its function, or
+      a label is defined twice in the same function;
+    - a global operand is not declared, or a call targets an @ symbol
+      that is not a function;
+    - there are instructions outside a function, or no @main.
+"""
+import re
+
+
+class VerificationError(Exception):
+    """ The uCIR is malformed.  errors is the list of problems found. """
+
+    def __init__(self, errors):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+# Role of each operand of an instruction, by kind: a register or global
+# read (use) or written (def), a label, a function, a name or a value.
+# The kinds with optional operands have more than one form.
+_binary = ('use', 'use', 'def')
+_forms = {
+    'alloc': [('def',)],
+    'call': [('callee', 'def')],
+    'cbranch': [('use', 'label', 'label')],
+    'define': [('name',)],
+    'elem': [('use', 'use', 'def')],
+    'fptosi': [('use', 'def')],
+    'get': [('use', 'def')],
+    'global': [('name',), ('name', 'value')],
+    'jump': [('label',)],
+    'literal': [('value', 'def')],
+    'load': [('use', 'def')],
+    'not': [('use', 'def')],
+    'param': [('use',)],
+    'print': [('use',)],
+    'read': [('def',)],
+    'return': [(), ('use',)],
+    'sitofp': [('use', 'def')],
+    'store': [('use', 'def')],
+}
+for _kind in ('add', 'sub', 'mul', 'div', 'mod', 'lt', 'le', 'gt', 'ge', 'eq', 'ne', 'and', 'or'):
+    _forms[_kind] = [_binary]
+
+# Opcodes without type nor modifiers (see Interpreter._extract_operation)
+_untyped = {'fptosi', 'sitofp', 'jump', 'cbranch', 'define', 'call'}
+
+_register = re.compile(r'%\d+$')
+
+
+def verify(ircode, opcodes):
+    """ Verify the ircode, where opcodes are the names of the run_ methods
+        of the interpreter (e.g., 'add_int' and 'load_int_' for the
+        instructions with modifiers).  Raises a VerificationError.
+    """
+    errors = []
+    symbols, functions = _symbols(ircode)
+    if '@main' not in functions:
+        errors.append("No @main function")
+    _start = None
+    for pc, op in enumerate(ircode):
+        if not op[0].isdigit() and op[0].split('_')[0] == 'define':
+            if _start is not None:
+                _verify_function(ircode, _start, pc, opcodes, symbols, functions, errors)
+            _start = pc
+        elif _start is None:
+            _kind, _form = check_opcode(op, opcodes)
+            if _kind is None:
+                errors.append(_error(pc, op, _form))
+            elif _kind != 'global':
+                errors.append(_error(pc, op, "instruction outside a function"))
+    if _start is not None:
+        _verify_function(ircode, _start, len(ircode), opcodes, symbols, functions, errors)
+    if errors:
+        raise VerificationError(errors)
+
+
+def check_opcode(op, opcodes):
+    """ Check the instruction op alone: its opcode, modifiers and number
+        of operands.  Returns its kind & the role of each operand (e.g.,
+        'store', ('use', 'def')), or None & an error message.
+    """
+    _parts = op[0].split('_')
+    _kind = _parts[0]
+    _forms_of = _forms.get(_kind)
+    if _forms_of is None:
+        return None, "unknown opcode"
+    if _kind in _untyped:
+        if len(_parts) > 1:
+            return None, "unexpected modifiers"
+        _opcode = _kind
+    else:
+        if len(_parts) < 2:
+            return None, "missing type"
+        for _modifier in _parts[2:]:
+            if _modifier != '*' and not (_modifier.isdigit() and int(_modifier) > 0):
+                return None, "malformed modifier %r" % _modifier
+        _opcode = _parts[0] + '_' + _parts[1] + ('_' if len(_parts) > 2 else '')
+    if _opcode not in opcodes and _kind != 'global':
+        # the globals are stored by the interpreter before running
+        return None, "no run_%s method" % _opcode
+    _form = operand_roles(op)
+    if _form is None:
+        return None, "expected %s operands" % ' or '.join(str(len(_form)) for _form in _forms_of)
+    return _kind, _form
+
+
+def operand_roles(op):
+    """ Return the role of each operand of the instruction op: 'use' or
+        'def' (a register or global read or written), 'label', 'callee',
+        'name' or 'value'.  Returns None for an unknown kind or the wrong
+        number of operands.  The opcode itself is not checked.
+    """
+    _parts = op[0].split('_')
+    for _form in _forms.get(_parts[0], ()):
+        if len(op) - 1 == len(_form):
+            if _parts[0] == 'store' and '*' in _parts[2:]:
+                # the target of a store through a pointer is read
+                return ('use', 'use')
+            return _form
+    return None
+
+
+def _error(pc, op, message):
+    return "%d: %r: %s" % (pc, op, message)
+
+
+def _symbols(ircode):
+    # The globals & the functions declared by the code
+    symbols = set()
+    functions = set()
+    for op in ircode:
+        if op[0].startswith('global') and len(op) > 1:
+            symbols.add(op[1])
+        elif op[0].split('_')[0] == 'define' and len(op) > 1:
+            symbols.add(op[1])
+            functions.add(op[1])
+    return symbols, functions
+
+
+def _verify_function(ircode, start, end, opcodes, symbols, functions, errors):
+    # Check the instructions of the function in ircode[start:end]
+    labels = {}
+    blocks = [[]]
+    for pc in range(start + 1, end):
+        op = ircode[pc]
+        if op[0].isdigit():
+            if '%' + op[0] in labels:
+                errors.append(_error(pc, op, "label defined twice"))
+            labels['%' + op[0]] = len(blocks)
+            blocks.append([])
+            continue
+        _kind, _form = check_opcode(op, opcodes)
+        if _kind is None:
+            errors.append(_error(pc, op, _form))
+            continue
+        blocks[-1].append((pc, op, _kind, _form))
+        if _kind in ('jump', 'cbranch', 'return'):
+            blocks.append([])
+
+    # Check the operands & find the successors of each block
+    successors = []
+    for index, block in enumerate(blocks):
+        _next = [index + 1] if index + 1 < len(blocks) else []
+        for pc, op, _kind, _form in block:
+            for _role, _arg in zip(_form, op[1:]):
+                if _role == 'label':
+                    if _arg not in labels:
+                        errors.append(_error(pc, op, "undefined label %s" % _arg))
+                elif _role in ('use', 'def', 'callee') and not _register.match(str(_arg)):
+                    if _role == 'callee' and _arg not in functions:
+                        errors.append(_error(pc, op, "call to undefined function %s" % _arg))
+                    elif _arg not in symbols:
+                        errors.append(_error(pc, op, "undeclared global %s" % _arg))
+            if _kind == 'jump':
+                _next = [labels[op[1]]] if op[1] in labels else []
+            elif _kind == 'cbranch':
+                _next = [labels[_label] for _label in op[2:] if _label in labels]
+            elif _kind == 'return':
+                _next = []
+        successors.append(_next)
+
+    # The registers defined on every path to each block.  The parameters
+    # & the return value are defined on entry. None: not reached yet.
+    _allocs = [int(op[1][1:]) for _block in blocks for _, op, _kind, _ in _block
+               if _kind == 'alloc' and _register.match(op[1])]
+    if not _allocs:
+        # e.g., an optimized function that reads its parameters directly
+        _allocs = [int(_arg[1:]) for _block in blocks for _, op, _, _form in _block
+                   for _role, _arg in zip(_form, op[1:]) if _role == 'def' and _register.match(str(_arg))]
+    defined = [None] * len(blocks)
+    defined[0] = {'%' + str(_n) for _n in range(max(min(_allocs, default=1), 1))}
+
+    # The registers with a place in memory, whose address get & elem take:
+    # the ones defined on entry, allocated, loaded as arrays or holding an
+    # address.  Any other register may be kept out of the frame.
+    _addressable = set(defined[0])
+    for _block in blocks:
+        for pc, op, _kind, _form in _block:
+            if _kind in ('alloc', 'get', 'elem') or (_kind == 'load' and len(op[0].split('_')) > 2):
+                _addressable.add(op[-1] if _kind != 'alloc' else op[1])
+    for _block in blocks:
+        for pc, op, _kind, _form in _block:
+            if _kind in ('get', 'elem') and _register.match(str(op[1])) and op[1] not in _addressable:
+                errors.append(_error(pc, op, "address of unallocated register %s" % op[1]))
+    _pending = [0]
+    while _pending:
+        index = _pending.pop()
+        _out = _defs(blocks[index], defined[index])
+        for _succ in successors[index]:
+            _in = _out if defined[_succ] is None else defined[_succ] & _out
+            if _in != defined[_succ]:
+                defined[_succ] = _in
+                _pending.append(_succ)
+
+    for index, block in enumerate(blocks):
+        if defined[index] is None:
+            continue    # unreachable
+        _defined = set(defined[index])
+        for pc, op, _kind, _form in block:
+            for _role, _arg in zip(_form, op[1:]):
+                if _role in ('use', 'callee') and _register.match(str(_arg)) and _arg not in _defined:
+                    errors.append(_error(pc, op, "register %s used before defined" % _arg))
+            _defined.update(_arg for _role, _arg in zip(_form, op[1:]) if _role == 'def')
+
+
+def _defs(block, defined):
+    # The registers defined at the end of the block
+    _defined = set(defined)
+    for _, op, _, _form in block:
+        _defined.update(_arg for _role, _arg in zip(_form, op[1:]) if _role == 'def')
+    return _defined
@@ -1,4 +1,5 @@
 import sys
+from bisect import bisect_right
 
 
 def _repr(obj):
@@ -15,6 +16,28 @@ def _filter_none(*it):
     return tuple(filter(lambda t: t[1] is not None, it))
 
 
+# The line starts of the last source parsed (see make_coord), set by the parser
+line_starts = None
+
+
+def make_coord(coord, lines=None):
+    """
+    Get the Coord of a node coordinate. The parser stores the coordinate of
+    a node packed in an int: the offset of its token in the source or, for
+    the nodes shown at column 1, the bitwise not (~) of that offset. lines
+    are the offsets of the first char of each line of the source (see
+    Program.lines), used to find the line and the column only when needed.
+    Without lines, the line starts of the last source parsed are used.
+    """
+    if lines is None:
+        lines = line_starts
+    if not isinstance(coord, int) or lines is None:
+        return coord
+    offset = ~coord if coord < 0 else coord
+    line = bisect_right(lines, offset)
+    return Coord(line, 1 if coord < 0 else offset - lines[line - 1] + 1)
+
+
 class Node:
     """
     Base class example for the AST nodes.
@@ -51,7 +74,14 @@ class Node:
         """
         pass
 
-    def show(self, buf=sys.stdout, offset=0, attrnames=False, nodenames=False, showcoord=False, _my_node_name=None):
+    def coord_at(self, lines=None):
+        """ The Coord of the node (None if it has no coordinates), found with
+            the line starts of its source (see make_coord).
+        """
+        return make_coord(self.coord, lines)
+
+    def show(self, buf=sys.stdout, offset=0, attrnames=False, nodenames=False, showcoord=False, _my_node_name=None,
+             lines=None):
         """ Pretty print the Node and all its attributes and children (recursively) to a buffer.
             buf:
                 Open IO buffer into which the Node is printed.
@@ -63,7 +93,12 @@ class Node:
                 True if you want to see the actual node names within their parents.
             showcoord:
                 Do you want the coordinates of each Node to be displayed.
+            lines:
+                The line starts of the source, to display the coordinates (see make_coord).
+                A Program has its own, and the other nodes default to the last source parsed.
         """
+        if lines is None:
+            lines = getattr(self, 'lines', None)
         lead = ' ' * offset
         if nodenames and _my_node_name is not None:
             buf.write(lead + self.__class__.__name__ + ' <' + _my_node_name + '>: ')
@@ -80,12 +115,12 @@ class Node:
             buf.write(attrstr)
 
         if showcoord:
-            if self.coord:
-                buf.write('%s' % self.coord)
+            if self.coord is not None:
+                buf.write('%s' % make_coord(self.coord, lines))
         buf.write('\n')
 
         for (child_name, child) in self.children():
-            child.show(buf, offset + 4, attrnames, nodenames, showcoord, child_name)
+            child.show(buf, offset + 4, attrnames, nodenames, showcoord, child_name, lines)
 
 
 class Coord:
@@ -108,12 +143,13 @@ class Coord:
 
 
 class Program(Node):
-    __slots__ = ('gdecls', 'coord')
+    __slots__ = ('gdecls', 'coord', 'lines')
     attr_names = tuple()
 
-    def __init__(self, gdecls, coord=None):
+    def __init__(self, gdecls, coord=None, lines=None):
         self.gdecls = gdecls
         self.coord = coord
+        self.lines = lines
 
     def children(self):
         nodelist = []
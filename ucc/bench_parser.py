@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# ============================================================
+# bench_parser.py -- scaling benchmark of the uC parser
+#
+# Parses generated programs with a growing number of
+# statements in a single function and prints the time per
+# statement, that must stay about the same for every size
+# (the parse time grows linearly).
+# ============================================================
+
+import sys
+from time import perf_counter
+from parser import UCParser
+
+"""
+Run it from the ucc directory:
+
+       ./bench_parser.py [max_statements]
+
+The sizes double from 1/8 of max_statements (default 100000) up to it,
+and each program is a main function with int declarations, assignments
+and prints, plus a global declaration list of the same length, so every
+list production of the grammar (global declarations, declarations,
+init declarators, block items & expression lists) grows with the size.
+"""
+
+
+def make_program(statements):
+    """ Return a program with the given number of statements in main. """
+    lines = ['int g0, g%d;' % statements]
+    lines += ['int g%d;' % i for i in range(1, statements // 10)]
+    lines.append('int main() {')
+    lines.append('    int ' + ', '.join('v%d' % i for i in range(statements // 10 or 1)) + ';')
+    for i in range(statements):
+        if i % 3 == 0:
+            lines.append('    v0 = v0 + %d;' % i)
+        elif i % 3 == 1:
+            lines.append('    print(v0, %d, g0);' % i)
+        else:
+            lines.append('    int x%d = %d;' % (i, i))
+    lines.append('    return 0;')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def run_benchmark(max_statements=100000):
+    """ Print the parse time of programs of growing sizes. """
+    parser = UCParser()
+    print('%10s %10s %14s' % ('statements', 'seconds', 'us/statement'))
+    statements = max(max_statements // 8, 1)
+    while statements <= max_statements:
+        code = make_program(statements)
+        start = perf_counter()
+        parser.parse(code)
+        elapsed = perf_counter() - start
+        print('%10d %10.3f %14.2f' % (statements, elapsed, 1e6 * elapsed / statements))
+        statements *= 2
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
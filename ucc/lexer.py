@@ -1,11 +1,60 @@
+import re
+from array import array
+from bisect import bisect_right
+
 import ply.lex as lex
 
 
+class TokenStream:
+    """
+    The tokens of a text as parallel arrays (see UCLexer.tokenize):
+    types has the type id of each token, its index in UCLexer.tokens,
+    and starts & ends have the offsets of its first char and of the
+    char after it. The lexemes and the values are taken from the text
+    only when asked for.
+    """
+    __slots__ = ('text', 'types', 'starts', 'ends', 'line_starts')
+
+    def __init__(self, text, line_starts):
+        self.text = text
+        self.types = array('H')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.line_starts = line_starts
+
+    def __len__(self):
+        return len(self.types)
+
+    def type(self, index):
+        """ The type (name) of the token index. """
+        return UCLexer.tokens[self.types[index]]
+
+    def lexeme(self, index):
+        """ The text of the token index. """
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def value(self, index):
+        """ The value of the token index, as the token() value. """
+        type = UCLexer.tokens[self.types[index]]
+        if type == 'INT_CONST':
+            return int(self.lexeme(index))
+        if type == 'FLOAT_CONST':
+            return float(self.lexeme(index))
+        return self.lexeme(index)
+
+    def location(self, index):
+        """ The line and the column of the token index. """
+        lexpos = self.starts[index]
+        line = bisect_right(self.line_starts, lexpos)
+        return line, lexpos - self.line_starts[line - 1] + 1
+
+
 class UCLexer:
     """
     A lexer for the uC language. After building it, set the
     input text with input(), and call token() to get new
-    tokens.
+    tokens, or get all the tokens of a text at once, as a
+    TokenStream, with tokenize().
     """
     def __init__(self, error_func):
         """
@@ -20,6 +69,9 @@ class UCLexer:
         # Keeps track of the last token returned from self.token()
         self.last_token = None
 
+        # Offsets of the first char of each line of the input
+        self.line_starts = [0]
+
     def build(self, **kwargs):
         """
         Builds the lexer from the specification. Must be
@@ -30,6 +82,24 @@ class UCLexer:
         """
         self.lexer = lex.lex(object=self, **kwargs)
 
+        # The rules joined in a single regex, that skips the
+        # ignored chars before them, and the type id of each of
+        # its groups for tokenize: None for the inner groups and
+        # the rules without tokens, -1 for ID
+        patterns = []
+        self._group_types = [None]
+        for regex, funcs in self.lexer.lexre:
+            patterns.append(regex.pattern)
+            for func in funcs[1:]:
+                name = func[1] if func else None
+                if name == 'ID':
+                    self._group_types.append(-1)
+                else:
+                    self._group_types.append(self.token_ids.get(name))
+        self._rules_re = re.compile(
+            '[%s]*(?:%s)' % (re.escape(self.t_ignore), '|'.join(patterns)),
+            self.lexer.lexreflags)
+
     def reset_lineno(self):
         """
         Resets the internal line number counter of the lexer.
@@ -38,17 +108,62 @@ class UCLexer:
 
     def input(self, text):
         self.lexer.input(text)
+        self.reset_lineno()
+        self.last_token = None
+        self.line_starts = [0]
+        self.line_starts.extend(m.end() for m in re.finditer('\n', text))
 
     def token(self):
         self.last_token = self.lexer.token()
         return self.last_token
 
+    def tokenize(self, text):
+        """
+        Tokenize the whole text into a TokenStream, without a
+        token object (or a value) per token, for the tools that
+        only need the token types and positions. The errors are
+        reported as by token().
+        """
+        self.input(text)
+        stream = TokenStream(text, self.line_starts)
+        types, starts, ends = stream.types, stream.starts, stream.ends
+        group_types = self._group_types
+        keyword_ids = self.keyword_ids
+        id_type = self.token_ids['ID']
+        end = 0
+        for match in self._rules_re.finditer(text):
+            if match.start() > end:
+                # chars skipped by the search: illegal, unless ignored
+                self._skipped(text, end, match.start())
+            end = match.end()
+            group = match.lastindex
+            type = group_types[group]
+            if type is None:
+                continue
+            if type < 0:
+                type = keyword_ids.get(match.group(group), id_type)
+            start = match.start(group)
+            types.append(type)
+            starts.append(start)
+            ends.append(end)
+        if end < len(text):
+            self._skipped(text, end, len(text))
+        return stream
+
     def find_tok_column(self, token):
         """
         Find the column of the token in its line.
         """
-        last_cr = self.lexer.lexdata.rfind('\n', 0, token.lexpos)
-        return token.lexpos - last_cr
+        return self.find_column(token.lexpos)
+
+    def find_column(self, lexpos):
+        """
+        Find the column of the input offset lexpos in its line,
+        by a binary search of the line starts (so it doesn't
+        depend on the length of the line).
+        """
+        line_starts = self.line_starts
+        return lexpos - line_starts[bisect_right(line_starts, lexpos) - 1] + 1
 
     # Internal auxiliary methods
     def _error(self, msg, token):
@@ -59,6 +174,14 @@ class UCLexer:
     def _make_tok_location(self, token):
         return (token.lineno, self.find_tok_column(token))
 
+    def _skipped(self, text, start, end):
+        # Report the illegal chars in text[start:end] (see tokenize)
+        for lexpos in range(start, end):
+            if text[lexpos] not in self.t_ignore:
+                line = bisect_right(self.line_starts, lexpos)
+                msg = "Illegal character %s" % repr(text[lexpos])
+                self.error_func(msg, line, self.find_column(lexpos))
+
     # Reserved keywords
     keywords = (
         'ASSERT', 'BREAK', 'CHAR', 'ELSE', 'FLOAT', 'FOR', 'IF',
@@ -94,6 +217,10 @@ class UCLexer:
 
     )
 
+    # Type ids of the tokens, their indexes in tokens (see tokenize)
+    token_ids = dict(zip(tokens, range(len(tokens))))
+    keyword_ids = dict(zip(map(str.lower, keywords), range(len(keywords))))
+
     #
     # Rules
     #
@@ -181,7 +308,7 @@ class UCLexer:
 
     # Scanner (used only for test)
     def scan(self, data):
-        self.lexer.input(data)
+        self.input(data)
         while True:
             tok = self.lexer.token()
             if not tok:
@@ -1,12 +1,81 @@
-from ply.yacc import yacc
+import hashlib
+import importlib.util
+import os
+import sys
+import ply
+from ply.yacc import yacc, NullLogger
 from lexer import UCLexer
 import ast
 
+# Directory of the lexer & parser tables cached by the production parsers
+TABLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+
+# The parser shared by the process (see get_parser)
+_shared_parser = None
+
 
 def _lex_err(msg, ln, co):
     print(f'Lexical error: {msg} at {ln}:{co}')
 
 
+def _tables_key():
+    """ Returns the key of the cached tables: a digest of the PLY version
+        and of the sources of the lexer and the parser, so the tables
+        are built again whenever the grammar (or PLY) changes.
+    """
+    digest = hashlib.sha1(ply.__version__.encode())
+    for name in (UCLexer.__module__, __name__):
+        with open(sys.modules[name].__file__, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+def _load_module(name, path):
+    """ Imports the module name from the file path, or returns None. """
+    if not os.path.exists(path):
+        return None
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    except Exception:
+        return None
+
+
+def _remove_stale_tables(prefix, key):
+    """ Removes the cached tables named prefix with a key other than
+        key, i.e., the tables of older grammars and the temporary files
+        left by the processes that failed to rename them.
+    """
+    try:
+        names = os.listdir(TABLES_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix) and not name.startswith(prefix + key):
+            try:
+                os.remove(os.path.join(TABLES_DIR, name))
+            except OSError:
+                pass    # removed by another process
+
+
+def _remove(path):
+    """ Removes the file path, if any. """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def get_parser():
+    """ Returns the production parser of the process, built on the first call. """
+    global _shared_parser
+    if _shared_parser is None:
+        _shared_parser = UCParser(production=True)
+    return _shared_parser
+
+
 class ParseError(Exception):
     pass
 
@@ -22,10 +91,29 @@ class UCParser:
         ('left', 'TIMES', 'DIVIDE', 'MOD')
     )
 
-    def __init__(self):
+    def __init__(self, production=False):
+        """ Builds the lexer and the LALR parser. By default, PLY checks
+            the grammar and writes parsetab.py and the parser.out debug
+            file next to this module. A production parser loads the
+            tables from TABLES_DIR instead, keyed by the PLY version and
+            the grammar (building and caching them only the first time),
+            and never writes debug files. The tables of older grammars
+            are removed when new ones are cached, and nothing is written
+            when TABLES_DIR is read-only.
+        """
         self._lexer = UCLexer(_lex_err)
-        self._lexer.build()
-        self._parser = yacc(module=self)
+        if production:
+            try:
+                os.makedirs(TABLES_DIR, exist_ok=True)
+                writable = os.access(TABLES_DIR, os.W_OK)
+            except OSError:
+                writable = False    # the tables are built but not cached
+            key = _tables_key()
+            self._build_lexer(key, writable)
+            self._parser = self._build_parser(key, writable)
+        else:
+            self._lexer.build()
+            self._parser = yacc(module=self)
 
     def parse(self, code, debug=False):
         return self._parser.parse(
@@ -33,8 +121,59 @@ class UCParser:
             lexer=self._lexer,
             debug=debug)
 
+    def _build_lexer(self, key, writable):
+        """ Builds the lexer from the cached lextab module. A new lextab
+            is written with a name of its own and renamed, so no process
+            reads a partial file. When the directory is not writable,
+            the lexer is only built in memory.
+        """
+        lextab = 'uc_lextab_' + key
+        path = os.path.join(TABLES_DIR, lextab + '.py')
+        module = _load_module(lextab, path)
+        if module is not None:
+            self._lexer.build(optimize=True, lextab=module, errorlog=NullLogger())
+            return
+        if not writable:
+            self._lexer.build(errorlog=NullLogger())
+            return
+        tmp_lextab = '%s_%d' % (lextab, os.getpid())
+        tmp_path = os.path.join(TABLES_DIR, tmp_lextab + '.py')
+        self._lexer.build(optimize=True, lextab=tmp_lextab, outputdir=TABLES_DIR, errorlog=NullLogger())
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            _remove(tmp_path)   # the tables are not cached
+        else:
+            _remove_stale_tables('uc_lextab_', key)
+
+    def _build_parser(self, key, writable):
+        """ Builds the parser from the cached (pickled) LALR tables, as
+            the lexer.
+        """
+        path = os.path.join(TABLES_DIR, 'uc_parsetab_%s.pickle' % key)
+        if os.path.exists(path):
+            try:
+                return yacc(module=self, debug=False, write_tables=False,
+                            picklefile=path, errorlog=NullLogger())
+            except Exception:
+                pass    # a damaged file: build the tables again
+        if not writable:
+            return yacc(module=self, debug=False, write_tables=False,
+                        errorlog=NullLogger())
+        tmp_path = '%s.%d' % (path, os.getpid())
+        parser = yacc(module=self, debug=False, write_tables=False,
+                      picklefile=tmp_path, errorlog=NullLogger())
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            _remove(tmp_path)
+        else:
+            _remove_stale_tables('uc_parsetab_', key)
+        return parser
+
     def _parse_error(self, msg, coord):
-        raise ParseError("{}: {}".format(coord, msg))
+        coord = ast.make_coord(coord, self._lexer.line_starts)
+        raise ParseError("{}: {}".format(coord or '', msg))
 
     def _fix_decl_name_type(self, decl, typename):
         """ Fixes a declaration. Modifies decl.
@@ -122,14 +261,15 @@ class UCParser:
 
     def _token_coord(self, p, token_idx, def_column=False):
         """ Returns the coordinates for the YaccProduction objet 'p' indexed
-            with 'token_idx'. The coordinate includes the 'lineno' and
-            'column'. Both follow the lex semantic, starting from 1.
+            with 'token_idx', packed in an int: the offset of the token, or
+            its bitwise not with 'def_column'. The 'lineno' and 'column' are
+            found from it only when needed (see ast.make_coord). A nonterminal
+            has no position, so it has no coordinates (None).
         """
-        last_cr = p.lexer.lexer.lexdata.rfind('\n', 0, p.lexpos(token_idx))
-        if last_cr < 0:
-            last_cr = -1
-        column = (p.lexpos(token_idx) - (last_cr))
-        return ast.Coord(p.lineno(token_idx), 1 if def_column else column)
+        lexpos = getattr(p.slice[token_idx], 'lexpos', None)
+        if lexpos is None:
+            return None
+        return ~lexpos if def_column else lexpos
 
     def _build_function_definition(self, spec, decl, param_decls, body):
         """ Builds a function definition.
@@ -148,13 +288,18 @@ class UCParser:
     def p_program(self, p):
         """ program  : global_declaration_list
         """
-        p[0] = ast.Program(p[1])
+        ast.line_starts = p.lexer.line_starts
+        p[0] = ast.Program(p[1], lines=p.lexer.line_starts)
 
     def p_global_declaration_list(self, p):
         """ global_declaration_list : global_declaration
                                     | global_declaration_list global_declaration
         """
-        p[0] = [p[1]] if len(p) == 2 else p[1] + [p[2]]
+        if len(p) == 2:
+            p[0] = [p[1]]
+        else:
+            p[1].append(p[2])
+            p[0] = p[1]
 
     def p_global_declaration_1(self, p):
         """ global_declaration : declaration
@@ -209,7 +354,11 @@ class UCParser:
         """ init_declarator_list : init_declarator
                                  | init_declarator_list COMMA init_declarator
         """
-        p[0] = p[1] + [p[3]] if len(p) == 4 else [p[1]]
+        if len(p) == 2:
+            p[0] = [p[1]]
+        else:
+            p[1].append(p[3])
+            p[0] = p[1]
 
     def p_initializer_1(self, p):
         """ initializer : assignment_expression
@@ -237,7 +386,9 @@ class UCParser:
         """ declaration_list : declaration
                              | declaration_list declaration
         """
-        p[0] = p[1] + p[2] if len(p) == 3 else p[1]
+        if len(p) == 3:
+            p[1].extend(p[2])
+        p[0] = p[1]
 
     def p_declaration_list_opt(self, p):
         """ declaration_list_opt : declaration_list
@@ -285,9 +436,13 @@ class UCParser:
         """ block_item_list : block_item
                             | block_item_list block_item
         """
-        p[0] = list(filter(
-            lambda x: x is not None,
-            p[1] if len(p) == 2 else p[1] + p[2]))
+        # The list of the left production is extended in place, so a block
+        # of n items is built in O(n) and not O(n^2)
+        if len(p) == 2:
+            p[0] = [item for item in p[1] if item is not None]
+        else:
+            p[1].extend(item for item in p[2] if item is not None)
+            p[0] = p[1]
 
     def p_compound_statement(self, p):
         """ compound_statement   : LBRACE block_item_list RBRACE
@@ -530,7 +685,7 @@ class UCParser:
                             | identifier_list COMMA identifier
         """
         if len(p) == 2:
-            p[0] = ast.ParamList(p[1], p[1].coord)
+            p[0] = ast.ParamList([p[1]], p[1].coord)
         else:
             p[0] = ast.ParamList.concat_params(p[1], p[3])
 
@@ -10,7 +10,7 @@
 
 import sys
 from contextlib import contextmanager
-from parser import UCParser
+from parser import get_parser
 
 """
 One of the most important (and difficult) parts of writing a compiler
@@ -117,7 +117,7 @@ class Compiler:
             or running at susy machine,
             prints out the abstract syntax tree.
         """
-        self.parser = UCParser()
+        self.parser = get_parser()
         self.ast = self.parser.parse(self.code, debug)
         if susy:
             self.ast.show(showcoord=True)